@@ -0,0 +1,36 @@
+import os
+import statistics
+import subprocess
+import sys
+
+
+RUNS_COUNT = 5
+HEAVY_MODULES = ('pandas', 'numpy', 'psycopg2', 'requests', 'boto3', 'pyarrow')
+MEASURE_SCRIPT = '''
+import sys, time
+start_time = time.perf_counter()
+import {module}
+print(time.perf_counter() - start_time)
+print(','.join([m for m in {heavy} if m in sys.modules]))
+'''
+
+
+def measure(module, runs_count=RUNS_COUNT):  # each run in fresh interpreter, so nothing is cached in sys.modules
+    package_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = MEASURE_SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+    durations, loaded = list(), ''
+    for _ in range(runs_count):
+        output = subprocess.check_output([sys.executable, '-c', script], cwd=package_path, text=True)
+        duration, loaded = output.split('\n')[:2]
+        durations.append(float(duration))
+    return statistics.median(durations), loaded
+
+
+def main():
+    for module in ('fluxes', 'conns', 'context'):
+        duration, loaded = measure(module)
+        print('import {}: {:.3f}s, heavy modules loaded: {}'.format(module, duration, loaded or 'none'))
+
+
+if __name__ == '__main__':
+    main()
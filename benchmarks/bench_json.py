@@ -0,0 +1,44 @@
+import random
+import time
+
+try:  # Assume we're a sub-module in a package.
+    from utils import json_codec
+except ImportError:  # Apparently no higher-level package has been imported, fall back to a local import.
+    from ..utils import json_codec
+
+
+LINES_COUNT = 200000
+BATCH_SIZE = 1000
+
+
+def get_lines(count=LINES_COUNT, seed=42):
+    random.seed(seed)
+    codec = json_codec.get_codec('json')
+    return [
+        codec.dumps(dict(a=random.randint(0, 1000), b=str(random.random()), c=[random.random() for _ in range(5)]))
+        for _ in range(count)
+    ]
+
+
+def measure(function, *args, **kwargs):
+    start_time = time.perf_counter()
+    for _ in function(*args, **kwargs):
+        pass
+    return time.perf_counter() - start_time
+
+
+def main():
+    lines = get_lines()
+    byte_lines = [i.encode('utf8') for i in lines]
+    for backend in json_codec.get_available_backends():
+        codec = json_codec.get_codec(backend)
+        by_line = measure(codec.loads_lines, lines)
+        by_batch = measure(codec.loads_lines, lines, batch_size=BATCH_SIZE)
+        from_bytes = measure(codec.loads_lines, byte_lines, batch_size=BATCH_SIZE)
+        dumps = measure(map, codec.dumps, [codec.loads(i) for i in lines])
+        message = '{}: loads by line {:.2f}s, by batch {:.2f}s, from bytes {:.2f}s, dumps {:.2f}s'
+        print(message.format(backend, by_line, by_batch, from_bytes, dumps))
+
+
+if __name__ == '__main__':
+    main()
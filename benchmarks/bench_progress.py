@@ -0,0 +1,71 @@
+import os
+import time
+import tempfile
+
+try:  # Assume we're a sub-module in a package.
+    import fluxes as fx
+    from utils import log_progress
+except ImportError:  # Apparently no higher-level package has been imported, fall back to a local import.
+    from .. import fluxes as fx
+    from ..utils import log_progress
+
+
+LINES_COUNT = 5000000
+RUNS_COUNT = 3
+
+
+def write_lines(filename, count=LINES_COUNT):
+    with open(filename, 'w') as f:
+        for n in range(count):
+            f.write('line {} with some payload\n'.format(n))
+
+
+def read_lines(filename):
+    with open(filename) as f:
+        yield from f
+
+
+def get_flux(filename):
+    return fx.LinesFlux(read_lines(filename), check=False)
+
+
+def item_step_iterate(progress, items, step=log_progress.DEFAULT_STEP):  # previous implementation: update per item
+    n = 0
+    progress.start()
+    for n, item in enumerate(items):
+        progress.update(n, step)
+        yield item
+    progress.finish(n)
+
+
+def measure(get_items, runs_count=RUNS_COUNT):
+    durations = list()
+    for _ in range(runs_count):
+        start_time = time.perf_counter()
+        for _ in get_items():
+            pass
+        durations.append(time.perf_counter() - start_time)
+    return min(durations)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        filename = os.path.join(folder, 'bench_progress.txt')
+        write_lines(filename)
+        logger = log_progress.get_logger()
+        baseline = measure(lambda: get_flux(filename).get_items())
+        by_item = measure(
+            lambda: item_step_iterate(log_progress.Progress('by item', logger=logger), get_flux(filename).get_items()),
+        )
+        by_time = measure(lambda: get_flux(filename).progress(message='by time').get_items())
+        print('')
+        message = 'read {} lines: {:.2f}s, with item step progress {:.2f}s (+{:.1%}), throttled {:.2f}s (+{:.1%})'
+        print(message.format(
+            LINES_COUNT, baseline,
+            by_item, by_item / baseline - 1,
+            by_time, by_time / baseline - 1,
+        ))
+
+
+if __name__ == '__main__':
+    main()
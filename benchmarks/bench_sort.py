@@ -0,0 +1,73 @@
+import random
+import time
+
+try:  # Assume we're a sub-module in a package.
+    import fluxes as fx
+    from streams import records_flux as rf
+    from utils import (
+        functions as fs,
+        algo,
+    )
+except ImportError:  # Apparently no higher-level package has been imported, fall back to a local import.
+    from .. import fluxes as fx
+    from ..streams import records_flux as rf
+    from ..utils import (
+        functions as fs,
+        algo,
+    )
+
+
+RECORDS_COUNT = 200000
+STEP = 20000
+TMP_FILES_TEMPLATE = 'bench_sort_{}.tmp'
+KEYS = dict(
+    single_field=rf.get_key_function(['a']),
+    multi_field=rf.get_key_function(['a', 'b', 'c']),
+    hashed=rf.get_key_function(['a', 'b', 'c'], take_hash=True),
+)
+
+
+def get_records(count=RECORDS_COUNT, seed=42):
+    random.seed(seed)
+    return [
+        dict(a=random.randint(0, 1000), b=str(random.random()), c=random.randint(0, 10), d='x' * 10)
+        for _ in range(count)
+    ]
+
+
+def get_flux(records):
+    return fx.RecordsFlux(
+        records,
+        count=len(records),
+        check=False,
+        tmp_files_template=TMP_FILES_TEMPLATE,
+    )
+
+
+def undecorated_disk_sort(flux, key_function, step=STEP):  # previous implementation: keys recomputed on merge
+    key_function = fs.composite_key(key_function)
+    parts = flux.split_to_disk_by_step(step=step, sort_each_by=key_function, verbose=False)
+    return algo.merge_iter([p.iterable() for p in parts], key_function=key_function)
+
+
+def decorated_disk_sort(flux, key_function, step=STEP):
+    return flux.disk_sort(key_function, step=step, verbose=False).get_items()
+
+
+def measure(function, *args):
+    start_time = time.perf_counter()
+    for _ in function(*args):
+        pass
+    return time.perf_counter() - start_time
+
+
+def main():
+    records = get_records()
+    for name, key_function in KEYS.items():
+        undecorated = measure(undecorated_disk_sort, get_flux(records), key_function)
+        decorated = measure(decorated_disk_sort, get_flux(records), key_function)
+        print('{}: undecorated {:.2f}s, decorated {:.2f}s'.format(name, undecorated, decorated))
+
+
+if __name__ == '__main__':
+    main()
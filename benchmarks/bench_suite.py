@@ -0,0 +1,197 @@
+from operator import itemgetter
+import argparse
+import platform
+import tempfile
+import json
+import time
+import sys
+import os
+
+try:  # Assume we're a sub-module in a package.
+    import fluxes as fx
+    import conns as cs
+    from benchmarks import data
+except ImportError:  # Apparently no higher-level package has been imported, fall back to a local import.
+    from .. import fluxes as fx
+    from .. import conns as cs
+    from . import data
+
+
+SCALES = (10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7)
+DEFAULT_SCALE = 10 ** 5
+RUNS_COUNT = 3
+REGRESSION_THRESHOLD = 0.1  # relative slowdown reported as regression
+SORT_PARTS_COUNT = 10  # disk sort splits items into this number of parts
+KEYS_SHARE = 10  # one distinct key per this number of items for group_by and joins
+
+
+def prepare_records(size, folder):
+    return [data.get_records(size, keys_count=max(size // KEYS_SHARE, 1))]
+
+
+def prepare_disk_sort(size, folder):
+    return prepare_records(size, folder) + [os.path.join(folder, 'sort_{}.tmp')]
+
+
+def prepare_join(size, folder):
+    keys_count = max(size // KEYS_SHARE, 1)
+    records = data.get_records(size, keys_count=keys_count)
+    return [records, data.get_dimension(keys_count)]
+
+
+def prepare_sorted_join(size, folder):
+    records, dimension = prepare_join(size, folder)
+    return [sorted(records, key=itemgetter('user_id')), dimension]
+
+
+def run_lines_from_file(path):
+    return fx.LinesFlux.from_file(path).get_items()
+
+
+def run_parse_json(path):
+    return fx.LinesFlux.from_file(path).parse_json().get_items()
+
+
+def run_csv_get_rows(path):
+    return cs.CsvFile(path, verbose=False).get_rows()
+
+
+def run_select(records):
+    return fx.RecordsFlux(records, check=False).select('user_id', 'item_score', count='item_count').get_items()
+
+
+def run_filter(records):
+    return fx.RecordsFlux(records, check=False).filter(item_count=lambda v: v > 50).get_items()
+
+
+def run_memory_sort(records):
+    return fx.RecordsFlux(records, check=False).memory_sort(itemgetter('user_id', 'item_score')).get_items()
+
+
+def run_disk_sort(records, tmp_files_template):
+    flux = fx.RecordsFlux(records, check=False, tmp_files_template=tmp_files_template)
+    step = max(len(records) // SORT_PARTS_COUNT, 1)
+    return flux.disk_sort(itemgetter('user_id', 'item_score'), step=step).get_items()
+
+
+def run_top(records):
+    return fx.RecordsFlux(records, check=False).top(100, 'item_score', reverse=True).get_items()
+
+
+def run_group_by(records):
+    return fx.RecordsFlux(records, check=False).group_by('user_id', verbose=False).get_items()
+
+
+def run_map_side_join(records, dimension):
+    return fx.RecordsFlux(records, check=False).map_side_join(fx.RecordsFlux(dimension), key='user_id').get_items()
+
+
+def run_sorted_join(records, dimension):
+    left = fx.RecordsFlux(records, check=False, sorted_by=('user_id', ))
+    right = fx.RecordsFlux(dimension, check=False, sorted_by=('user_id', ))
+    return left.sorted_join(right, key='user_id').get_items()
+
+
+def run_write_lines(lines, path):
+    fx.LinesFlux(lines, check=False).to_file(path, verbose=False, return_flux=False)
+    return list()
+
+
+CASES = dict(  # name: (prepare(size, folder) -> args, run(*args) -> items)
+    lines_from_file=(lambda n, f: [data.write_lines_file(os.path.join(f, 'lines.txt'), n)], run_lines_from_file),
+    parse_json=(lambda n, f: [data.write_json_file(os.path.join(f, 'records.json'), n)], run_parse_json),
+    csv_get_rows=(lambda n, f: [data.write_csv_file(os.path.join(f, 'rows.csv'), n)], run_csv_get_rows),
+    select=(prepare_records, run_select),
+    filter=(prepare_records, run_filter),
+    memory_sort=(prepare_records, run_memory_sort),
+    disk_sort=(prepare_disk_sort, run_disk_sort),
+    top=(prepare_records, run_top),
+    group_by=(prepare_records, run_group_by),
+    map_side_join=(prepare_join, run_map_side_join),
+    sorted_join=(prepare_sorted_join, run_sorted_join),
+    write_lines=(lambda n, f: [data.get_lines(n), os.path.join(f, 'written.txt')], run_write_lines),
+)
+
+
+def measure(run, args, runs_count=RUNS_COUNT):  # best of runs, items are exhausted inside measured time
+    durations = list()
+    for _ in range(runs_count):
+        start_time = time.perf_counter()
+        for _ in run(*args):
+            pass
+        durations.append(time.perf_counter() - start_time)
+    return min(durations)
+
+
+def run_cases(names=None, size=DEFAULT_SCALE, runs_count=RUNS_COUNT, verbose=True):
+    results = dict()
+    with tempfile.TemporaryDirectory() as folder:
+        for name in names or CASES:
+            prepare, run = CASES[name]
+            seconds = measure(run, prepare(size, folder), runs_count=runs_count)
+            results[name] = dict(size=size, seconds=round(seconds, 6), items_per_second=round(size / seconds))
+            if verbose:
+                print('{}: {:.3f}s, {} items/sec'.format(name, seconds, results[name]['items_per_second']))
+    return results
+
+
+def get_meta(size, runs_count):
+    return dict(
+        timestamp=time.strftime('%Y-%m-%dT%H:%M:%S'),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        size=size,
+        runs_count=runs_count,
+    )
+
+
+def save_results(path, results, meta):
+    with open(path, 'w') as f:
+        json.dump(dict(meta=meta, results=results), f, indent=2)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):  # throughput is compared, so sizes may differ
+    rows = list()
+    for name, result in results.items():
+        if name in baseline:
+            change = baseline[name]['items_per_second'] / result['items_per_second'] - 1  # positive means slower
+            rows.append(dict(case=name, change=change, is_regression=change > threshold))
+    return rows
+
+
+def get_comparison_str(rows):
+    lines = list()
+    for row in rows:
+        mark = 'REGRESSION' if row['is_regression'] else ''
+        lines.append('{:<16} {:>+8.1%} {}'.format(row['case'], row['change'], mark).rstrip())
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of flux hot paths')
+    parser.add_argument('--size', type=int, default=DEFAULT_SCALE, help='items count, e.g. one of {}'.format(SCALES))
+    parser.add_argument('--runs', type=int, default=RUNS_COUNT)
+    parser.add_argument('--cases', default=None, help='comma-separated names from: {}'.format(', '.join(CASES)))
+    parser.add_argument('--output', default=None, help='path of JSON file to save results')
+    parser.add_argument('--baseline', default=None, help='path of JSON results to compare with')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(argv)
+    names = args.cases.split(',') if args.cases else None
+    results = run_cases(names, size=args.size, runs_count=args.runs)
+    if args.output:
+        save_results(args.output, results, get_meta(args.size, args.runs))
+    if args.baseline:
+        rows = compare(results, load_results(args.baseline), threshold=args.threshold)
+        print(get_comparison_str(rows))
+        if any([r['is_regression'] for r in rows]):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
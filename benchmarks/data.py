@@ -0,0 +1,59 @@
+import random
+import json
+
+NAMES = ('alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'eta', 'theta')
+CSV_TITLE = ('user_id', 'item_count', 'item_score', 'name')
+DEFAULT_SEED = 42
+
+
+def get_records(count, keys_count=None, seed=DEFAULT_SEED):  # keys_count limits distinct user_id values
+    rnd = random.Random(seed)
+    keys_count = keys_count or count
+    return [
+        dict(
+            user_id=rnd.randrange(keys_count),
+            item_count=rnd.randint(0, 100),
+            item_score=round(rnd.random(), 6),
+            name=rnd.choice(NAMES),
+        )
+        for _ in range(count)
+    ]
+
+
+def get_rows(count, keys_count=None, seed=DEFAULT_SEED):
+    return [tuple(r[c] for c in CSV_TITLE) for r in get_records(count, keys_count, seed)]
+
+
+def get_pairs(count, keys_count=None, seed=DEFAULT_SEED):
+    return [(r['user_id'], r['item_score']) for r in get_records(count, keys_count, seed)]
+
+
+def get_lines(count, seed=DEFAULT_SEED):
+    return ['{}\t{}\t{}\t{}'.format(*r) for r in get_rows(count, seed=seed)]
+
+
+def get_dimension(keys_count, seed=DEFAULT_SEED):  # right side for joins: one record per key
+    rnd = random.Random(seed + 1)
+    return [dict(user_id=k, segment=rnd.choice(NAMES)) for k in range(keys_count)]
+
+
+def write_lines_file(path, count, seed=DEFAULT_SEED):
+    with open(path, 'w') as f:
+        for line in get_lines(count, seed=seed):
+            f.write(line + '\n')
+    return path
+
+
+def write_json_file(path, count, seed=DEFAULT_SEED):
+    with open(path, 'w') as f:
+        for record in get_records(count, seed=seed):
+            f.write(json.dumps(record) + '\n')
+    return path
+
+
+def write_csv_file(path, count, seed=DEFAULT_SEED):
+    with open(path, 'w') as f:
+        f.write(','.join(CSV_TITLE) + '\n')
+        for row in get_rows(count, seed=seed):
+            f.write(','.join(map(str, row)) + '\n')
+    return path
@@ -1,9 +1,9 @@
 from abc import abstractmethod
 from enum import Enum
 import gc
-import requests
-import psycopg2
-import psycopg2.extras
+import queue
+import threading
+import time
 
 try:  # Assume we're a sub-module in a package.
     import fluxes as fx
@@ -14,7 +14,12 @@ try:  # Assume we're a sub-module in a package.
         schema as sh,
         functions as fs,
         mappers as ms,
+        algo,
+        cache,
+        plan,
         log_progress,
+        lazy_import,
+        metrics,
     )
 except ImportError:  # Apparently no higher-level package has been imported, fall back to a local import.
     from .. import fluxes as fx
@@ -25,15 +30,24 @@ except ImportError:  # Apparently no higher-level package has been imported, fal
         schema as sh,
         functions as fs,
         mappers as ms,
+        algo,
+        cache,
+        plan,
         log_progress,
+        lazy_import,
+        metrics,
     )
 
+requests = lazy_import.LazyModule('requests')
+psycopg2 = lazy_import.LazyModule('psycopg2')
+psycopg2_extras = lazy_import.LazyModule('psycopg2.extras')
 
 AUTO = arg.DEFAULT
 TEST_QUERY = 'SELECT now()'
 DEFAULT_GROUP = 'PUBLIC'
 DEFAULT_STEP = 1000
 DEFAULT_ERRORS_THRESHOLD = 0.05
+DEFAULT_WORKERS = 1
 
 
 class DatabaseType(Enum):
@@ -187,22 +201,42 @@ class AbstractDatabase(ac.AbstractStorage):
             verbose=verbose,
         )
 
-    def select(self, table_name, fields, filters=None, verbose=arg.DEFAULT):
+    def select(self, table_name, fields, filters=None, limit=None, verbose=arg.DEFAULT, use_cache=False):
         fields_str = fields if isinstance(fields, str) else ', '.join(fields)
         filters_str = filters if isinstance(filters, str) else ' AND '.join(filters) if filters is not None else ''
         if filters:
-            query = 'SELECT {fields} FROM {table} WHERE {filters};'.format(
+            query = 'SELECT {fields} FROM {table} WHERE {filters}'.format(
                 table=table_name,
                 fields=fields_str,
                 filters=filters_str,
             )
         else:
-            query = 'SELECT {fields} FROM {table};'.format(
+            query = 'SELECT {fields} FROM {table}'.format(
                 table=table_name,
                 fields=fields_str,
             )
+        if limit is not None:
+            query += ' LIMIT {}'.format(int(limit))
+        query += ';'
+        if use_cache:
+            return self.select_cached(query, verbose=verbose)
         return self.execute(query, get_data=True, commit=False, verbose=verbose)
 
+    def select_cached(self, query, verbose=arg.DEFAULT):
+        context = self.get_context()
+        assert context, 'for use_cache option context must be defined'
+        disk_cache = context.get_cache()
+        cache_key = cache.get_key(self.__class__.__name__, self.host, self.port, self.db, query)
+        if disk_cache.has(cache_key):
+            return [tuple(row) for row in disk_cache.get_items(cache_key)]
+        rows = self.execute(query, get_data=True, commit=False, verbose=verbose)
+        try:
+            disk_cache.put_items(cache_key, rows)
+        except TypeError as e:
+            message = 'Result of query can not be cached: {}'.format(e)
+            self.log(msg=message, level=log_progress.LoggingLevel.Warning)
+        return rows
+
     def select_count(self, table, verbose=arg.DEFAULT):
         return self.select(table, fields='COUNT(*)', verbose=verbose)[0][0]
 
@@ -214,28 +248,95 @@ class AbstractDatabase(ac.AbstractStorage):
             self, table, rows, columns,
             step=DEFAULT_STEP, skip_errors=False,
             expected_count=arg.DEFAULT, return_count=True,
-            verbose=arg.DEFAULT,
+            connection=AUTO, verbose=arg.DEFAULT,
     ):
         pass
 
-    def insert_schematized_flux(self, table, flux, skip_errors=False, step=DEFAULT_STEP, verbose=arg.DEFAULT):
+    def new_connection(self):
+        return None
+
+    def report_batch(self, rows_count, duration):
+        registry = metrics.get_registry()
+        registry.counter('db_rows_inserted_total', 'Rows inserted by batches', database=self.get_name()).inc(rows_count)
+        registry.histogram('db_batch_seconds', 'Latency of batch insert', database=self.get_name()).observe(duration)
+
+    def report_error(self):
+        metrics.get_registry().counter('db_errors_total', 'Rows skipped by errors', database=self.get_name()).inc()
+
+    def insert_batches_in_parallel(
+            self, table, batches, columns,
+            workers=2, skip_errors=False,
+            expected_count=None, verbose=arg.DEFAULT,
+    ):
+        verbose = arg.undefault(verbose, self.verbose)
+        message = verbose if isinstance(verbose, str) else 'Inserting into {} by {} workers'.format(table, workers)
+        progress = log_progress.Progress(
+            message, count=expected_count, verbose=verbose, logger=self.get_logger(), context=self.get_context(),
+        )
+        connections = queue.Queue()
+        for _ in range(workers):
+            connections.put(self.new_connection())
+        lock = threading.Lock()
+        written = [0]
+
+        def insert_batch(batch):
+            connection = connections.get()
+            try:
+                self.insert_rows(
+                    table, rows=batch, columns=columns,
+                    step=len(batch), skip_errors=skip_errors,
+                    return_count=False, connection=connection, verbose=False,
+                )
+            finally:
+                connections.put(connection)
+            with lock:
+                written[0] += len(batch)
+                progress.update(written[0] - 1)
+            return len(batch)
+        progress.start()
+        inserted_count = 0
+        try:
+            for batch_count in algo.map_in_parallel(insert_batch, batches, workers=workers):
+                inserted_count += batch_count
+        finally:
+            while not connections.empty():
+                connection = connections.get()
+                if connection is not None:
+                    connection.close()
+        n = inserted_count - 1 if inserted_count else 0
+        progress.finish(n)
+        return n
+
+    def insert_schematized_flux(
+            self, table, flux,
+            skip_errors=False, step=DEFAULT_STEP, workers=DEFAULT_WORKERS,
+            verbose=arg.DEFAULT,
+    ):
         columns = flux.get_columns()
         expected_count = flux.count
-        final_count = flux.calc(
-            lambda a: self.insert_rows(
-                table, rows=a, columns=columns,
-                step=step, expected_count=expected_count,
-                skip_errors=skip_errors, return_count=True,
+        if workers > 1:
+            final_count = self.insert_batches_in_parallel(
+                table, batches=flux.to_batches(step).get_items(),
+                columns=columns, workers=workers,
+                skip_errors=skip_errors, expected_count=expected_count,
                 verbose=verbose,
-            ),
-        )
+            )
+        else:
+            final_count = flux.calc(
+                lambda a: self.insert_rows(
+                    table, rows=a, columns=columns,
+                    step=step, expected_count=expected_count,
+                    skip_errors=skip_errors, return_count=True,
+                    verbose=verbose,
+                ),
+            )
         return final_count
 
     def insert_data(
             self, table, data, schema=tuple(),
             encoding=None, skip_first_line=False,
             skip_lines=0, skip_errors=False, step=DEFAULT_STEP,
-            verbose=arg.DEFAULT,
+            workers=DEFAULT_WORKERS, verbose=arg.DEFAULT,
     ):
         if not isinstance(schema, sh.SchemaDescription):
             message = 'Schema as {} is deprecated, use sh.SchemaDescription instead'.format(type(schema))
@@ -268,7 +369,7 @@ class AbstractDatabase(ac.AbstractStorage):
         initial_count = fx_input.count + skip_lines
         final_count = self.insert_schematized_flux(
             table, fx_input,
-            skip_errors=skip_errors, step=step,
+            skip_errors=skip_errors, step=step, workers=workers,
             verbose=verbose,
         )
         return initial_count, final_count
@@ -279,7 +380,7 @@ class AbstractDatabase(ac.AbstractStorage):
             encoding=None,
             step=DEFAULT_STEP,
             skip_lines=0, skip_first_line=False, max_error_rate=0.0,
-            verbose=arg.DEFAULT,
+            workers=DEFAULT_WORKERS, verbose=arg.DEFAULT,
     ):
         verbose = arg.undefault(verbose, self.verbose)
         if not skip_lines:
@@ -289,7 +390,7 @@ class AbstractDatabase(ac.AbstractStorage):
             table, schema=schema, data=data,
             encoding=encoding, skip_first_line=skip_first_line,
             step=step, skip_lines=skip_lines, skip_errors=skip_errors,
-            verbose=verbose,
+            workers=workers, verbose=verbose,
         )
         write_count += skip_lines
         result_count = self.select_count(table)
@@ -306,7 +407,7 @@ class AbstractDatabase(ac.AbstractStorage):
             encoding=None,
             step=DEFAULT_STEP,
             skip_lines=0, skip_first_line=False, max_error_rate=0.0,
-            verbose=arg.DEFAULT,
+            workers=DEFAULT_WORKERS, verbose=arg.DEFAULT,
     ):
         tmp_name = '{}_tmp_upload'.format(table)
         bak_name = '{}_bak'.format(table)
@@ -314,7 +415,7 @@ class AbstractDatabase(ac.AbstractStorage):
         self.force_upload_table(
             table=tmp_name, schema=schema, data=data, encoding=encoding, skip_first_line=skip_first_line,
             step=step, skip_lines=skip_lines, max_error_rate=max_error_rate,
-            verbose=verbose,
+            workers=workers, verbose=verbose,
         )
         self.drop_table(bak_name, if_exists=True, verbose=verbose)
         self.rename_table(table, bak_name, if_exists=True, verbose=verbose)
@@ -346,16 +447,19 @@ class PostgresDatabase(AbstractDatabase):
         if self.is_connected() and reconnect:
             self.disconnect(True)
         if not self.is_connected():
-            self.connection = psycopg2.connect(
-                host=self.host,
-                port=self.port,
-                database=self.db,
-                user=self.user,
-                password=self.password,
-                **self.conn_kwargs
-            )
+            self.connection = self.new_connection()
         return self.connection
 
+    def new_connection(self):
+        return psycopg2.connect(
+            host=self.host,
+            port=self.port,
+            database=self.db,
+            user=self.user,
+            password=self.password,
+            **self.conn_kwargs
+        )
+
     def disconnect(self, skip_errors=False, verbose=arg.DEFAULT):
         verbose = arg.undefault(verbose, self.verbose)
         if self.is_connected():
@@ -400,7 +504,9 @@ class PostgresDatabase(AbstractDatabase):
     def execute_batch(self, query, batch, step=DEFAULT_STEP, cursor=AUTO):
         if cursor == AUTO:
             cursor = self.connect().cursor()
-        psycopg2.extras.execute_batch(cursor, query, batch, page_size=step)
+        start_time = time.perf_counter()
+        psycopg2_extras.execute_batch(cursor, query, batch, page_size=step)
+        self.report_batch(len(batch), time.perf_counter() - start_time)
 
     def grant_permission(self, name, permission='SELECT', group=DEFAULT_GROUP, verbose=arg.DEFAULT):
         verbose = arg.undefault(verbose, self.verbose)
@@ -435,11 +541,11 @@ class PostgresDatabase(AbstractDatabase):
             table, rows, columns,
             step=DEFAULT_STEP, skip_errors=False,
             expected_count=None, return_count=True,
-            verbose=arg.DEFAULT,
+            connection=AUTO, verbose=arg.DEFAULT,
     ):
         verbose = arg.undefault(verbose, self.verbose)
         count = len(rows) if isinstance(rows, (list, tuple)) else expected_count
-        conn = self.connect(reconnect=True)
+        conn = self.connect(reconnect=True) if connection == AUTO else connection
         cur = conn.cursor()
         use_fast_batch_method = not skip_errors
         query_args = dict(table=table)
@@ -467,6 +573,7 @@ class PostgresDatabase(AbstractDatabase):
                 try:
                     cur.execute(query, row)
                 except TypeError or IndexError as e:  # TypeError: not all arguments converted during string formatting
+                    self.report_error()
                     self.log(['Error line:', str(row)], level=log_progress.LoggingLevel.Debug, verbose=verbose)
                     self.log([e.__class__.__name__, e], level=log_progress.LoggingLevel.Error)
             if (n + 1) % step == 0:
@@ -512,7 +619,10 @@ class ClickhouseDatabase(AbstractDatabase):
             **kwargs
         )
 
-    def execute(self, query=TEST_QUERY, get_data=AUTO, commit=AUTO, verbose=True):
+    def new_connection(self):
+        return requests.Session()
+
+    def execute(self, query=TEST_QUERY, get_data=AUTO, commit=AUTO, connection=None, verbose=True):
         url = 'https://{host}:{port}/?database={db}&query={query}'.format(
             host=self.host,
             port=self.port,
@@ -528,7 +638,7 @@ class ClickhouseDatabase(AbstractDatabase):
         if cert_filename:
             request_props['verify'] = cert_filename
         self.log('Execute query: {}'. format(query), verbose=verbose)
-        res = requests.get(
+        res = (connection or requests).get(  # connection is a requests.Session from new_connection()
             url,
             **request_props
         )
@@ -545,7 +655,7 @@ class ClickhouseDatabase(AbstractDatabase):
             self, table, rows, columns,
             step=DEFAULT_STEP, skip_errors=False,
             expected_count=None, return_count=True,
-            verbose=arg.DEFAULT,
+            connection=AUTO, verbose=arg.DEFAULT,
     ):
         verbose = arg.undefault(verbose, self.verbose)
         count = len(rows) if isinstance(rows, (list, tuple)) else expected_count
@@ -564,6 +674,7 @@ class ClickhouseDatabase(AbstractDatabase):
         progress = log_progress.Progress(
             message, count=count, verbose=verbose, logger=self.get_logger(), context=self.context,
         )
+        session = None if connection == AUTO else connection
         progress.start()
         n = 0
         for n, row in enumerate(rows):
@@ -571,12 +682,13 @@ class ClickhouseDatabase(AbstractDatabase):
             cur_query = query_template.format(values)
             if skip_errors:
                 try:
-                    self.execute(cur_query)
+                    self.execute(cur_query, connection=session)
                 except requests.RequestException as e:
+                    self.report_error()
                     self.log(['Error line:', str(row)], level=log_progress.LoggingLevel.Debug, verbose=verbose)
                     self.log([e.__class__.__name__, e], level=log_progress.LoggingLevel.Error)
             else:
-                self.execute(cur_query)
+                self.execute(cur_query, connection=session)
             if (n + 1) % step == 0:
                 progress.update(n)
         progress.finish(n)
@@ -587,6 +699,19 @@ class ClickhouseDatabase(AbstractDatabase):
         return DatabaseType.ClickhouseDatabase.value
 
 
+def get_value_str(value):
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    elif isinstance(value, str):
+        return "'{}'".format(value.replace("'", "''"))
+    else:
+        return str(value)
+
+
+def get_filter_str(field, value):
+    return '{} = {}'.format(field, get_value_str(value))
+
+
 class Table(ac.LeafConnector):
     def __init__(
             self,
@@ -619,6 +744,45 @@ class Table(ac.LeafConnector):
     def get_data(self, verbose=arg.DEFAULT):
         return self.database.select_all(self.name, verbose=verbose)
 
+    def get_selected_records(self, columns=None, filters=tuple(), limit=None, verbose=arg.DEFAULT):
+        columns = self.get_columns() if columns is None else columns
+        rows = self.get_database().select(
+            self.name,
+            fields=columns,
+            filters=[get_filter_str(f, v) for f, v in filters] or None,
+            limit=limit,
+            verbose=verbose,
+        )
+        for row in rows:
+            yield {f: v for f, v in zip(columns, row)}
+
+    def get_columns(self):
+        if isinstance(self.schema, sh.SchemaDescription):
+            return self.schema.get_columns()
+        else:
+            return [f[0] if isinstance(f, (list, tuple)) else f for f in self.schema]
+
+    def to_scan_flux(self):
+        flux = fx.RecordsFlux(
+            plan.Scan(
+                self.get_selected_records,
+                known_columns=self.get_columns(),
+                name=self.name,
+            ),
+            context=self.get_context(),
+        )
+        self.links.append(flux)
+        return flux
+
+    def select(self, *args, **kwargs):
+        return self.to_scan_flux().select(*args, **kwargs)
+
+    def filter(self, *args, **kwargs):
+        return self.to_scan_flux().filter(*args, **kwargs)
+
+    def take(self, count):
+        return self.to_scan_flux().take(count)
+
     def get_flux(self):
         count = self.get_count()
         flux = fx.RowsFlux(
@@ -661,9 +825,9 @@ class Table(ac.LeafConnector):
             self, data,
             encoding=None, skip_first_line=False,
             skip_lines=0, max_error_rate=0.0,
-            verbose=arg.DEFAULT
+            workers=DEFAULT_WORKERS, verbose=arg.DEFAULT
     ):
-        return self.database.safe_upload_table(
+        return self.get_database().safe_upload_table(
             self.name,
             data=data,
             schema=self.schema,
@@ -671,5 +835,6 @@ class Table(ac.LeafConnector):
             skip_first_line=skip_first_line,
             encoding=encoding,
             max_error_rate=max_error_rate,
+            workers=workers,
             verbose=verbose,
         )
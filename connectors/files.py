@@ -12,7 +12,13 @@ try:  # Assume we're a sub-module in a package.
         functions as fs,
         schema as sh,
         selection,
+        plan,
         log_progress,
+        json_codec,
+        algo,
+        lazy_import,
+        profiling,
+        metrics,
     )
 except ImportError:  # Apparently no higher-level package has been imported, fall back to a local import.
     from .. import context as fc
@@ -24,12 +30,23 @@ except ImportError:  # Apparently no higher-level package has been imported, fal
         functions as fs,
         schema as sh,
         selection,
+        plan,
         log_progress,
+        json_codec,
+        algo,
+        lazy_import,
+        profiling,
+        metrics,
     )
 
+pa = lazy_import.LazyModule('pyarrow')
+pq = lazy_import.LazyModule('pyarrow.parquet')
 
 AUTO = arg.DEFAULT
 CHUNK_SIZE = 8192
+UTF8_ENCODINGS = ('utf8', 'utf-8', 'UTF8', 'UTF-8')
+PARQUET_BATCH_SIZE = 10000
+MAX_SCHEMA_INFERENCE_ROWS = 100000  # parquet batches are buffered while some columns have only None values
 PATH_DELIMITER = '/'
 
 
@@ -38,6 +55,119 @@ class FileType(Enum):
     JsonFile = 'JsonFile'
     CsvFile = 'CsvFile'
     TsvFile = 'TsvFile'
+    ParquetFile = 'ParquetFile'
+
+
+def parse_csv_rows(lines, delimiter=None, converters=None):
+    rows = csv.reader(lines, delimiter=delimiter) if delimiter else csv.reader(lines)
+    if converters is None:
+        yield from rows
+    else:
+        for row in rows:
+            yield [converter(value) for value, converter in zip(row, converters)]
+
+
+def select_csv_records(rows, title, converters=None, columns=None, filters=tuple(), limit=None):
+    positions = {f: n for n, f in enumerate(title)}
+    columns = title if columns is None else columns
+
+    def get_value(row, field):
+        n = positions.get(field)
+        if n is None or n >= len(row):
+            return None
+        return converters[n](row[n]) if converters else row[n]
+
+    count = 0
+    for row in rows:
+        if limit is not None and count >= limit:
+            break
+        if filters and not all([get_value(row, f) == v for f, v in filters]):
+            continue
+        yield {f: get_value(row, f) for f in columns}
+        count += 1
+
+
+def has_pyarrow():
+    return lazy_import.is_installed('pyarrow')
+
+
+def check_pyarrow():
+    if not has_pyarrow():
+        raise ImportError('pyarrow must be installed for using ParquetFile')
+
+
+def get_field_type_from_arrow(arrow_type):
+    if pa.types.is_boolean(arrow_type):
+        return sh.FieldType.Bool
+    elif pa.types.is_integer(arrow_type):
+        return sh.FieldType.Int
+    elif pa.types.is_floating(arrow_type) or pa.types.is_decimal(arrow_type):
+        return sh.FieldType.Float
+    elif pa.types.is_date(arrow_type):
+        return sh.FieldType.IsoDate
+    elif pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return sh.FieldType.Str
+    elif pa.types.is_struct(arrow_type) or pa.types.is_map(arrow_type):
+        return sh.FieldType.Dict
+    elif pa.types.is_list(arrow_type) or pa.types.is_large_list(arrow_type):
+        return sh.FieldType.Tuple
+    else:
+        return sh.FieldType.Any
+
+
+def get_arrow_type(field_type):  # returns None for types which should be inferred by pyarrow from values
+    field_type = sh.get_canonic_type(field_type)
+    if field_type == sh.FieldType.Bool:
+        return pa.bool_()
+    elif field_type == sh.FieldType.Int:
+        return pa.int64()
+    elif field_type == sh.FieldType.Float:
+        return pa.float64()
+    elif field_type in (sh.FieldType.Str, sh.FieldType.Str16, sh.FieldType.Str64, sh.FieldType.Str256):
+        return pa.string()
+    elif field_type in (sh.FieldType.Any, sh.FieldType.IsoDate):
+        return pa.string()
+
+
+def get_schema_from_arrow(arrow_schema):
+    return sh.SchemaDescription([(f.name, get_field_type_from_arrow(f.type)) for f in arrow_schema])
+
+
+def get_arrow_schema(schema):
+    arrow_fields = list()
+    for desc in schema.fields_descriptions:
+        arrow_type = get_arrow_type(desc.field_type)
+        if arrow_type is None:
+            return None
+        arrow_fields.append(pa.field(desc.name, arrow_type))
+    return pa.schema(arrow_fields)
+
+
+def infer_arrow_schema(batch_schemas, is_final=False):  # None while types of some columns are unknown
+    arrow_schema = pa.unify_schemas(batch_schemas)  # promotes null type of empty columns to type of values
+    if is_final or not any([pa.types.is_null(f.type) for f in arrow_schema]):
+        return arrow_schema
+
+
+def check_keys(records, arrow_schema):  # pyarrow drops keys missing in schema silently
+    names = set(arrow_schema.names)
+    for r in records:
+        if not names.issuperset(r):
+            message = 'ParquetFile.write_records(): keys {} are not in schema {}'
+            raise ValueError(message.format(sorted(set(r) - names), arrow_schema.names))
+
+
+def can_skip_row_group(row_group, positions, filters):  # uses min/max statistics for equality filters
+    for field, value in filters:
+        statistics = row_group.column(positions[field]).statistics
+        if statistics is None or not statistics.has_min_max:
+            continue
+        try:
+            if value < statistics.min or value > statistics.max:
+                return True
+        except TypeError:
+            continue
+    return False
 
 
 class LocalStorage(ac.AbstractStorage):
@@ -239,6 +369,9 @@ class AbstractFile(ac.LeafConnector):
         else:
             self.fileholder = open(self.get_path(), 'r')
 
+    def report_metrics(self, operation, lines_count, is_full=True):
+        metrics.report_file_operation(operation, lines_count, path=self.get_path() if is_full else None)
+
     def get_meta(self):
         meta = self.__dict__.copy()
         meta.pop('fileholder')
@@ -297,24 +430,34 @@ class TextFile(AbstractFile):
 
     def get_next_lines(self, count=None, skip_first=False, close=False):
         assert self.is_opened()
-        for n, row in enumerate(self.fileholder):
-            if skip_first and n == 0:
-                continue
-            if isinstance(row, bytes):
-                row = row.decode(self.encoding) if self.encoding else row.decode()
-            if self.end:
-                row = row.rstrip(self.end)
-            yield row
-            if (count or 0) > 0 and (n + 1 == count):
-                break
-        if close:
-            self.close()
+        n = -1
+        is_full = False
+        try:
+            for n, row in enumerate(self.fileholder):
+                if skip_first and n == 0:
+                    continue
+                if isinstance(row, bytes):
+                    row = row.decode(self.encoding) if self.encoding else row.decode()
+                if self.end:
+                    row = row.rstrip(self.end)
+                yield row
+                if (count or 0) > 0 and (n + 1 == count):
+                    break
+            is_full = not count
+        finally:  # partially read lines are reported too
+            if close:
+                self.close()
+            self.report_metrics('read', lines_count=n + 1, is_full=is_full)
 
     def get_lines(self, count=None, skip_first=False, check=True, verbose=AUTO, step=AUTO):
         if check and not self.gzip:
             assert self.get_count(reopen=True) > 0
         self.open(reopen=True)
         lines = self.get_next_lines(count=count, skip_first=skip_first, close=True)
+        lines = profiling.wrap(
+            lines, 'read {}'.format(self.get_name()),
+            measure_size=True, encoding=self.encoding or profiling.DEFAULT_ENCODING,
+        )
         if arg.undefault(verbose, self.verbose):
             message = 'Reading {}'.format(self.get_name())
             lines = self.get_logger().progress(lines, name=message, count=self.count, step=step)
@@ -374,16 +517,27 @@ class TextFile(AbstractFile):
             **self.flux_kwargs(**kwargs)
         )
 
-    def write_lines(self, lines, verbose=AUTO):
-        verbose = arg.undefault(verbose, self.verbose)
-        self.open('w', reopen=True)
-        n = 0
+    def get_written_lines(self, lines):  # writes lines into opened file and yields them for counting
         for n, i in enumerate(lines):
+            line = str(i)
             if n > 0:
                 self.fileholder.write(self.end.encode(self.encoding) if self.gzip else self.end)
-            self.fileholder.write(str(i).encode(self.encoding) if self.gzip else str(i))
+            self.fileholder.write(line.encode(self.encoding) if self.gzip else line)
+            yield line
+
+    def write_lines(self, lines, verbose=AUTO):
+        verbose = arg.undefault(verbose, self.verbose)
+        self.open('w', reopen=True)
+        written = profiling.wrap(
+            self.get_written_lines(lines), 'write {}'.format(self.get_name()),
+            measure_size=True, encoding=self.encoding or profiling.DEFAULT_ENCODING,
+        )
+        n = -1
+        for n, _ in enumerate(written):
+            pass
         self.fileholder.close()
         self.close()
+        self.report_metrics('write', lines_count=n + 1)
         self.log('Done. {} rows has written into {}'.format(n + 1, self.get_name()), verbose=verbose)
 
 
@@ -414,12 +568,29 @@ class JsonFile(TextFile):
     def get_flux_type():
         return fx.FluxType.AnyFlux
 
-    def get_items(self, verbose=AUTO, step=AUTO):
-        return self.to_lines_flux(
-            verbose=verbose
-        ).parse_json(
-            default_value=self.default_value
-        ).get_items()
+    def get_json_codec(self):
+        return json_codec.get_context_codec(self.get_context())
+
+    def get_byte_lines(self):  # json decoders accept utf8 bytes, so lines are not decoded to str before parsing
+        fileholder = gz.open(self.get_path(), 'rb') if self.gzip else open(self.get_path(), 'rb')
+        with fileholder:
+            for line in fileholder:
+                yield line.rstrip(b'\r\n')
+
+    def get_items(self, verbose=AUTO, step=AUTO, batch_size=None):
+        if self.encoding in UTF8_ENCODINGS:
+            lines = self.get_byte_lines()
+            if arg.undefault(verbose, self.verbose):
+                message = 'Reading {}'.format(self.get_name())
+                lines = self.get_logger().progress(lines, name=message, count=self.get_count(), step=step)
+            return self.get_json_codec().loads_lines(lines, self.default_value, batch_size=batch_size)
+        else:
+            return self.to_lines_flux(
+                verbose=verbose
+            ).parse_json(
+                default_value=self.default_value,
+                batch_size=batch_size,
+            ).get_items()
 
     def to_records_flux(self, verbose=AUTO):
         return fx.RecordsFlux(
@@ -521,17 +692,11 @@ class CsvFile(TextFile):
             skip_first=self.first_line_is_title,
             verbose=verbose, step=step,
         )
-        rows = csv.reader(lines, delimiter=self.delimiter) if self.delimiter else csv.reader(lines)
         if self.schema is None or not convert_types:
-            yield from rows
+            converters = None
         else:
             converters = self.get_schema().get_converters('str', 'py')
-            for row in rows:
-                converted_row = list()
-                for value, converter in zip(row, converters):
-                    converted_value = converter(value)
-                    converted_row.append(converted_value)
-                yield converted_row
+        yield from parse_csv_rows(lines, delimiter=self.delimiter, converters=converters)
 
     def get_items(self, verbose=AUTO, step=AUTO):
         return self.get_rows(verbose=verbose, step=step)
@@ -545,6 +710,27 @@ class CsvFile(TextFile):
         for item in self.get_rows(convert_types=convert_types):
             yield {k: v for k, v in zip(self.get_schema().get_columns(), item)}
 
+    def get_selected_records(self, columns=None, filters=tuple(), limit=None, convert_types=True):
+        lines = self.get_lines(skip_first=self.first_line_is_title)
+        converters = self.get_schema().get_converters('str', 'py') if convert_types else None
+        return select_csv_records(
+            parse_csv_rows(lines, delimiter=self.delimiter),
+            title=self.get_columns(),
+            converters=converters,
+            columns=columns, filters=filters, limit=limit,
+        )
+
+    def to_scan_flux(self, name=None, **kwargs):
+        data = plan.Scan(
+            self.get_selected_records,
+            known_columns=self.get_columns(),
+            name=self.get_name(),
+        )
+        flux = fx.RecordsFlux(**self.flux_kwargs(data=data, **kwargs))
+        if name:
+            flux.set_name(name)
+        return flux
+
     def get_dict(self, key, value, skip_errors=False):
         result = dict()
         kws = dict(logger=self.get_logger(), skip_errors=skip_errors)
@@ -581,13 +767,13 @@ class CsvFile(TextFile):
         return flux
 
     def select(self, *args, **kwargs):
-        return self.to_records_flux().select(*args, **kwargs)
+        return self.to_scan_flux().select(*args, **kwargs)
 
     def filter(self, *args, **kwargs):
-        return self.to_records_flux().filter(*args, **kwargs)
+        return self.to_scan_flux().filter(*args, **kwargs)
 
     def take(self, count):
-        return self.to_records_flux().take(count)
+        return self.to_scan_flux().take(count)
 
     def to_memory(self):
         return self.to_records_flux().to_memory()
@@ -651,3 +837,189 @@ class TsvFile(CsvFile):
             folder=folder,
             verbose=verbose,
         )
+
+
+class ParquetFile(AbstractFile):
+    def __init__(
+            self,
+            filename,
+            batch_size=PARQUET_BATCH_SIZE,
+            schema=AUTO,
+            folder=None,
+            verbose=AUTO,
+    ):
+        super().__init__(
+            filename=filename,
+            folder=folder,
+            verbose=verbose,
+        )
+        self.batch_size = batch_size
+        self.schema = None if schema == AUTO else schema
+        self.count = None
+
+    @staticmethod
+    def get_flux_type():
+        return fx.FluxType.RecordsFlux
+
+    def get_parquet_file(self):
+        check_pyarrow()
+        return pq.ParquetFile(self.get_path())
+
+    def get_count(self):
+        if self.count is None:
+            self.count = self.get_parquet_file().metadata.num_rows
+        return self.count
+
+    def get_schema(self):
+        if self.schema is None:
+            check_pyarrow()
+            self.schema = get_schema_from_arrow(pq.read_schema(self.get_path()))
+        return self.schema
+
+    def get_columns(self):
+        return self.get_schema().get_columns()
+
+    def get_row_groups(self, parquet_file, filters=tuple()):
+        metadata = parquet_file.metadata
+        positions = {metadata.schema.column(n).name: n for n in range(metadata.num_columns)}
+        row_groups = list()
+        for n in range(metadata.num_row_groups):
+            if filters and can_skip_row_group(metadata.row_group(n), positions, filters):
+                continue
+            row_groups.append(n)
+        return row_groups
+
+    def get_selected_records(self, columns=None, filters=tuple(), limit=None):
+        parquet_file = self.get_parquet_file()
+        row_groups = self.get_row_groups(parquet_file, filters)
+        if not row_groups:
+            return
+        read_columns = None
+        if columns is not None:
+            read_columns = list(columns) + [f for f, _ in filters if f not in columns]
+        batches = parquet_file.iter_batches(batch_size=self.batch_size, row_groups=row_groups, columns=read_columns)
+        count = 0
+        for batch in batches:
+            for r in batch.to_pylist():
+                if limit is not None and count >= limit:
+                    return
+                if filters and not all([r.get(f) == v for f, v in filters]):
+                    continue
+                yield {f: r.get(f) for f in columns} if columns is not None else r
+                count += 1
+
+    def get_records(self):
+        return self.get_selected_records()
+
+    def get_rows(self):
+        columns = self.get_columns()
+        for r in self.get_records():
+            yield [r.get(f) for f in columns]
+
+    def get_items(self, verbose=AUTO, step=AUTO):
+        records = self.get_records()
+        if arg.undefault(verbose, self.verbose):
+            message = 'Reading {}'.format(self.get_name())
+            records = self.get_logger().progress(records, name=message, count=self.get_count(), step=step)
+        return records
+
+    def flux_kwargs(self, verbose=AUTO, step=AUTO, **kwargs):
+        result = dict(
+            count=self.get_count(),
+            data=self.get_items(verbose=verbose, step=step),
+            source=self,
+            context=self.get_context(),
+        )
+        result.update(kwargs)
+        return result
+
+    def to_scan_flux(self, name=None, **kwargs):
+        data = plan.Scan(
+            self.get_selected_records,
+            known_columns=self.get_columns(),
+            name=self.get_name(),
+        )
+        flux = fx.RecordsFlux(**self.flux_kwargs(data=data, **kwargs))
+        if name:
+            flux.set_name(name)
+        return flux
+
+    def to_records_flux(self, name=None, **kwargs):
+        flux = fx.RecordsFlux(**self.flux_kwargs(**kwargs))
+        if name:
+            flux.set_name(name)
+        return flux
+
+    def to_schema_flux(self, name=None, **kwargs):
+        flux = fx.SchemaFlux(
+            schema=self.get_schema(),
+            **self.flux_kwargs(data=self.get_rows(), **kwargs)
+        )
+        if name:
+            flux.set_name(name)
+        return flux
+
+    def select(self, *args, **kwargs):
+        return self.to_scan_flux().select(*args, **kwargs)
+
+    def filter(self, *args, **kwargs):
+        return self.to_scan_flux().filter(*args, **kwargs)
+
+    def take(self, count):
+        return self.to_scan_flux().take(count)
+
+    def to_memory(self):
+        return self.to_records_flux().to_memory()
+
+    def write_records(self, records, schema=None, verbose=AUTO):
+        check_pyarrow()
+        verbose = arg.undefault(verbose, self.verbose)
+        arrow_schema = get_arrow_schema(schema) if isinstance(schema, sh.SchemaDescription) else None
+        writer = None
+        pending, pending_schemas = list(), list()  # batches buffered until schema is inferred
+        n = 0
+
+        def write_batches(batches):
+            nonlocal writer
+            for b in batches:
+                check_keys(b, arrow_schema)
+                record_batch = pa.RecordBatch.from_pylist(b, schema=arrow_schema)
+                if writer is None:
+                    writer = pq.ParquetWriter(self.get_path(), arrow_schema)
+                writer.write_batch(record_batch)
+        try:
+            for batch in algo.get_batches(records, self.batch_size):
+                n += len(batch)
+                if arrow_schema is None:
+                    pending.append(batch)
+                    pending_schemas.append(pa.RecordBatch.from_pylist(batch).schema)
+                    arrow_schema = infer_arrow_schema(pending_schemas, is_final=n >= MAX_SCHEMA_INFERENCE_ROWS)
+                    if arrow_schema is not None:
+                        write_batches(pending)
+                        pending = None
+                else:
+                    write_batches([batch])
+            if pending:
+                arrow_schema = infer_arrow_schema(pending_schemas, is_final=True)
+                write_batches(pending)
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None and arrow_schema is not None:
+            pq.write_table(arrow_schema.empty_table(), self.get_path())
+        self.schema, self.count = None, None
+        self.report_metrics('write', lines_count=n)
+        self.log('Done. {} rows has written into {}'.format(n, self.get_name()), verbose=verbose)
+
+    def write_flux(self, flux, verbose=AUTO):
+        assert fx.is_flux(flux)
+        if flux.class_name() == 'RecordsFlux':
+            self.write_records(flux.get_items(), verbose=verbose)
+        elif flux.class_name() == 'SchemaFlux':
+            columns = flux.get_columns()
+            schema = flux.get_schema()
+            records = map(lambda r: {k: v for k, v in zip(columns, r)}, flux.get_items())
+            self.write_records(records, schema=schema, verbose=verbose)
+        else:
+            message = 'ParquetFile.write_flux() supports RecordsFlux, SchemaFlux only (got {})'
+            raise TypeError(message.format(flux.class_name()))
@@ -1,32 +1,89 @@
 from abc import abstractmethod
-import io
-import boto3
+from itertools import chain
+import tempfile
+import codecs
+import zlib
 
 try:  # Assume we're a sub-module in a package.
     import context as fc
     import fluxes as fx
     import conns as cs
     from connectors import abstract as ac
+    from connectors import files
     from utils import (
         arguments as arg,
+        schema as sh,
+        algo,
+        cache,
         log_progress,
+        lazy_import,
     )
 except ImportError:  # Apparently no higher-level package has been imported, fall back to a local import.
     from .. import context as fc
     from .. import fluxes as fx
     from .. import conns as cs
     from ..connectors import abstract as ac
+    from ..connectors import files
     from ..utils import (
         arguments as arg,
+        schema as sh,
+        algo,
+        cache,
         log_progress,
+        lazy_import,
     )
 
+boto3 = lazy_import.LazyModule('boto3')
 
 AUTO = arg.DEFAULT
 CHUNK_SIZE = 8192
 DEFAULT_PATH_DELIMITER = '/'
 FIRST_PATH_DELIMITER = '://'
 DEFAULT_S3_ENDPOINT_URL = 'https://storage.yandexcloud.net'
+DEFAULT_PART_SIZE = 8 * 1024 * 1024  # S3 requires at least 5 MB for every part of multipart upload except last
+DEFAULT_MAX_SIZE_IN_MEMORY = 64 * 1024 * 1024
+DEFAULT_WORKERS = 4
+DEFAULT_ENCODING = 'utf8'
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+GZIP_EXT = '.gz'
+
+
+def get_parts_from_lines(lines, part_size=DEFAULT_PART_SIZE, encoding=DEFAULT_ENCODING, end='\n'):
+    accumulated = list()
+    accumulated_size = 0
+    for n, line in enumerate(lines):
+        chunk = ((end if n > 0 else '') + str(line)).encode(encoding)
+        accumulated.append(chunk)
+        accumulated_size += len(chunk)
+        if accumulated_size >= part_size:
+            yield b''.join(accumulated)
+            accumulated = list()
+            accumulated_size = 0
+    if accumulated:
+        yield b''.join(accumulated)
+
+
+def inflate_chunks(chunks):
+    decompressor = zlib.decompressobj(GZIP_WBITS)
+    for chunk in chunks:
+        while chunk:
+            yield decompressor.decompress(chunk)
+            chunk = decompressor.unused_data
+            if chunk:  # next member of multi-member gzip stream
+                decompressor = zlib.decompressobj(GZIP_WBITS)
+    yield decompressor.flush()
+
+
+def split_chunks_to_lines(chunks, encoding=DEFAULT_ENCODING, end='\n'):
+    decoder = codecs.getincrementaldecoder(encoding)()
+    tail = ''
+    for chunk in chunks:
+        lines = (tail + decoder.decode(chunk)).split(end)
+        tail = lines.pop()
+        yield from lines
+    tail += decoder.decode(b'', final=True)
+    if tail:
+        yield tail
 
 
 class AbstractObjectStorage(ac.AbstractStorage):
@@ -57,7 +114,7 @@ class AbstractObjectStorage(ac.AbstractStorage):
         return DEFAULT_PATH_DELIMITER
 
 
-class S3Storage(ac.AbstractObjectStorage):
+class S3Storage(AbstractObjectStorage):
     def __init__(
             self,
             name='s3',
@@ -207,11 +264,115 @@ class S3Bucket(ac.FlatFolder):
     def get_object(self, object_path_in_bucket):
         return self.get_resource().Object(self.get_bucket_name(), object_path_in_bucket)
 
-    def get_buffer(self, object_path_in_bucket):
-        buffer = io.BytesIO()
-        self.get_object(object_path_in_bucket).download_fileobj(buffer)
+    def get_object_head(self, object_path_in_bucket):
+        return self.get_client().head_object(
+            Bucket=self.get_bucket_name(),
+            Key=object_path_in_bucket,
+        )
+
+    def get_object_size(self, object_path_in_bucket):
+        return self.get_object_head(object_path_in_bucket)['ContentLength']
+
+    def get_cache_key(self, object_path_in_bucket, *params):
+        etag = self.get_object_head(object_path_in_bucket)['ETag']
+        storage_url = self.get_storage().endpoint_url
+        return cache.get_key(storage_url, self.get_bucket_name(), object_path_in_bucket, etag, *params)
+
+    def get_cache(self):
+        context = self.get_context()
+        assert context, 'for use_cache option context must be defined'
+        return context.get_cache()
+
+    def get_range(self, object_path_in_bucket, first_byte, last_byte):
+        response = self.get_client().get_object(
+            Bucket=self.get_bucket_name(),
+            Key=object_path_in_bucket,
+            Range='bytes={}-{}'.format(first_byte, last_byte),
+        )
+        return response['Body'].read()
+
+    def yield_parts(self, object_path_in_bucket, part_size=DEFAULT_PART_SIZE, workers=DEFAULT_WORKERS):
+        object_size = self.get_object_size(object_path_in_bucket)
+        ranges = [
+            (first_byte, min(first_byte + part_size, object_size) - 1)
+            for first_byte in range(0, object_size, part_size)
+        ]
+        yield from algo.map_in_parallel(
+            lambda r: self.get_range(object_path_in_bucket, *r),
+            ranges,
+            workers=workers,
+        )
+
+    def get_buffer(
+            self,
+            object_path_in_bucket,
+            part_size=DEFAULT_PART_SIZE,
+            workers=DEFAULT_WORKERS,
+            max_size_in_memory=DEFAULT_MAX_SIZE_IN_MEMORY,
+            use_cache=False,
+    ):
+        if use_cache:
+            disk_cache = self.get_cache()
+            cache_key = self.get_cache_key(object_path_in_bucket)
+            if disk_cache.has(cache_key, cache.BYTES_EXT):
+                return disk_cache.get_file(cache_key)
+        buffer = tempfile.SpooledTemporaryFile(max_size=max_size_in_memory)
+        for part in self.yield_parts(object_path_in_bucket, part_size=part_size, workers=workers):
+            buffer.write(part)
+        buffer.seek(0)
+        if use_cache:
+            disk_cache.put_file(cache_key, buffer)
         return buffer
 
+    def download_file(self, object_path_in_bucket, filename, part_size=DEFAULT_PART_SIZE, workers=DEFAULT_WORKERS):
+        with open(filename, 'wb') as fileholder:
+            for part in self.yield_parts(object_path_in_bucket, part_size=part_size, workers=workers):
+                fileholder.write(part)
+
+    def upload_parts(self, object_path_in_bucket, parts, workers=DEFAULT_WORKERS):
+        client = self.get_client()
+        object_props = dict(Bucket=self.get_bucket_name(), Key=object_path_in_bucket)
+        parts = iter(parts)
+        first_part = next(parts, b'')
+        second_part = next(parts, None)
+        if second_part is None:
+            client.put_object(Body=first_part, **object_props)
+            return 1
+        upload_id = client.create_multipart_upload(**object_props)['UploadId']
+
+        def upload_part(numbered_part):
+            part_number, body = numbered_part
+            response = client.upload_part(
+                UploadId=upload_id, PartNumber=part_number, Body=body,
+                **object_props
+            )
+            return dict(PartNumber=part_number, ETag=response['ETag'])
+        try:
+            uploaded_parts = list(
+                algo.map_in_parallel(
+                    upload_part,
+                    enumerate(chain([first_part, second_part], parts), 1),
+                    workers=workers,
+                )
+            )
+            client.complete_multipart_upload(
+                UploadId=upload_id,
+                MultipartUpload=dict(Parts=uploaded_parts),
+                **object_props
+            )
+        except BaseException as e:
+            client.abort_multipart_upload(UploadId=upload_id, **object_props)
+            raise e
+        return len(uploaded_parts)
+
+    def upload_lines(
+            self, object_path_in_bucket, lines,
+            encoding=DEFAULT_ENCODING, end='\n',
+            part_size=DEFAULT_PART_SIZE, workers=DEFAULT_WORKERS,
+    ):
+        parts = get_parts_from_lines(lines, part_size=part_size, encoding=encoding, end=end)
+        return self.upload_parts(object_path_in_bucket, parts, workers=workers)
+
 
 class S3Folder(ac.FlatFolder):
     def __init__(
@@ -235,8 +396,45 @@ class S3Folder(ac.FlatFolder):
     def object(self, name):
         return self.child(name, folder=self)
 
-    def get_buffer(self, object_path_in_bucket):
-        return self.get_bucket().get_buffer(object_path_in_bucket)
+    def get_buffer(self, object_path_in_bucket, **kwargs):
+        return self.get_bucket().get_buffer(object_path_in_bucket, **kwargs)
+
+    def get_path_prefix_in_bucket(self):
+        if self.get_name():
+            return self.get_name() + self.get_path_delimiter()
+        else:
+            return ''
+
+    def yield_objects(self, prefix=''):
+        path_prefix = self.get_path_prefix_in_bucket()
+        for object_props in self.get_bucket().yield_objects(params=dict(Prefix=path_prefix + prefix)):
+            yield self.object(object_props['Key'][len(path_prefix):])
+
+    def get_lines(self, prefix='', interleave=False, workers=DEFAULT_WORKERS, **kwargs):
+        def get_object_lines(s3_object):  # generator, so object body is opened by worker reading it
+            yield from s3_object.get_lines(**kwargs)
+        iterables = (get_object_lines(o) for o in self.yield_objects(prefix))
+        if interleave:
+            return algo.interleave_in_parallel(iterables, workers=workers)
+        elif workers > 1:
+            return algo.chain_in_parallel(iterables, workers=workers)
+        else:
+            return chain.from_iterable(iterables)
+
+    def to_lines_flux(self, prefix='', interleave=False, workers=DEFAULT_WORKERS, **kwargs):
+        return fx.LinesFlux(
+            self.get_lines(prefix, interleave=interleave, workers=workers, **kwargs),
+            source=self,
+            context=self.get_context(),
+        )
+
+    def to_records_flux(self, prefix='', interleave=False, workers=DEFAULT_WORKERS, default_value=None, **kwargs):
+        return self.to_lines_flux(
+            prefix, interleave=interleave, workers=workers, **kwargs
+        ).parse_json(
+            default_value=default_value,
+            to=fx.FluxType.RecordsFlux,
+        )
 
 
 class S3Object(ac.LeafConnector):
@@ -265,8 +463,55 @@ class S3Object(ac.LeafConnector):
         else:
             return self.get_name()
 
-    def get_buffer(self):
-        return self.get_folder().get_buffer(self.get_object_path_in_bucket())
+    def get_size(self):
+        return self.get_bucket().get_object_size(self.get_object_path_in_bucket())
+
+    def get_buffer(self, **kwargs):
+        return self.get_folder().get_buffer(self.get_object_path_in_bucket(), **kwargs)
+
+    def yield_parts(self, part_size=DEFAULT_PART_SIZE, workers=DEFAULT_WORKERS):
+        return self.get_bucket().yield_parts(
+            self.get_object_path_in_bucket(),
+            part_size=part_size,
+            workers=workers,
+        )
+
+    def download_file(self, file, part_size=DEFAULT_PART_SIZE, workers=DEFAULT_WORKERS):
+        filename = file.get_path() if cs.is_file(file) else file
+        self.log('Downloading {} into {}...'.format(self.get_name(), filename), end='\r', verbose=self.verbose)
+        self.get_bucket().download_file(
+            self.get_object_path_in_bucket(), filename,
+            part_size=part_size, workers=workers,
+        )
+        self.log('Done. {} downloaded into {}'.format(self.get_name(), filename), verbose=self.verbose)
+        return file
+
+    def write_lines(
+            self, lines,
+            encoding=DEFAULT_ENCODING, end='\n',
+            part_size=DEFAULT_PART_SIZE, workers=DEFAULT_WORKERS,
+    ):
+        parts_count = self.get_bucket().upload_lines(
+            self.get_object_path_in_bucket(), lines,
+            encoding=encoding, end=end,
+            part_size=part_size, workers=workers,
+        )
+        self.log('Done. {} part(s) uploaded into {}'.format(parts_count, self.get_name()), verbose=self.verbose)
+        return parts_count
+
+    def write_flux(self, flux, **kwargs):
+        assert fx.is_flux(flux)
+        if isinstance(flux, fx.LinesFlux):
+            lines = flux.get_items()
+        else:
+            message = 'S3Object.write_flux() supports LinesFlux only (got {}), use to_lines() or to_json() before'
+            raise TypeError(message.format(flux.class_name()))
+        return self.write_lines(lines, **kwargs)
+
+    def upload_file(self, file, **kwargs):
+        assert cs.is_file(file), 'file must be an instance of *File (got {})'.format(type(file))
+        lines = file.get_lines(check=False, verbose=False)
+        return self.write_lines(lines, encoding=file.encoding, end=file.end, **kwargs)
 
     def get_object_response(self):
         return self.get_bucket().get_client().get_object(
@@ -277,6 +522,99 @@ class S3Object(ac.LeafConnector):
     def get_body(self):
         return self.get_object_response()['Body']
 
+    def get_file_type(self):
+        name = self.get_name()
+        if name.endswith(GZIP_EXT):
+            name = name[:-len(GZIP_EXT)]
+        return cs.DICT_EXT_TO_TYPE.get(name.split('.')[-1], cs.TextFile)
+
+    def get_default_delimiter(self):
+        return '\t' if self.get_file_type() == cs.TsvFile else ','
+
+    def get_chunks(self, chunk_size=CHUNK_SIZE, workers=1):
+        if workers > 1:
+            return self.yield_parts(workers=workers)
+        else:
+            return self.get_body().iter_chunks(chunk_size)
+
+    def get_lines(
+            self,
+            encoding=DEFAULT_ENCODING, gzip=AUTO, end='\n',
+            chunk_size=CHUNK_SIZE, workers=1,
+            use_cache=False,
+    ):
+        gzip = arg.undefault(gzip, self.get_name().endswith(GZIP_EXT))
+        if use_cache:
+            disk_cache = self.get_bucket().get_cache()
+            cache_key = self.get_bucket().get_cache_key(self.get_object_path_in_bucket(), encoding, gzip, end)
+            if disk_cache.has(cache_key):
+                return disk_cache.get_lines(cache_key, end=end)
+        chunks = self.get_chunks(chunk_size=chunk_size, workers=workers)
+        if gzip:
+            chunks = inflate_chunks(chunks)
+        lines = split_chunks_to_lines(chunks, encoding=encoding, end=end)
+        if use_cache:
+            lines = disk_cache.cache_lines(cache_key, lines, end=end)
+        return lines
+
+    def get_title_and_rows(self, delimiter=AUTO, convert_types=True, **kwargs):
+        delimiter = arg.undefault(delimiter, self.get_default_delimiter())
+        rows = files.parse_csv_rows(self.get_lines(**kwargs), delimiter=delimiter)
+        title_row = next(rows, None)
+        if title_row is None:  # empty object has neither title nor rows
+            return list(), iter(list())
+        if convert_types:
+            converters = sh.detect_schema_by_title_row(title_row).get_converters('str', 'py')
+            rows = ([converter(v) for v, converter in zip(r, converters)] for r in rows)
+        return title_row, rows
+
+    def get_rows(self, delimiter=AUTO, first_line_is_title=True, convert_types=True, **kwargs):
+        if first_line_is_title:
+            _, rows = self.get_title_and_rows(delimiter=delimiter, convert_types=convert_types, **kwargs)
+            return rows
+        else:
+            delimiter = arg.undefault(delimiter, self.get_default_delimiter())
+            return files.parse_csv_rows(self.get_lines(**kwargs), delimiter=delimiter)
+
+    def get_records(self, delimiter=AUTO, convert_types=True, **kwargs):
+        columns, rows = self.get_title_and_rows(delimiter=delimiter, convert_types=convert_types, **kwargs)
+        for row in rows:
+            yield {k: v for k, v in zip(columns, row)}
+
+    def to_lines_flux(self, **kwargs):
+        return fx.LinesFlux(
+            self.get_lines(**kwargs),
+            source=self,
+            context=self.get_context(),
+        )
+
+    def to_rows_flux(self, delimiter=AUTO, first_line_is_title=True, convert_types=True, **kwargs):
+        return fx.RowsFlux(
+            self.get_rows(
+                delimiter=delimiter,
+                first_line_is_title=first_line_is_title,
+                convert_types=convert_types,
+                **kwargs
+            ),
+            source=self,
+            context=self.get_context(),
+        )
+
+    def to_records_flux(self, default_value=None, delimiter=AUTO, convert_types=True, **kwargs):
+        if self.get_file_type() == cs.JsonFile:
+            return self.to_lines_flux(
+                **kwargs
+            ).parse_json(
+                default_value=default_value,
+                to=fx.FluxType.RecordsFlux,
+            )
+        else:
+            return fx.RecordsFlux(
+                self.get_records(delimiter=delimiter, convert_types=convert_types, **kwargs),
+                source=self,
+                context=self.get_context(),
+            )
+
     def get_data(self):
         for line in self.get_body():
             yield line.decode('utf8', errors='ignore')
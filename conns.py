@@ -8,6 +8,7 @@ try:  # Assume we're a sub-module in a package.
         JsonFile,
         CsvFile,
         TsvFile,
+        ParquetFile,
     )
     from connectors.databases import (
         AbstractDatabase,
@@ -23,6 +24,7 @@ except ImportError:  # Apparently no higher-level package has been imported, fal
         JsonFile,
         CsvFile,
         TsvFile,
+        ParquetFile,
     )
     from .connectors.databases import (
         AbstractDatabase,
@@ -36,10 +38,10 @@ CONN_CLASSES = (
     AbstractDatabase, Table,
     PostgresDatabase, ClickhouseDatabase,
     LocalFolder, AbstractFile,
-    TextFile, JsonFile, CsvFile, TsvFile,
+    TextFile, JsonFile, CsvFile, TsvFile, ParquetFile,
 )
 DATABASE_TYPES = [PostgresDatabase.__class__.__name__, ClickhouseDatabase.__class__.__name__]
-DICT_EXT_TO_TYPE = {'txt': TextFile, 'json': JsonFile, 'csv': CsvFile, 'tsv': TsvFile}
+DICT_EXT_TO_TYPE = {'txt': TextFile, 'json': JsonFile, 'csv': CsvFile, 'tsv': TsvFile, 'parquet': ParquetFile}
 
 
 class ConnType(Enum):
@@ -48,6 +50,7 @@ class ConnType(Enum):
     JsonFile = 'JsonFile'
     CsvFile = 'CsvFile'
     TsvFile = 'TsvFile'
+    ParquetFile = 'ParquetFile'
     PostgresDatabase = 'PostgresDatabase'
     ClickhouseDatabase = 'ClickhouseDatabase'
     Table = 'Table'
@@ -70,6 +73,8 @@ def get_class(conn_type):
         return CsvFile
     elif conn_type == ConnType.TsvFile:
         return CsvFile
+    elif conn_type == ConnType.ParquetFile:
+        return ParquetFile
     elif conn_type == ConnType.PostgresDatabase:
         return PostgresDatabase
     elif conn_type == ConnType.ClickhouseDatabase:
@@ -83,7 +88,7 @@ def is_conn(obj):
 
 
 def is_file(obj):
-    return isinstance(obj, (TextFile, JsonFile, CsvFile, TsvFile))
+    return isinstance(obj, (TextFile, JsonFile, CsvFile, TsvFile, ParquetFile))
 
 
 def is_folder(obj):
@@ -1,5 +1,7 @@
 from datetime import datetime
+import weakref
 import gc
+import os
 
 try:  # Assume we're a sub-module in a package.
     import fluxes as fx
@@ -8,6 +10,12 @@ try:  # Assume we're a sub-module in a package.
         arguments as arg,
         schema as sh,
         log_progress,
+        cache,
+        spill,
+        memory,
+        json_codec,
+        profiling,
+        metrics,
     )
 except ImportError:  # Apparently no higher-level package has been imported, fall back to a local import.
     from . import fluxes as fx
@@ -16,6 +24,12 @@ except ImportError:  # Apparently no higher-level package has been imported, fal
         arguments as arg,
         schema as sh,
         log_progress,
+        cache,
+        spill,
+        memory,
+        json_codec,
+        profiling,
+        metrics,
     )
 
 
@@ -24,6 +38,8 @@ DEFAULT_FLUX_CONFIG = dict(
     tmp_files_template=fx.TMP_FILES_TEMPLATE,
     tmp_files_encoding=fx.TMP_FILES_ENCODING,
 )
+CONTEXT_FLUX_SETTINGS = ('job_folder', 'memory_budget')  # flux_config keys used by context, not by flux meta
+CACHE_FOLDER_NAME = 'cache'
 
 
 class FluxContext:
@@ -41,8 +57,12 @@ class FluxContext:
         self.logger = arg.undefault(logger, log_progress.get_logger())
         self.flux_config = arg.undefault(flux_config, DEFAULT_FLUX_CONFIG)
         self.conn_config = arg.undefault(conn_config, dict())
-        self.flux_instances = dict()
+        self.flux_instances = weakref.WeakValueDictionary()  # fluxes are kept alive by user code or by pinning
+        self.pinned_fluxes = dict()
         self.conn_instances = dict()
+        self.cache = None
+        self.spill_manager = None
+        self.profiler = None
 
         self.fx = fx
         self.cs = cs
@@ -91,24 +111,64 @@ class FluxContext:
             conn_object.check()
         return conn_object
 
-    def flux(self, flux, name=arg.DEFAULT, check=True, **kwargs):
+    def flux(self, flux, name=arg.DEFAULT, check=True, pin=False, **kwargs):
         name = arg.undefault(name, self.get_default_instance_name())
         if fx.is_flux(flux):
             flux_object = flux
         else:
             flux_class = fx.get_class(flux)
             flux_object = flux_class(**kwargs)
-        flux_object = flux_object.set_name(
-            name,
-            register=False,
-        ).fill_meta(
+        flux_object = flux_object.fill_meta(
             context=self,
             check=check,
-            **self.flux_config
+            **{k: v for k, v in self.flux_config.items() if k not in CONTEXT_FLUX_SETTINGS}
+        ).set_name(
+            name,
+            register=False,
         )
         self.flux_instances[name] = flux_object
+        if pin:
+            self.pin_flux(name)
         return flux_object
 
+    def pin_flux(self, name):
+        assert name in self.flux_instances, 'Flux must be defined (name {} is not registered)'.format(name)
+        self.pinned_fluxes[name] = self.flux_instances[name]
+
+    def unpin_flux(self, name):
+        return self.pinned_fluxes.pop(name, None) is not None
+
+    def is_pinned(self, name):
+        return name in self.pinned_fluxes
+
+    def get_flux_names(self):
+        return list(self.flux_instances.keys())
+
+    def memory_report(self):
+        report = list()
+        for name, flux_object in list(self.flux_instances.items()):
+            report.append(dict(
+                name=name,
+                flux_type=flux_object.class_name(),
+                pinned=self.is_pinned(name),
+                in_memory=flux_object.is_in_memory(),
+                count=flux_object.count,
+                size=flux_object.get_memory_footprint(),
+            ))
+        return sorted(report, key=lambda i: i['size'], reverse=True)
+
+    def evict(self, *names, larger_than=None):
+        if not names:
+            assert larger_than is not None, 'names or larger_than must be specified'
+            names = [i['name'] for i in self.memory_report() if i['size'] > larger_than]
+        evicted_count = 0
+        for name in names:
+            if self.flux_instances.pop(name, None) is not None:
+                evicted_count += 1
+            self.unpin_flux(name)
+        gc.collect()
+        return evicted_count
+
     def get(self, name, deep=True):
         if name in self.flux_instances:
             return self.flux_instances[name]
@@ -124,6 +184,8 @@ class FluxContext:
         assert old_name in self.flux_instances, 'Flux must be defined (name {} is not registered)'.format(old_name)
         if new_name != old_name:
             self.flux_instances[new_name] = self.flux_instances.pop(old_name)
+            if old_name in self.pinned_fluxes:
+                self.pinned_fluxes[new_name] = self.pinned_fluxes.pop(old_name)
 
     def get_job_folder(self):
         job_folder_obj = self.conn_instances.get('job')
@@ -146,6 +208,77 @@ class FluxContext:
                 self.conn_instances['tmp'] = tmp_folder
                 return tmp_folder
 
+    def get_cache(self):
+        if self.cache is None:
+            cache_folder = self.conn_config.get('cache_folder')
+            if not cache_folder:  # inside spill root, so tmp files of context stay in one configured location
+                cache_folder = os.path.join(self.get_spill_folder(), CACHE_FOLDER_NAME)
+            self.cache = cache.DiskCache(
+                cache_folder,
+                max_size=self.conn_config.get('max_cache_size', cache.DEFAULT_MAX_CACHE_SIZE),
+            )
+        return self.cache
+
+    def get_memory_budget(self):
+        return self.flux_config.get('memory_budget', memory.DEFAULT_MEMORY_BUDGET)
+
+    def set_memory_budget(self, memory_budget):  # flux_config is copied, DEFAULT_FLUX_CONFIG can be shared
+        self.flux_config = dict(self.flux_config, memory_budget=memory_budget)
+
+    def get_json_codec(self):
+        return json_codec.get_codec(self.conn_config.get('json_backend'))
+
+    def set_json_backend(self, backend):
+        json_codec.get_codec(backend)
+        self.conn_config['json_backend'] = backend
+
+    def get_metrics(self):  # registry fed by progress, file connectors, database inserts and spills
+        return metrics.get_registry()
+
+    def set_metrics(self, registry):
+        return metrics.set_registry(registry)
+
+    def get_profiler(self):
+        return self.profiler
+
+    def enable_profiling(self, trace_memory=False):  # fluxes created after this call are wrapped into profiled stages
+        self.disable_profiling()
+        self.profiler = profiling.Profiler(trace_memory=trace_memory).start()
+        return self.profiler
+
+    def disable_profiling(self, verbose=False):
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.stop()
+            self.profiler = None
+            self.log('Profiling report:\n{}'.format(profiler.get_report_str()), verbose=verbose)
+            return profiler.get_report()
+
+    @property
+    def profiling(self):
+        return self.profiler is not None and self.profiler.is_active()
+
+    @profiling.setter
+    def profiling(self, enabled):
+        if enabled:
+            self.enable_profiling()
+        else:
+            self.disable_profiling()
+
+    def get_spill_folder(self):
+        spill_folder = self.conn_config.get('spill_folder')
+        if not spill_folder:
+            spill_folder = spill.get_root(self.get_tmp_folder().get_path())
+        return spill_folder
+
+    def get_spill_manager(self):
+        if self.spill_manager is None or self.spill_manager.is_closed():
+            self.spill_manager = spill.get_manager(
+                self.get_spill_folder(),
+                max_disk_usage=self.conn_config.get('max_spill_size'),
+            )
+        return self.spill_manager
+
     def close_conn(self, name, recursively=False, verbose=True):
         closed_count = 0
         this_conn = self.conn_instances[name]
@@ -180,7 +313,8 @@ class FluxContext:
     def leave_flux(self, name, recursively=True, verbose=True):
         if name in self.flux_instances:
             self.close_flux(name, recursively=recursively, verbose=verbose)
-            self.flux_instances.pop(name)
+            self.unpin_flux(name)
+            self.flux_instances.pop(name, None)
             gc.collect()
             if not verbose:
                 return 1
@@ -196,7 +330,7 @@ class FluxContext:
 
     def close_all_fluxes(self, recursively=False, verbose=True):
         closed_fluxes, closed_links = 0, 0
-        for name in self.flux_instances:
+        for name in self.get_flux_names():
             closed_fluxes, closed_links = self.close_flux(name, recursively=recursively)
         if verbose:
             self.log('{} flux(es) and {} link(s) closed.'.format(closed_fluxes, closed_links))
@@ -206,6 +340,8 @@ class FluxContext:
     def close_all(self, verbose=True):
         closed_conns = self.close_all_conns(recursively=True, verbose=False)
         closed_fluxes, closed_links = self.close_all_fluxes(recursively=True, verbose=False)
+        if self.spill_manager is not None:
+            self.spill_manager.close()
         if verbose:
             self.log('{} conn(s), {} flux(es), {} link(s) closed.'.format(closed_conns, closed_fluxes, closed_links))
         else:
@@ -221,7 +357,7 @@ class FluxContext:
     def leave_all_fluxes(self, recursively=False):
         closed_fluxes, closed_links = self.close_all_fluxes(verbose=False)
         left_count = 0
-        for name in self.flux_instances.copy():
+        for name in self.get_flux_names():
             left_count += self.leave_flux(name, recursively=recursively, verbose=False)
         self.log('{} flux(es) and {} link(s) closed, {} flux(es) left'.format(closed_fluxes, closed_links, left_count))
 
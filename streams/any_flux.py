@@ -1,7 +1,9 @@
-from itertools import chain, tee
+from itertools import chain, tee, count, islice
+from collections.abc import Iterator
+from bisect import bisect_right
+from operator import itemgetter
 from datetime import datetime
 import inspect
-import json
 
 try:  # Assume we're a sub-module in a package.
     import fluxes as fx
@@ -11,7 +13,16 @@ try:  # Assume we're a sub-module in a package.
         functions as fs,
         selection,
         algo,
+        routing,
+        plan,
+        spill,
+        memory,
+        json_codec,
         log_progress,
+        profiling,
+        disk_dict,
+        containers,
+        sketches,
     )
 except ImportError:  # Apparently no higher-level package has been imported, fall back to a local import.
     from .. import fluxes as fx
@@ -21,10 +32,27 @@ except ImportError:  # Apparently no higher-level package has been imported, fal
         functions as fs,
         selection,
         algo,
+        routing,
+        plan,
+        spill,
+        memory,
+        json_codec,
         log_progress,
+        profiling,
+        disk_dict,
+        containers,
+        sketches,
     )
 
 
+DEFAULT_PARTITIONS_COUNT = 16
+
+
+def get_sort_keys(keys):
+    keys = arg.update(keys)
+    return tuple(keys) if isinstance(keys, (list, tuple)) else (keys, )
+
+
 class AnyFlux:
     def __init__(
             self,
@@ -36,8 +64,15 @@ class AnyFlux:
             max_items_in_memory=fx.MAX_ITEMS_IN_MEMORY,
             tmp_files_template=fx.TMP_FILES_TEMPLATE,
             tmp_files_encoding=fx.TMP_FILES_ENCODING,
+            sorted_by=None,
+            sorting_is_reversed=False,
+            profiler=None,
     ):
+        active_profiler = profiler or profiling.get_active_profiler()  # own profiler of chain started by profile()
+        if active_profiler is not None and not active_profiler.is_finished() and isinstance(data, Iterator):
+            data = active_profiler.wrap(data, '{}.{}'.format(self.__class__.__name__, profiling.get_caller_name()))
         self.data = data
+        self.sample = None  # first items of one-shot data, taken once by get_sample()
         if isinstance(data, (list, tuple)):
             self.count = len(data)
         else:
@@ -52,6 +87,9 @@ class AnyFlux:
         self.max_items_in_memory = max_items_in_memory
         self.tmp_files_template = tmp_files_template
         self.tmp_files_encoding = tmp_files_encoding
+        self.sorted_by = sorted_by
+        self.sorting_is_reversed = sorting_is_reversed
+        self.profiler = profiler
         if context is not None:
             self.put_into_context()
 
@@ -61,7 +99,7 @@ class AnyFlux:
     def put_into_context(self, name=arg.DEFAULT):
         assert self.context, 'for put_into_context context must be defined'
         name = arg.undefault(name, self.name)
-        if name not in self.context.flux_instances:
+        if name != arg.DEFAULT and name not in self.context.flux_instances:
             self.context.flux_instances[name] = self
 
     def get_name(self):
@@ -87,6 +125,7 @@ class AnyFlux:
         meta = self.__dict__.copy()
         meta.pop('data')
         meta.pop('name')
+        meta.pop('sample')
         return meta
 
     def get_meta_except_count(self):
@@ -94,6 +133,12 @@ class AnyFlux:
         meta.pop('count')
         return meta
 
+    def get_meta_except_sorting(self, except_count=False):
+        meta = self.get_meta_except_count() if except_count else self.get_meta()
+        meta['sorted_by'] = None
+        meta['sorting_is_reversed'] = False
+        return meta
+
     def set_meta(self, **meta):
         return self.__class__(
             self.data,
@@ -219,6 +264,44 @@ class AnyFlux:
     def iterable(self):
         yield from self.get_items()
 
+    def is_lazy(self):
+        return isinstance(self.data, plan.Plan)
+
+    def lazy(self):
+        if self.is_lazy():
+            return self
+        return self.__class__(
+            plan.Plan(self.data),
+            **self.get_meta()
+        )
+
+    def is_scan(self):
+        return isinstance(self.data, plan.Scan)
+
+    def explain(self):
+        if self.is_lazy():
+            return self.data.explain()
+        else:
+            return 'not lazy: {}'.format(self.data.__class__.__name__)
+
+    def get_mapped_items(self, function):
+        if self.is_lazy():
+            return self.data.map(function)
+        else:
+            return map(function, self.get_items())
+
+    def get_filtered_items(self, function):
+        if self.is_lazy():
+            return self.data.filter(function)
+        else:
+            return filter(function, self.get_items())
+
+    def get_wrapped_items(self, function, name=None):  # function(items) returns iterable, lazy plan is kept
+        if self.is_lazy():
+            return self.data.wrap(function, name)
+        else:
+            return function(self.get_items())
+
     def next(self):
         return next(
             self.iterable(),
@@ -280,25 +363,29 @@ class AnyFlux:
     def apply(self, function, native=True, save_count=False, lazy=True):
         if native:
             target_class = self.__class__
-            props = self.get_meta() if save_count else self.get_meta_except_count()
+            props = self.get_meta_except_sorting(except_count=not save_count)
         else:
             target_class = AnyFlux
             props = dict(count=self.count) if save_count else dict()
+        if lazy and self.is_lazy():
+            items = self.data.wrap(function)
+        else:
+            items = self.lazy_calc(function) if lazy else self.calc(function)
         return target_class(
-            self.lazy_calc(function) if lazy else self.calc(function),
+            items,
             **props
         )
 
     def native_map(self, function):
         return self.__class__(
-            map(function, self.get_items()),
+            self.get_mapped_items(function),
             count=self.count,
             less_than=self.count or self.less_than,
         )
 
     def map_to_any(self, function):
         return AnyFlux(
-            map(function, self.get_items()),
+            self.get_mapped_items(function),
             count=self.count,
             less_than=self.count or self.less_than,
         )
@@ -310,17 +397,18 @@ class AnyFlux:
             else:
                 return function(i)
         return fx.RecordsFlux(
-            map(get_record, self.get_items()),
+            self.get_mapped_items(get_record),
             count=self.count,
             less_than=self.less_than,
             check=True,
         )
 
-    def map(self, function=lambda i: i, to=None):
+    def map(self, function=lambda i: i, to=None, preserves_order=False):
         fx_class = self.get_class(to)
         new_props_keys = fx_class([]).get_meta().keys()
-        props = {k: v for k, v in self.get_meta().items() if k in new_props_keys}
-        items = map(function, self.iterable())
+        meta = self.get_meta() if preserves_order else self.get_meta_except_sorting()
+        props = {k: v for k, v in meta.items() if k in new_props_keys}
+        items = self.get_mapped_items(function)
         if self.is_in_memory():
             items = list(items)
         return fx_class(
@@ -334,7 +422,7 @@ class AnyFlux:
                 yield from function(i)
         fx_class = self.get_class(to)
         new_props_keys = fx_class([]).get_meta().keys()
-        props = {k: v for k, v in self.get_meta().items() if k in new_props_keys}
+        props = {k: v for k, v in self.get_meta_except_sorting().items() if k in new_props_keys}
         props.pop('count')
         return fx_class(
             get_items(),
@@ -348,7 +436,7 @@ class AnyFlux:
                     return False
             return True
         props = self.get_meta_except_count()
-        filtered_items = filter(filter_function, self.iterable())
+        filtered_items = self.get_filtered_items(filter_function)
         if self.is_in_memory():
             filtered_items = list(filtered_items)
             props['count'] = len(filtered_items)
@@ -378,10 +466,11 @@ class AnyFlux:
             yield n, i
 
     def enumerate(self, native=False):
-        props = self.get_meta()
         if native:
+            props = self.get_meta()
             target_class = self.__class__
         else:
+            props = self.get_meta_except_sorting()
             target_class = fx.PairsFlux
             props['secondary'] = fx.FluxType(self.class_name())
         return target_class(
@@ -391,33 +480,44 @@ class AnyFlux:
 
     def progress(self, expected_count=arg.DEFAULT, step=arg.DEFAULT, message='Progress'):
         count = arg.undefault(expected_count, self.count) or self.less_than
+        if self.is_lazy():
+            progress = self.get_logger().new_progress(message, count=count)
+            items = self.data.progress(progress, step=step)
+        else:
+            items = self.get_logger().progress(self.data, name=message, count=count, step=step)
         return self.__class__(
-            self.get_logger().progress(self.data, name=message, count=count, step=step),
+            items,
             **self.get_meta()
         )
 
     def take(self, max_count=1):
-        def take_items(m):
-            for n, i in self.enumerated_items():
+        def take_items(items):
+            for n, i in enumerate(items):
                 yield i
-                if n + 1 >= m:
+                if n + 1 >= max_count:
                     break
         props = self.get_meta()
         props['count'] = min(self.count, max_count) if self.count else None
+        if self.is_scan():
+            pushed_scan = self.data.push_limit(max_count)
+            if pushed_scan is not None:
+                return self.__class__(pushed_scan, **props)
         return self.__class__(
-            take_items(max_count),
+            self.get_wrapped_items(take_items, 'take({})'.format(max_count)),
             **props
         )
 
     def skip(self, count=1):
-        def skip_items(c):
-            for n, i in self.enumerated_items():
-                if n >= c:
+        def skip_items(items):
+            for n, i in enumerate(items):
+                if n >= count:
                     yield i
         if self.count and count >= self.count:
             next_items = []
+        elif self.is_in_memory():
+            next_items = self.get_items()[count:]
         else:
-            next_items = self.get_items()[count:] if self.is_in_memory() else skip_items(count)
+            next_items = self.get_wrapped_items(skip_items, 'skip({})'.format(count))
         props = self.get_meta()
         if self.count:
             props['count'] = self.count - count
@@ -428,6 +528,20 @@ class AnyFlux:
             **props
         )
 
+    def profile(self, trace_memory=False, verbose=True):  # stages built from this flux are profiled as well
+        profiler = self.profiler or profiling.get_active_profiler()
+        items = self.get_items()
+        props = self.get_meta()
+        if profiler is None:  # own profiler is passed to next stages by meta, other fluxes are not profiled
+            profiler = profiling.Profiler(
+                trace_memory=trace_memory,
+                on_finish=lambda p: self.log('Profiling report:\n{}'.format(p.get_report_str()), verbose=verbose),
+            ).start_tracing()
+            items = profiler.closing(items)
+            props['profiler'] = profiler
+        profiled = profiler.wrap(items, '{}.profile'.format(self.class_name()))
+        return self.__class__(profiled, **props)
+
     def pass_items(self):
         for _ in self.get_items():
             pass
@@ -451,7 +565,7 @@ class AnyFlux:
             chain_records = chain(new_items, old_items)
         else:
             chain_records = chain(old_items, new_items)
-        props = self.get_meta_except_count()
+        props = self.get_meta_except_sorting(except_count=True)
         return self.__class__(
             chain_records,
             **props
@@ -498,45 +612,59 @@ class AnyFlux:
             data_flux,
         )
 
-    def split_by_pos(self, pos):
-        first_flux, second_flux = self.tee(2)
-        return (
-            first_flux.take(pos),
-            second_flux.skip(pos),
+    def get_spill_manager(self):
+        if self.context is not None:
+            return self.context.get_spill_manager()
+        else:
+            return spill.get_manager(spill.get_root(self.tmp_files_template))
+
+    def new_spill_operation(self, name='operation'):
+        return self.get_spill_manager().new_operation(name)
+
+    def route(self, function, count, monotonic=False):
+        spill_operation = self.new_spill_operation('route')
+        outputs = routing.route(
+            self.get_items(),
+            function,
+            count,
+            monotonic=monotonic,
+            max_items_in_memory=self.max_items_in_memory,
+            file_template=spill_operation.get_file_template(),
+            on_close=spill_operation.close,
+            spill_operation=spill_operation,
         )
+        return [
+            self.__class__(
+                output,
+                **self.get_meta_except_count()
+            ) for output in outputs
+        ]
+
+    def split_by_pos(self, pos):
+        return tuple(self.split_by_list_pos([pos]))
 
     def split_by_list_pos(self, list_pos):
-        count_limits = len(list_pos)
-        cloned_fluxes = self.tee(count_limits + 1)
+        counter = count()
+        routed_fluxes = self.route(
+            lambda i: bisect_right(list_pos, next(counter)),
+            count=len(list_pos) + 1,
+            monotonic=True,
+        )
         filtered_fluxes = list()
         prev_pos = 0
-        for n, cur_pos in enumerate(list_pos):
-            count_items = cur_pos - prev_pos
+        for cur_pos, routed_flux in zip(list(list_pos) + [None], routed_fluxes):
+            if self.count is None:
+                count_items = None if cur_pos is None else cur_pos - prev_pos
+            else:
+                count_items = max(min(self.count, cur_pos or self.count) - min(self.count, prev_pos), 0)
             filtered_fluxes.append(
-                cloned_fluxes[n].skip(
-                    prev_pos,
-                ).take(
-                    count_items,
-                ).update_meta(
-                    count=count_items,
-                )
+                routed_flux.update_meta(count=count_items),
             )
             prev_pos = cur_pos
-        filtered_fluxes.append(
-            cloned_fluxes[-1].skip(
-                list_pos[-1],
-            )
-        )
         return filtered_fluxes
 
     def split_by_numeric(self, func, count):
-        return [
-            f.filter(
-                lambda i, n=n: func(i) == n,
-            ) for n, f in enumerate(
-                self.tee(count),
-            )
-        ]
+        return self.route(func, count)
 
     def split_by_boolean(self, func):
         return self.split_by_numeric(
@@ -577,15 +705,39 @@ class AnyFlux:
             )
             items = take_items()
 
+    def to_batches(self, size=algo.DEFAULT_BATCH_SIZE):
+        return AnyFlux(
+            algo.get_batches(self.iterable(), size),
+            count=(self.count + size - 1) // size if self.count is not None else None,
+        )
+
+    def map_batches(self, function, size=algo.DEFAULT_BATCH_SIZE, to=None, workers=1, use_processes=False):
+        fx_class = self.get_class(to)
+        new_props_keys = fx_class([]).get_meta().keys()
+        props = {k: v for k, v in self.get_meta_except_sorting(except_count=True).items() if k in new_props_keys}
+        items = algo.map_batches(
+            function, algo.get_batches(self.iterable(), size),
+            workers=workers, use_processes=use_processes,
+        )
+        return fx_class(
+            items,
+            **props
+        )
+
     def split_to_disk_by_step(
             self,
             step=arg.DEFAULT,
-            file_template=arg.DEFAULT, encoding=arg.DEFAULT,
+            file_template=arg.DEFAULT,
             sort_each_by=None, reverse=False,
+            spill_operation=None,
             verbose=True,
     ):
-        file_template = arg.undefault(file_template, self.tmp_files_template)
-        encoding = arg.undefault(encoding, self.tmp_files_encoding)
+        if step == arg.DEFAULT:
+            step = self.get_memory_step()
+        if spill_operation is None and file_template == arg.DEFAULT:
+            spill_operation = self.new_spill_operation('split')
+        if spill_operation is not None:
+            file_template = spill_operation.get_file_template()
         result_parts = list()
         for part_no, fx_part in enumerate(self.to_iter().split_to_iter_by_step(step)):
             part_fn = file_template.format(part_no)
@@ -597,12 +749,45 @@ class AnyFlux:
                     verbose=verbose,
                 )
             self.log('Writing {} ...'.format(part_fn), end='\r', verbose=verbose)
-            fx_part = fx_part.to_json().to_file(part_fn, encoding=encoding).map_to_any(json.loads)
-            result_parts.append(fx_part)
+            props = fx_part.get_meta()
+            props['count'] = spill.write_items(part_fn, fx_part.get_items(), spill_operation)
+            items = spill.read_items(part_fn)
+            if spill_operation is not None:
+                items = spill_operation.consume(part_fn, items)
+            result_parts.append(fx_part.__class__(items, **props))
         return result_parts
 
+    def is_sorted_by(self, *keys, reverse=None):
+        keys = get_sort_keys(keys)
+        if self.sorted_by is None:
+            return False
+        elif reverse is not None and reverse != self.sorting_is_reversed:
+            return False
+        elif keys:
+            return tuple(self.sorted_by[:len(keys)]) == keys
+        else:
+            return not self.sorted_by
+
+    def assume_sorted(self, *keys, reverse=False, verify=False):
+        keys = get_sort_keys(keys)
+        if verify:
+            items = algo.check_sorted(self.get_items(), fs.composite_key(keys) if keys else fs.same(), reverse=reverse)
+            if self.is_in_memory():
+                items = list(items)
+        else:
+            items = self.data
+        props = self.get_meta()
+        props['sorted_by'] = keys
+        props['sorting_is_reversed'] = reverse
+        return self.__class__(
+            items,
+            **props
+        )
+
     def memory_sort(self, key=fs.same(), reverse=False, verbose=False):
-        key_function = fs.composite_key(key)
+        if self.is_sorted_by(key, reverse=reverse):
+            return self
+        key_function = key if callable(key) else fs.composite_key(key)
         list_to_sort = self.get_list()
         count = len(list_to_sort)
         self.log('Sorting {} items in memory...'.format(count), end='\r', verbose=verbose)
@@ -613,17 +798,27 @@ class AnyFlux:
         )
         self.log('Sorting has been finished.', end='\r', verbose=verbose)
         self.count = len(sorted_items)
+        props = self.get_meta()
+        props['sorted_by'] = get_sort_keys([key])
+        props['sorting_is_reversed'] = reverse
         return self.__class__(
             sorted_items,
-            **self.get_meta()
+            **props
         )
 
     def disk_sort(self, key=fs.same(), reverse=False, step=arg.DEFAULT, verbose=False):
-        step = arg.undefault(step, self.max_items_in_memory)
-        key_function = fs.composite_key(key)
-        flux_parts = self.split_to_disk_by_step(
+        if self.is_sorted_by(key, reverse=reverse):
+            return self
+        if step == arg.DEFAULT:
+            step = self.get_memory_step()
+        key_function = key if callable(key) else fs.composite_key(key)
+        spill_operation = self.new_spill_operation('sort')
+        flux_parts = self.map_to_any(
+            lambda i: (key_function(i), i),
+        ).split_to_disk_by_step(
             step=step,
-            sort_each_by=key_function, reverse=reverse,
+            sort_each_by=itemgetter(0), reverse=reverse,
+            spill_operation=spill_operation,
             verbose=verbose,
         )
         assert flux_parts, 'streams must be non-empty'
@@ -631,35 +826,204 @@ class AnyFlux:
         counts = [f.count for f in flux_parts]
         props = self.get_meta()
         props['count'] = sum(counts)
+        props['sorted_by'] = get_sort_keys([key])
+        props['sorting_is_reversed'] = reverse
         self.log('Merging {} parts... '.format(len(iterables)), verbose=verbose)
         return self.__class__(
-            algo.merge_iter(iterables, key_function=key_function, reverse=reverse),
+            spill_operation.closing(algo.merge_keyed_iter(iterables, reverse=reverse)),
             **props
         )
 
     def sort(self, *keys, reverse=False, step=arg.DEFAULT, verbose=True):
         keys = arg.update(keys)
-        step = arg.undefault(step, self.max_items_in_memory)
+        if self.is_sorted_by(keys, reverse=reverse):
+            return self
+        if step == arg.DEFAULT:
+            step = self.get_memory_step()
         if len(keys) == 0:
             key_function = fs.same()
         else:
             key_function = fs.composite_key(keys)
         if self.can_be_in_memory():
-            return self.memory_sort(key_function, reverse=reverse, verbose=verbose)
+            sorted_flux = self.memory_sort(key_function, reverse=reverse, verbose=verbose)
         else:
-            return self.disk_sort(key_function, reverse=reverse, step=step, verbose=verbose)
+            sorted_flux = self.disk_sort(key_function, reverse=reverse, step=step, verbose=verbose)
+        sorted_flux.sorted_by = get_sort_keys(keys)
+        return sorted_flux
 
-    def map_side_join(self, right, key, how='left', right_is_uniq=True):
+    def top(self, count=10, *keys, reverse=False):  # same as sort(*keys, reverse=reverse).take(count) without full sort
+        keys = arg.update(keys)
+        if self.is_sorted_by(keys, reverse=reverse):
+            return self.take(count)
+        key_function = fs.composite_key(keys) if keys else fs.same()
+        items = algo.top(self.get_items(), count, key_function, reverse=reverse)
+        props = self.get_meta()
+        props['count'] = len(items)
+        props['sorted_by'] = get_sort_keys(keys)
+        props['sorting_is_reversed'] = reverse
+        return self.__class__(
+            items,
+            **props
+        )
+
+    def group_top(self, keys, count=10, by=None, reverse=False):  # groups in order of first appearance
+        group_function = self.get_distinct_key_function(get_sort_keys(keys))
+        by = get_sort_keys(by) if by is not None else tuple()
+        key_function = fs.composite_key(by) if by else fs.same()
+        groups = algo.group_top(self.get_items(), group_function, count, key_function, reverse=reverse)
+        items = [i for group_items in groups.values() for i in group_items]
+        props = self.get_meta_except_sorting()
+        props['count'] = len(items)
+        return self.__class__(
+            items,
+            **props
+        )
+
+    def get_distinct_key_function(self, keys):
+        key_function = fs.composite_key(keys) if keys else fs.same()
+        return lambda i: containers.get_hashable(key_function(i))
+
+    def distinct(
+            self, *keys,
+            keep='first',
+            approximate=False,
+            bloom_filter=False,
+            error_rate=sketches.DEFAULT_ERROR_RATE,
+            partitions_count=arg.DEFAULT,
+            step=arg.DEFAULT,
+    ):
+        assert keep in ('first', 'last'), 'keep must be first or last, got {}'.format(keep)
+        keys = arg.update(keys)
+        key_function = self.get_distinct_key_function(keys)
+        props = self.get_meta_except_count()
+        if self.is_sorted_by(*keys):
+            items = algo.distinct_sorted(self.get_items(), key_function, keep=keep)
+        elif self.is_in_memory():
+            items = algo.distinct_in_memory(self.get_items(), key_function, keep=keep)
+        elif approximate:  # constant memory, items with false positive keys are lost
+            assert keep == 'first', 'approximate distinct supports only keep=first'
+            capacity = self.estimate_count() or sketches.DEFAULT_CAPACITY
+            bloom = sketches.BloomFilter(capacity, error_rate=error_rate)
+            items = filter(lambda i: bloom.add(key_function(i)), self.get_items())
+        else:
+            items = self.get_distinct_items(key_function, keep, bloom_filter, error_rate, partitions_count, step)
+            props = self.get_meta_except_sorting(except_count=True)
+        return self.__class__(
+            list(items) if self.is_in_memory() else items,
+            **props
+        )
+
+    def get_distinct_items(self, key_function, keep, bloom_filter, error_rate, partitions_count, step):
+        if step == arg.DEFAULT:
+            step = self.get_memory_step()
+        items = iter(self.get_items())
+        seen = dict()  # key -> last item, used as set for keep=first
+        for item in items:
+            key = key_function(item)
+            if keep == 'first':
+                if key not in seen:
+                    seen[key] = None
+                    yield item
+            else:
+                seen.pop(key, None)
+                seen[key] = item
+            if len(seen) >= step:
+                break
+        else:
+            if keep == 'last':
+                yield from seen.values()
+            return
+        estimated_count = self.estimate_count()
+        if partitions_count == arg.DEFAULT:
+            partitions_count = max(2, -(-estimated_count // step)) if estimated_count else DEFAULT_PARTITIONS_COUNT
+        self.log('Distinct keys do not fit into memory, splitting by hash into {} parts...'.format(partitions_count))
+        spill_operation = self.new_spill_operation('distinct')
+        queues = [
+            routing.SpillQueue(
+                spill_operation.get_path('part_{}.tmp'.format(n)),
+                max_items_in_memory=max(1, step // partitions_count),
+                spill_operation=spill_operation,
+            ) for n in range(partitions_count)
+        ]
+        try:
+            yield from self.route_distinct(items, seen, queues, key_function, keep, bloom_filter, error_rate)
+            seen = None
+            for queue in queues:
+                yield from self.get_partition_distinct(queue, key_function, keep)
+        finally:
+            for queue in queues:
+                queue.close()
+            spill_operation.close()
+
+    def route_distinct(self, items, seen, queues, key_function, keep, bloom_filter, error_rate):
+        count = len(queues)
+        if keep == 'last':  # items kept in memory go first, later occurrences will replace them
+            for key, item in seen.items():
+                queues[hash(key) % count].put((False, item))
+            seen.clear()
+        bloom = None
+        if bloom_filter and keep == 'first':  # keys which are definitely new are yielded without waiting for partitions
+            bloom = sketches.BloomFilter(self.estimate_count() or sketches.DEFAULT_CAPACITY, error_rate=error_rate)
+        for item in items:
+            key = key_function(item)
+            if key in seen:
+                continue
+            is_yielded = bloom is not None and bloom.add(key)
+            queues[hash(key) % count].put((is_yielded, item))
+            if is_yielded:
+                yield item
+
+    @staticmethod
+    def get_partition_distinct(queue, key_function, keep):  # first routed item of key decides if it was yielded
+        if keep == 'first':
+            seen = set()
+            while queue:
+                is_yielded, item = queue.get()
+                key = key_function(item)
+                if key not in seen:
+                    seen.add(key)
+                    if not is_yielded:
+                        yield item
+        else:
+            last_items = dict()
+            while queue:
+                _, item = queue.get()
+                key = key_function(item)
+                last_items.pop(key, None)
+                last_items[key] = item
+            yield from last_items.values()
+
+    def count_distinct(self, *keys, approximate=False, error_rate=sketches.DEFAULT_ERROR_RATE):
+        return self.distinct(*keys, approximate=approximate, error_rate=error_rate).final_count()
+
+    def map_side_join(self, right, key, how='left', right_is_uniq=True, on_disk=False):
         assert fx.is_flux(right)
         assert how in algo.JOIN_TYPES, 'only {} join types are supported ({} given)'.format(algo.JOIN_TYPES, how)
+        if not on_disk and right.estimate_count() is not None and not right.can_be_in_memory():
+            self.log('Right flux does not fit into memory budget, using sorted join instead of map-side join')
+            return self.join(right, key, how=how)
         keys = arg.update([key])
+        key_function = fs.composite_key(keys)
+        if on_disk:  # right side is loaded into sqlite file, only recently used keys are kept in memory
+            spill_operation = self.new_spill_operation('join')
+            dict_right = disk_dict.DiskDict(
+                spill_operation.get_path('right.sqlite'),
+                of_lists=not right_is_uniq,
+                spill_operation=spill_operation,
+            )
+            dict_right.load_items(right.get_items(), key_function)
+        else:
+            dict_right = None
         joined_items = algo.map_side_join(
             iter_left=self.get_items(),
-            iter_right=right.get_items(),
-            key_function=fs.composite_key(keys),
+            iter_right=right.get_items() if dict_right is None else None,
+            key_function=key_function,
             how=how,
             uniq_right=right_is_uniq,
+            dict_right=dict_right,
         )
+        if on_disk:
+            joined_items = dict_right.closing(joined_items)
         return self.__class__(
             list(joined_items) if self.is_in_memory() else joined_items,
             **self.get_meta_except_count()
@@ -702,9 +1066,41 @@ class AnyFlux:
     def is_in_memory(self):
         return isinstance(self.data, (list, tuple))
 
+    def get_memory_footprint(self):  # estimated bytes held by items in memory, 0 for iterators
+        if self.is_in_memory():
+            item_size = memory.estimate_item_size(self.get_sample()) or 0
+            return int(item_size * len(self.data))
+        else:
+            return 0
+
+    def get_sample(self, count=memory.DEFAULT_SAMPLE_SIZE):
+        if self.is_in_memory():
+            return self.data[:count]
+        elif self.is_lazy():
+            return list()
+        else:
+            if self.sample is None:  # repeated calls must not wrap data into nested chains
+                items = iter(self.data)
+                self.sample = list(islice(items, count))
+                self.data = chain(self.sample, items)
+            return self.sample[:count]
+
+    def get_memory_budget(self):
+        if self.context is not None:
+            return self.context.get_memory_budget()
+        else:
+            return memory.DEFAULT_MEMORY_BUDGET
+
+    def get_memory_step(self):
+        item_size = memory.estimate_item_size(self.get_sample())
+        return memory.get_step(item_size, self.get_memory_budget(), max_items=self.max_items_in_memory)
+
     def can_be_in_memory(self, step=arg.DEFAULT):
-        step = arg.undefault(step, self.max_items_in_memory)
-        if self.is_in_memory() or step is None:
+        if self.is_in_memory():
+            return True
+        if step == arg.DEFAULT:
+            step = self.get_memory_step()
+        if step is None:
             return True
         else:
             return self.estimate_count() is not None and self.estimate_count() <= step
@@ -741,9 +1137,12 @@ class AnyFlux:
             check=True,
         )
 
-    def to_json(self):
+    def get_json_codec(self):
+        return json_codec.get_context_codec(self.context)
+
+    def to_json(self):  # format depends on backend, use context.set_json_backend('json') for stdlib format
         return self.map_to_any(
-            json.dumps
+            self.get_json_codec().dumps
         ).to_lines()
 
     def to_rows(self, *args, **kwargs):
@@ -755,7 +1154,7 @@ class AnyFlux:
             message = 'to_rows(): positional arguments are not supported for class {}'.format(self.class_name())
             raise ValueError(message)
         return fx.RowsFlux(
-            map(function, self.get_items()) if function is not None else self.get_items(),
+            self.get_mapped_items(function) if function is not None else self.get_items(),
             count=self.count,
             less_than=self.less_than,
         )
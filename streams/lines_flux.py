@@ -1,5 +1,4 @@
 import sys
-import json
 import csv
 import gzip as gz
 
@@ -9,6 +8,8 @@ try:
     from utils import (
         functions as fs,
         arguments as arg,
+        plan,
+        metrics,
     )
 except ImportError:
     from .. import fluxes as fx
@@ -16,6 +17,8 @@ except ImportError:
     from ..utils import (
         functions as fs,
         arguments as arg,
+        plan,
+        metrics,
     )
 
 max_int = sys.maxsize
@@ -32,14 +35,7 @@ def is_line(line):
 
 
 def check_lines(lines, skip_errors=False):
-    for i in lines:
-        if is_line(i):
-            pass
-        elif skip_errors:
-            continue
-        else:
-            raise TypeError('check_lines(): this item is not a line: {}'.format(i))
-        yield i
+    return plan.check(lines, is_line, 'check_lines(): this item is not a line: {}', skip_errors=skip_errors)
 
 
 class LinesFlux(fx.AnyFlux):
@@ -53,7 +49,10 @@ class LinesFlux(fx.AnyFlux):
             max_items_in_memory=fx.MAX_ITEMS_IN_MEMORY,
             tmp_files_template=fx.TMP_FILES_TEMPLATE,
             tmp_files_encoding=fx.TMP_FILES_ENCODING,
+            sorted_by=None,
+            sorting_is_reversed=False,
             context=None,
+            profiler=None,
     ):
         super().__init__(
             check_lines(data) if check else data,
@@ -64,6 +63,9 @@ class LinesFlux(fx.AnyFlux):
             max_items_in_memory=max_items_in_memory,
             tmp_files_template=tmp_files_template,
             tmp_files_encoding=tmp_files_encoding,
+            sorted_by=sorted_by,
+            sorting_is_reversed=sorting_is_reversed,
+            profiler=profiler,
         )
         self.check = check
 
@@ -75,22 +77,16 @@ class LinesFlux(fx.AnyFlux):
     def valid_items(items, skip_errors=False):
         return check_lines(items, skip_errors)
 
-    def parse_json(self, default_value=None, to='RecordsFlux'):
+    def parse_json(self, default_value=None, to='RecordsFlux', batch_size=None):
         if isinstance(to, str):
             to = fx.FluxType(to)
 
-        def json_loads(line):
-            try:
-                return json.loads(line)
-            except json.JSONDecodeError as err:
-                if default_value is not None:
-                    return default_value
-                else:
-                    raise json.JSONDecodeError(err.msg, err.doc, err.pos)
-        return self.map(
-            json_loads,
-            to=to,
-        ).set_meta(
+        codec = self.get_json_codec()
+        if batch_size:
+            parsed = self.map_batches(lambda b: codec.loads_batch(b, default_value), size=batch_size, to=to)
+        else:
+            parsed = self.map(lambda i: codec.loads_or_default(i, default_value), to=to)
+        return parsed.set_meta(
             count=self.count,
         )
 
@@ -139,6 +135,7 @@ class LinesFlux(fx.AnyFlux):
                 fh.write(str(i).encode(encoding) if gzip else str(i))
                 yield i
             fh.close()
+            metrics.report_file_operation('write', n + 1, path=filename)
             self.log('Done. {} rows has written into {}'.format(n + 1, filename), verbose=verbose)
         if immediately:
             self.to_file(
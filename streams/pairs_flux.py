@@ -3,12 +3,18 @@ try:  # Assume we're a sub-module in a package.
     from utils import (
         arguments as arg,
         readers,
+        plan,
+        containers,
+        disk_dict,
     )
 except ImportError:  # Apparently no higher-level package has been imported, fall back to a local import.
     from .. import fluxes as fx
     from ..utils import (
         arguments as arg,
         readers,
+        plan,
+        containers,
+        disk_dict,
     )
 
 
@@ -18,14 +24,7 @@ def is_pair(row):
 
 
 def check_pairs(pairs, skip_errors=False):
-    for i in pairs:
-        if is_pair(i):
-            pass
-        elif skip_errors:
-            continue
-        else:
-            raise TypeError('check_pairs(): this item is not pair: {}'.format(i))
-        yield i
+    return plan.check(pairs, is_pair, 'check_pairs(): this item is not pair: {}', skip_errors=skip_errors)
 
 
 def get_key(pair):
@@ -45,6 +44,9 @@ class PairsFlux(fx.RowsFlux):
             max_items_in_memory=fx.MAX_ITEMS_IN_MEMORY,
             tmp_files_template=fx.TMP_FILES_TEMPLATE,
             tmp_files_encoding=fx.TMP_FILES_ENCODING,
+            sorted_by=None,
+            sorting_is_reversed=False,
+            profiler=None,
     ):
         super().__init__(
             check_pairs(data) if check else data,
@@ -56,6 +58,9 @@ class PairsFlux(fx.RowsFlux):
             max_items_in_memory=max_items_in_memory,
             tmp_files_template=tmp_files_template,
             tmp_files_encoding=tmp_files_encoding,
+            sorted_by=sorted_by,
+            sorting_is_reversed=sorting_is_reversed,
+            profiler=profiler,
         )
         if secondary is None:
             self.secondary = fx.FluxType.AnyFlux
@@ -93,7 +98,8 @@ class PairsFlux(fx.RowsFlux):
         )
 
     def disk_sort_by_key(self, reverse=False, step=arg.DEFAULT):
-        step = arg.undefault(step, self.max_items_in_memory)
+        if step == arg.DEFAULT:
+            step = self.get_memory_step()
         return self.disk_sort(
             key=get_key,
             reverse=reverse,
@@ -122,14 +128,7 @@ class PairsFlux(fx.RowsFlux):
         return self.secondary_flux()
 
     def keys(self):
-        my_keys = list()
-        for i in self.get_items():
-            key = get_key(i)
-            if key in my_keys:
-                pass
-            else:
-                my_keys.append(key)
-        return my_keys
+        return containers.OrderedSet(map(get_key, self.get_items())).get_list()
 
     def extract_keys_in_memory(self):
         flux_for_keys, flux_for_items = self.tee(2)
@@ -140,7 +139,8 @@ class PairsFlux(fx.RowsFlux):
 
     def extract_keys_on_disk(self, file_template=arg.DEFAULT, encoding=arg.DEFAULT):
         encoding = arg.undefault(encoding, self.tmp_files_encoding)
-        file_template = arg.undefault(file_template, self.tmp_files_template)
+        if file_template == arg.DEFAULT:
+            file_template = self.new_spill_operation('keys').get_file_template()
         filename = file_template.format('json') if '{}' in file_template else file_template
         self.to_records().to_json().to_file(
             filename,
@@ -157,17 +157,19 @@ class PairsFlux(fx.RowsFlux):
         else:
             return self.extract_keys_on_disk()
 
-    def get_dict(self, of_lists=False):
-        result = dict()
-        if of_lists:
-            for k, v in self.get_items():
-                distinct = result.get(k, [])
-                if v not in distinct:
-                    result[k] = distinct + [v]
+    def get_dict(self, of_lists=False, distinct=True, on_disk=False):
+        if on_disk:  # returns disk_dict.DiskDict which should be closed after use, it closes its spill operation
+            spill_operation = self.new_spill_operation('dict')
+            return disk_dict.DiskDict(
+                spill_operation.get_path('dict.sqlite'),
+                of_lists=of_lists,
+                distinct=distinct,
+                spill_operation=spill_operation,
+            ).load(self.get_items())
+        elif of_lists:
+            return containers.MultiMap(self.get_items(), distinct=distinct).get_dict()
         else:
-            for k, v in self.get_items():
-                result[k] = v
-        return result
+            return dict(self.get_items())
 
     def to_records(self, key='key', value='value', **kwargs):
         function = kwargs.get('function') or (lambda i: {key: i[0], value: i[1]})
@@ -1,16 +1,18 @@
-import pandas as pd
-
 try:  # Assume we're a sub-module in a package.
     import fluxes as fx
     from utils import (
         arguments as arg,
+        lazy_import,
     )
 except ImportError:  # Apparently no higher-level package has been imported, fall back to a local import.
     from .. import fluxes as fx
     from ..utils import (
         arguments as arg,
+        lazy_import,
     )
 
+pd = lazy_import.LazyModule('pandas')
+
 
 class PandasFlux(fx.RecordsFlux):
     def __init__(
@@ -24,6 +26,9 @@ class PandasFlux(fx.RecordsFlux):
             max_items_in_memory=fx.MAX_ITEMS_IN_MEMORY,
             tmp_files_template=fx.TMP_FILES_TEMPLATE,
             tmp_files_encoding=fx.TMP_FILES_ENCODING,
+            sorted_by=None,
+            sorting_is_reversed=False,
+            profiler=None,
     ):
         if isinstance(data, pd.DataFrame):
             dataframe = data
@@ -41,6 +46,9 @@ class PandasFlux(fx.RecordsFlux):
             max_items_in_memory=max_items_in_memory,
             tmp_files_template=tmp_files_template,
             tmp_files_encoding=tmp_files_encoding,
+            sorted_by=sorted_by,
+            sorting_is_reversed=sorting_is_reversed,
+            profiler=profiler,
         )
 
     def iterable(self, as_records=True):
@@ -134,6 +142,9 @@ class PandasFlux(fx.RecordsFlux):
     def is_in_memory(self):
         return True
 
+    def get_memory_footprint(self):
+        return int(self.data.memory_usage(deep=True).sum())
+
     def to_memory(self):
         pass
 
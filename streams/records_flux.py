@@ -1,4 +1,4 @@
-import pandas as pd
+from functools import partial
 
 try:  # Assume we're a sub-module in a package.
     import fluxes as fx
@@ -8,6 +8,10 @@ try:  # Assume we're a sub-module in a package.
         functions as fs,
         mappers as ms,
         selection,
+        plan,
+        lazy_import,
+        algo,
+        sketches,
     )
 except ImportError:  # Apparently no higher-level package has been imported, fall back to a local import.
     from .. import fluxes as fx
@@ -17,22 +21,21 @@ except ImportError:  # Apparently no higher-level package has been imported, fal
         functions as fs,
         mappers as ms,
         selection,
+        plan,
+        lazy_import,
+        algo,
+        sketches,
     )
 
+pd = lazy_import.LazyModule('pandas')
+
 
 def is_record(item):
     return isinstance(item, dict)
 
 
 def check_records(records, skip_errors=False):
-    for r in records:
-        if is_record(r):
-            pass
-        elif skip_errors:
-            continue
-        else:
-            raise TypeError('check_records(): this item is not record: {}'.format(r))
-        yield r
+    return plan.check(records, is_record, 'check_records(): this item is not record: {}', skip_errors=skip_errors)
 
 
 def get_key_function(descriptions, take_hash=False):
@@ -60,6 +63,9 @@ class RecordsFlux(fx.AnyFlux):
             max_items_in_memory=fx.MAX_ITEMS_IN_MEMORY,
             tmp_files_template=fx.TMP_FILES_TEMPLATE,
             tmp_files_encoding=fx.TMP_FILES_ENCODING,
+            sorted_by=None,
+            sorting_is_reversed=False,
+            profiler=None,
     ):
         super().__init__(
             check_records(data) if check else data,
@@ -70,6 +76,9 @@ class RecordsFlux(fx.AnyFlux):
             max_items_in_memory=max_items_in_memory,
             tmp_files_template=tmp_files_template,
             tmp_files_encoding=tmp_files_encoding,
+            sorted_by=sorted_by,
+            sorting_is_reversed=sorting_is_reversed,
+            profiler=profiler,
         )
         self.check = check
 
@@ -102,11 +111,12 @@ class RecordsFlux(fx.AnyFlux):
             yield r
 
     def enumerate(self, native=False):
-        props = self.get_meta()
         if native:
+            props = self.get_meta()
             target_class = self.__class__
             enumerated = self.enumerated_records()
         else:
+            props = self.get_meta_except_sorting()
             target_class = fx.PairsFlux
             enumerated = self.enumerated_items()
             props['secondary'] = fx.FluxType(self.class_name())
@@ -116,6 +126,10 @@ class RecordsFlux(fx.AnyFlux):
         )
 
     def select(self, *fields, **expressions):
+        if self.is_scan() and fields and not expressions:
+            pushed_scan = self.data.push_columns(fields)
+            if pushed_scan is not None:
+                return self.__class__(pushed_scan, **self.get_meta())
         logger_for_cyclic_dependencies = self.get_logger()
         descriptions = selection.flatten_descriptions(
             *fields,
@@ -127,6 +141,10 @@ class RecordsFlux(fx.AnyFlux):
         )
 
     def filter(self, *fields, **expressions):
+        if self.is_scan() and expressions and not fields:
+            pushed_scan = self.data.push_filters(**expressions)
+            if pushed_scan is not None:
+                return self.__class__(pushed_scan, **self.get_meta_except_count())
         expressions_list = [
             (k, fs.equal(v) if isinstance(v, (str, int, float, bool)) else v)
             for k, v in expressions.items()
@@ -140,7 +158,7 @@ class RecordsFlux(fx.AnyFlux):
             return True
         props = self.get_meta()
         props.pop('count')
-        filtered_items = filter(filter_function, self.get_items())
+        filtered_items = self.get_filtered_items(filter_function)
         if self.is_in_memory():
             filtered_items = list(filtered_items)
             props['count'] = len(filtered_items)
@@ -156,15 +174,23 @@ class RecordsFlux(fx.AnyFlux):
             step=arg.DEFAULT,
             verbose=True,
     ):
+        if self.is_sorted_by(keys, reverse=reverse):
+            return self
         key_function = get_key_function(keys)
-        step = arg.undefault(step, self.max_items_in_memory)
+        if step == arg.DEFAULT:
+            step = self.get_memory_step()
         if self.can_be_in_memory():
-            return self.memory_sort(key_function, reverse, verbose=verbose)
+            sorted_flux = self.memory_sort(key_function, reverse, verbose=verbose)
         else:
-            return self.disk_sort(key_function, reverse, step=step, verbose=verbose)
+            sorted_flux = self.disk_sort(key_function, reverse, step=step, verbose=verbose)
+        sorted_flux.sorted_by = tuple(arg.update(keys))
+        return sorted_flux
 
-    def sorted_group_by(self, *keys, values=None, as_pairs=False):
+    def sorted_group_by(self, *keys, values=None, as_pairs=False, aggregations=None):
         keys = arg.update(keys)
+        if aggregations:
+            assert not (values or as_pairs), 'aggregations can not be combined with values or as_pairs'
+            return self.sorted_aggregate(keys, aggregations)
 
         def get_groups():
             key_function = get_key_function(keys)
@@ -192,25 +218,90 @@ class RecordsFlux(fx.AnyFlux):
             fx_groups.less_than = self.count or self.less_than
             return fx_groups
 
-    def group_by(self, *keys, values=None, step=arg.DEFAULT, as_pairs=False, take_hash=True, verbose=True):
+    def sorted_aggregate(self, keys, aggregations):  # aggregations: dict(out_field=(field, aggregator))
+        key_function = get_key_function(keys)
+        key_fields = [k if isinstance(k, str) else 'key_{}'.format(n) for n, k in enumerate(keys)]  # for functions
+
+        def get_record(key, group_sketches):
+            record = dict(zip(key_fields, key if len(keys) > 1 else [key]))
+            record.update({out: sketch.get_result() for out, sketch in group_sketches.items()})
+            return record
+
+        def get_records():
+            first_record, group_sketches, prev_k = None, None, None
+            for r in self.get_items():
+                k = key_function(r)
+                if first_record is None or k != prev_k:
+                    if first_record is not None:
+                        yield get_record(prev_k, group_sketches)
+                    first_record, prev_k = r, k
+                    group_sketches = {out: sketches.get_aggregator(a) for out, (_, a) in aggregations.items()}
+                for out, (field, _) in aggregations.items():
+                    value = r.get(field)
+                    if value is not None:
+                        group_sketches[out].add(value)
+            if first_record is not None:
+                yield get_record(prev_k, group_sketches)
+        if all([isinstance(k, str) for k in keys]) and self.is_sorted_by(keys):  # i.e. not sorted by hash of keys
+            sorting = dict(sorted_by=tuple(keys), sorting_is_reversed=self.sorting_is_reversed)
+        else:
+            sorting = dict()
+        fx_records = fx.RecordsFlux(get_records(), check=False, **sorting)
+        if self.is_in_memory():
+            return fx_records.to_memory()
+        else:
+            fx_records.less_than = self.count or self.less_than
+            return fx_records
+
+    def group_by(
+            self, *keys,
+            values=None, aggregations=None,
+            step=arg.DEFAULT, as_pairs=False, take_hash=True, verbose=True,
+    ):
         keys = arg.update(keys)
-        step = arg.undefault(step, self.max_items_in_memory)
-        if as_pairs:
-            key_for_sort = keys
+        if step == arg.DEFAULT:
+            step = self.get_memory_step()
+        if self.is_sorted_by(keys):
+            sorted_fx = self
         else:
-            key_for_sort = get_key_function(keys, take_hash=take_hash)
-        sorted_fx = self.sort(
-            key_for_sort,
-            step=step,
-            verbose=verbose,
-        )
+            if as_pairs:
+                key_for_sort = keys
+            else:
+                key_for_sort = get_key_function(keys, take_hash=take_hash)
+            sorted_fx = self.sort(
+                key_for_sort,
+                step=step,
+                verbose=verbose,
+            )
         grouped_fx = sorted_fx.sorted_group_by(
             keys,
             values=values,
             as_pairs=as_pairs,
+            aggregations=aggregations,
         )
         return grouped_fx
 
+    def get_summaries(self, *fields, workers=1, step=arg.DEFAULT):  # dict field -> mergeable sketches.FieldSummary
+        fields = arg.update(fields) or None
+        if workers > 1:  # partial summaries of batches are computed by processes and merged
+            step = arg.undefault(step, algo.DEFAULT_BATCH_SIZE)
+            summarize_batch = partial(sketches.summarize_batch, fields=fields)
+            partial_summaries = algo.map_batches(
+                summarize_batch, algo.get_batches(self.get_items(), step),
+                workers=workers, use_processes=True,
+            )
+            summaries = dict()
+            for s in partial_summaries:
+                sketches.merge_summaries(summaries, s)
+            return summaries
+        else:
+            return sketches.summarize_records(self.get_items(), fields)
+
+    def describe(self, *fields, workers=1, step=arg.DEFAULT):  # one record with approximate statistics per field
+        summaries = self.get_summaries(*fields, workers=workers, step=step)
+        records = [dict(field=f, **s.get_result()) for f, s in summaries.items()]
+        return fx.RecordsFlux(records, count=len(records))
+
     def get_dataframe(self, columns=None):
         dataframe = pd.DataFrame(self.data)
         if columns:
@@ -385,10 +476,12 @@ class RecordsFlux(fx.AnyFlux):
         )
         return parsed_flux
 
-    def get_dict(self, key, value=None, of_lists=False):
+    def get_dict(self, key, value=None, of_lists=False, distinct=True, on_disk=False):
         return self.to_pairs(
             key,
             value,
         ).get_dict(
             of_lists,
+            distinct=distinct,
+            on_disk=on_disk,
         )
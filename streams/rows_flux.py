@@ -3,12 +3,14 @@ try:  # Assume we're a sub-module in a package.
     from utils import (
         arguments as arg,
         selection,
+        plan,
     )
 except ImportError:  # Apparently no higher-level package has been imported, fall back to a local import.
     from .. import fluxes as fx
     from ..utils import (
         arguments as arg,
         selection,
+        plan,
     )
 
 
@@ -17,14 +19,7 @@ def is_row(row):
 
 
 def check_rows(rows, skip_errors=False):
-    for i in rows:
-        if is_row(i):
-            pass
-        elif skip_errors:
-            continue
-        else:
-            raise TypeError('check_rows(): this item is not row: {}'.format(i))
-        yield i
+    return plan.check(rows, is_row, 'check_rows(): this item is not row: {}', skip_errors=skip_errors)
 
 
 class RowsFlux(fx.AnyFlux):
@@ -38,7 +33,10 @@ class RowsFlux(fx.AnyFlux):
             max_items_in_memory=fx.MAX_ITEMS_IN_MEMORY,
             tmp_files_template=fx.TMP_FILES_TEMPLATE,
             tmp_files_encoding=fx.TMP_FILES_ENCODING,
+            sorted_by=None,
+            sorting_is_reversed=False,
             context=None,
+            profiler=None,
     ):
         super().__init__(
             check_rows(data) if check else data,
@@ -49,6 +47,9 @@ class RowsFlux(fx.AnyFlux):
             max_items_in_memory=max_items_in_memory,
             tmp_files_template=tmp_files_template,
             tmp_files_encoding=tmp_files_encoding,
+            sorted_by=sorted_by,
+            sorting_is_reversed=sorting_is_reversed,
+            profiler=profiler,
         )
         self.check = check
 
@@ -69,15 +70,17 @@ class RowsFlux(fx.AnyFlux):
         def get_records(rows, cols):
             for r in rows:
                 yield {k: v for k, v in zip(cols, r)}
+        props = self.get_meta()
         if function:
-            records = map(function, self.get_items())
+            records = self.get_mapped_items(function)
+            props = self.get_meta_except_sorting()  # arbitrary mapping does not keep order by the same keys
         elif columns:
             records = get_records(self.get_items(), columns)
         else:
             records = map(lambda r: dict(row=r), self.get_items())
         return fx.RecordsFlux(
             records,
-            **self.get_meta()
+            **props
         )
 
     def schematize(self, schema, skip_bad_rows=False, skip_bad_values=False, verbose=True):
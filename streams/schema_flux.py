@@ -103,6 +103,9 @@ class SchemaFlux(fx.RowsFlux):
             max_items_in_memory=fx.MAX_ITEMS_IN_MEMORY,
             tmp_files_template=fx.TMP_FILES_TEMPLATE,
             tmp_files_encoding=fx.TMP_FILES_ENCODING,
+            sorted_by=None,
+            sorting_is_reversed=False,
+            profiler=None,
     ):
         super().__init__(
             check_rows(data, schema) if check else data,
@@ -114,6 +117,9 @@ class SchemaFlux(fx.RowsFlux):
             max_items_in_memory=max_items_in_memory,
             tmp_files_template=tmp_files_template,
             tmp_files_encoding=tmp_files_encoding,
+            sorted_by=sorted_by,
+            sorting_is_reversed=sorting_is_reversed,
+            profiler=profiler,
         )
         self.schema = schema or list()
 
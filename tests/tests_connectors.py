@@ -0,0 +1,202 @@
+import os
+
+try:  # Assume we're a sub-module in a package.
+    import conns as cs
+    import fluxes as fx
+    import context as fc
+    from connectors import databases as dbs
+    from utils import json_codec, metrics
+    from connectors import files
+except ImportError:  # Apparently no higher-level package has been imported, fall back to a local import.
+    from .. import conns as cs
+    from .. import fluxes as fx
+    from .. import context as fc
+    from ..connectors import databases as dbs
+    from ..utils import json_codec, metrics
+    from ..connectors import files
+
+
+EXAMPLE_FILENAME = 'test_connectors.tmp'
+EXAMPLE_CSV_LINES = ['name,value_count,flag'] + ['n{},{},{}'.format(i, i, i % 2) for i in range(10)]
+
+
+class StubDatabase(dbs.PostgresDatabase):  # records queries instead of executing them
+    def __init__(self, rows):
+        super().__init__('stub', host='localhost', port=5432, db='test', user=None, password=None)
+        self.rows = rows
+        self.queries = list()
+
+    def connect(self, reconnect=True):
+        pass
+
+    def execute(self, query=dbs.TEST_QUERY, get_data=dbs.AUTO, commit=dbs.AUTO, data=None, verbose=dbs.AUTO):
+        self.queries.append(query)
+        return self.rows
+
+
+class StubConnection:  # stands in for a pooled connection of insert_batches_in_parallel()
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class StubUploadDatabase(StubDatabase):  # records inserted batches per connection
+    def __init__(self):
+        super().__init__(rows=list())
+        self.connections = list()
+        self.inserted = list()
+
+    def new_connection(self):
+        connection = StubConnection()
+        self.connections.append(connection)
+        return connection
+
+    def insert_rows(self, table, rows, columns, step=dbs.DEFAULT_STEP, skip_errors=False, connection=None, **kwargs):
+        assert connection in self.connections and not connection.closed
+        if 'bad' in rows and not skip_errors:
+            raise ValueError('bad row')
+        self.inserted.append((connection, [r for r in rows if r != 'bad'], step, skip_errors))
+
+
+def test_csv_pushdown():
+    with open(EXAMPLE_FILENAME, 'w') as f:
+        f.write('\n'.join(EXAMPLE_CSV_LINES))
+    csv_file = cs.CsvFile(EXAMPLE_FILENAME, verbose=False)
+    expected_0 = [{'name': 'n1', 'value_count': 1}, {'name': 'n3', 'value_count': 3}]
+    flux_0 = csv_file.filter(flag='1').select('name', 'value_count').take(2)
+    assert flux_0.explain().startswith('scan('), 'test case 0: pushed down'
+    assert flux_0.get_list() == expected_0, 'test case 1'
+    expected_2 = [{'name': 'n3'}]
+    received_2 = csv_file.select('name').filter(name='n3').get_list()
+    assert received_2 == expected_2, 'test case 2: filter after select'
+    expected_3 = [{'name': 'n4', 'value_count': 4, 'flag': '0'}]
+    received_3 = csv_file.filter(value_count=lambda v: v > 3).take(1).get_list()
+    assert received_3 == expected_3, 'test case 3: not pushed down filter'
+    os.remove(EXAMPLE_FILENAME)
+
+
+def test_file_metrics():
+    registry = fc.FluxContext().set_metrics(metrics.MetricsRegistry())
+    with open(EXAMPLE_FILENAME, 'w') as f:
+        f.write('\n'.join(EXAMPLE_CSV_LINES))
+    lines = cs.TextFile(EXAMPLE_FILENAME, verbose=False).get_lines()
+    assert [next(lines), next(lines)] == EXAMPLE_CSV_LINES[:2], 'test case 0'
+    lines.close()
+    assert registry.counter('file_lines_total', operation='read').get_value() == 2, 'test case 1: partial read'
+    assert cs.TextFile(EXAMPLE_FILENAME, verbose=False).to_lines_flux().get_list() == EXAMPLE_CSV_LINES, 'test case 2'
+    received_3 = registry.counter('file_lines_total', operation='read').get_value()
+    assert received_3 == 2 + len(EXAMPLE_CSV_LINES), 'test case 3: full read'
+    fc.FluxContext().set_metrics(metrics.MetricsRegistry())
+    os.remove(EXAMPLE_FILENAME)
+
+
+def test_table_pushdown():
+    database = StubDatabase(rows=[('a', 1)])
+    table = dbs.Table('test_table', schema=['name', 'value', 'flag'], database=database, reconnect=False)
+    expected_0 = [{'name': 'a', 'value': 1}]
+    received_0 = table.filter(flag=True, name="it's").select('name', 'value').take(5).get_list()
+    assert received_0 == expected_0, 'test case 0'
+    expected_1 = "SELECT name, value FROM test_table WHERE flag = TRUE AND name = 'it''s' LIMIT 5;"
+    assert database.queries == [expected_1], 'test case 1: query'
+
+
+def test_insert_batches_in_parallel():
+    batches = [[1, 2, 3], [4, 5], [6], [7, 8, 9, 10]]
+    database = StubUploadDatabase()
+    received_0 = database.insert_batches_in_parallel('test_table', batches, ['value'], workers=2, verbose=False)
+    assert received_0 == 9, 'test case 0: count of inserted rows minus one, as insert_rows() returns'
+    assert len(database.connections) == 2, 'test case 1: one connection per worker'
+    assert all(c.closed for c in database.connections), 'test case 2: connections closed'
+    received_3 = sorted(r for _, batch, _, _ in database.inserted for r in batch)
+    assert received_3 == list(range(1, 11)), 'test case 3: every batch inserted once'
+    assert all(step == len(batch) for _, batch, step, _ in database.inserted), 'test case 4: batch as step'
+    database = StubUploadDatabase()
+    bad_batches = [[1, 'bad'], [2, 3]]
+    try:
+        database.insert_batches_in_parallel('test_table', bad_batches, ['value'], workers=2, verbose=False)
+        raise AssertionError('test case 5: error not raised')
+    except ValueError:
+        pass
+    assert all(c.closed for c in database.connections), 'test case 6: connections closed after error'
+    database = StubUploadDatabase()
+    received_7 = database.insert_batches_in_parallel(
+        'test_table', bad_batches, ['value'], workers=2, skip_errors=True, verbose=False,
+    )
+    assert received_7 == 3, 'test case 7: skip_errors'
+    assert all(skip for _, _, _, skip in database.inserted), 'test case 8: skip_errors passed to insert_rows'
+    assert database.insert_batches_in_parallel('test_table', [], ['value'], verbose=False) == 0, 'test case 9'
+
+
+def test_json_file():
+    example = [{'a': 1, 'b': [1, 2]}, {'c': 'x'}, {'d': None}]
+    fx.AnyFlux(example).to_json().to_file(EXAMPLE_FILENAME)
+    expected_0 = example
+    received_0 = cs.JsonFile(EXAMPLE_FILENAME, verbose=False).to_records_flux().get_list()
+    assert received_0 == expected_0, 'test case 0'
+    lines = ['{"a": 1}', b'[1, 2]', 'abc', b'{"b": "x"}']
+    expected_1 = [{'a': 1}, [1, 2], None, {'b': 'x'}]
+    for backend in json_codec.get_available_backends():
+        codec = json_codec.get_codec(backend)
+        assert codec.loads(codec.dumps(example)) == example, 'test case 1: {}'.format(backend)
+        for batch_size in (None, 2):
+            received_2 = list(codec.loads_lines(lines, default_value=dict(), batch_size=batch_size))
+            assert [i or None for i in received_2] == expected_1, 'test case 2: {} by {}'.format(backend, batch_size)
+        received_3 = codec.loads(codec.dumps([float('inf'), -float('inf'), float('nan')]))
+        assert received_3[:2] == [float('inf'), -float('inf')] and received_3[2] != received_3[2], 'test case 3'
+        for broken in (['{"a": 1', '"b": 2}', '{"c": 3}, {"d": 4}'], ['[1', '2]', '3, 4'], [b'[1', '2]']):
+            received_5 = codec.loads_batch(broken, default_value='bad')
+            assert received_5 == ['bad'] * len(broken), 'test case 5: broken lines by {}'.format(backend)
+    example_4 = [{'a': 'é', 'b': 1.5, 'c': float('inf')}]
+    received_4 = fx.AnyFlux(example_4).to_json().get_list()
+    assert json_codec.get_codec('json').loads_batch(received_4) == example_4, 'test case 4: configured codec'
+    context = fc.FluxContext()
+    context.set_json_backend('json')
+    received_7 = fx.AnyFlux([{'a': 'é', 'b': 1.5}], context=context).to_json().get_list()
+    assert received_7 == ['{"a": "\\u00e9", "b": 1.5}'], 'test case 7: stdlib format for json backend'
+    context.set_json_backend(None)
+    received_6 = fx.LinesFlux(['{"a": 1', '"b": 2}', '{"c": 3}, {"d": 4}', '{"e": 5}']).parse_json(
+        default_value=dict(bad=True), batch_size=4,
+    ).get_list()
+    assert received_6 == [dict(bad=True)] * 3 + [{'e': 5}], 'test case 6: parse_json by batch'
+    os.remove(EXAMPLE_FILENAME)
+
+
+def test_parquet_file():
+    if not files.has_pyarrow():
+        return
+    filename = 'test_connectors.parquet.tmp'
+    example = [dict(name='n{}'.format(i), value_count=i, flag=i % 2 == 1) for i in range(25)]
+    parquet_file = cs.ParquetFile(filename, batch_size=10, verbose=False)
+    parquet_file.write_flux(fx.RecordsFlux(example))
+    assert parquet_file.get_count() == 25, 'test case 0'
+    expected_1 = ['name', 'value_count', 'flag']
+    assert parquet_file.get_columns() == expected_1, 'test case 1: schema'
+    assert parquet_file.to_records_flux().get_list() == example, 'test case 2'
+    expected_3 = [{'name': 'n1'}, {'name': 'n3'}]
+    received_3 = parquet_file.filter(flag=True).select('name').take(2)
+    assert received_3.explain().startswith('scan('), 'test case 3: pushed down'
+    assert received_3.get_list() == expected_3, 'test case 4'
+    row_groups = parquet_file.get_row_groups(parquet_file.get_parquet_file(), filters=[('value_count', 22)])
+    assert row_groups == [2], 'test case 5: row groups skipped by statistics'
+    parquet_file = cs.ParquetFile(filename, batch_size=2, verbose=False)
+    example_6 = [{'a': None, 'b': 1}] * 2 + [{'a': 'x', 'b': 2}]
+    parquet_file.write_flux(fx.RecordsFlux(example_6))
+    assert parquet_file.to_records_flux().get_list() == example_6, 'test case 6: type of empty column from next batch'
+    try:
+        parquet_file.write_flux(fx.RecordsFlux([{'a': 1}] * 2 + [{'a': 2, 'c': 3}]))
+        raised_7 = False
+    except ValueError:
+        raised_7 = True
+    assert raised_7, 'test case 7: new key is not dropped silently'
+    os.remove(filename)
+
+
+if __name__ == '__main__':
+    test_csv_pushdown()
+    test_file_metrics()
+    test_table_pushdown()
+    test_insert_batches_in_parallel()
+    test_json_file()
+    test_parquet_file()
@@ -1,3 +1,5 @@
+import time
+
 import fluxes as fx
 from utils import mappers as ms
 
@@ -68,8 +70,40 @@ def test_get_first_values():
     assert received == expected
 
 
+def test_items_to_dict():
+    example = [{'k': 1, 'v': 'a'}, {'k': 2, 'v': 'b'}, {'k': 1, 'v': 'a'}, {'k': 1, 'v': 'c'}]
+    expected_0 = {1: ['a', 'c'], 2: ['b']}
+    received_0 = ms.items_to_dict(example, lambda r: r['k'], lambda r: r['v'], of_lists=True)
+    assert received_0 == expected_0, 'test case 0: distinct values'
+    expected_1 = {1: ['a', 'a', 'c'], 2: ['b']}
+    received_1 = ms.items_to_dict(example, lambda r: r['k'], lambda r: r['v'], of_lists=True, distinct=False)
+    assert received_1 == expected_1, 'test case 1: all values'
+    expected_2 = {1: [example[0], example[3]], 2: [example[1]]}
+    received_2 = ms.items_to_dict(example, lambda r: r['k'], of_lists=True)
+    assert received_2 == expected_2, 'test case 2: unhashable values'
+    received_3 = fx.PairsFlux([(2, 'x'), (1, 'y'), (2, 'z'), (3, 'x')]).keys()
+    assert received_3 == [2, 1, 3], 'test case 3: ordered keys'
+    durations = list()
+    for count in (5000, 20000):
+        records = [{'k': 0, 'v': i} for i in range(count)]
+        start_time = time.perf_counter()
+        received_4 = ms.items_to_dict(records, lambda r: r['k'], of_lists=True)
+        durations.append(time.perf_counter() - start_time)
+        assert len(received_4[0]) == count, 'test case 4: distinct records'
+    assert durations[1] < durations[0] * 8, 'test case 5: linear time for records {}'.format(durations)
+
+
+def test_approximate_histograms():
+    example = [{'x': i} for i in range(10)] + [{'x': 'a' if i % 3 else 'b'} for i in range(90)]
+    assert dict(ms.get_histograms(example, max_values=2))['x'] == {0: 1, 1: 1}, 'test case 0: first values'
+    received = dict(ms.get_histograms(example, max_values=2, approximate=True))['x']
+    assert received == {'a': 60, 'b': 30}, 'test case 1: most frequent values'
+
+
 if __name__ == '__main__':
     test_calc_histogram()
     test_norm_text()
     test_sum_by_keys()
     test_get_first_values()
+    test_items_to_dict()
+    test_approximate_histograms()
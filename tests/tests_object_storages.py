@@ -0,0 +1,246 @@
+import io
+import gzip
+import tempfile
+import threading
+import os
+
+try:  # Assume we're a sub-module in a package.
+    import fluxes as fx
+    import context as fc
+    from connectors import object_storages as os3
+    from utils import cache, algo
+except ImportError:  # Apparently no higher-level package has been imported, fall back to a local import.
+    from .. import fluxes as fx
+    from .. import context as fc
+    from ..connectors import object_storages as os3
+    from ..utils import cache, algo
+
+
+EXAMPLE_LINES = ['line {}: {}'.format(n, 'x' * n) for n in range(100)]
+
+
+class StubBody:
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+    def iter_chunks(self, chunk_size=1024):
+        return iter(lambda: self.stream.read(chunk_size), b'')
+
+    def __iter__(self):
+        return iter(self.stream)
+
+
+class StubS3Client:  # implements the subset of S3 API used by connectors, keeps objects in memory
+    def __init__(self):
+        self.objects = dict()
+        self.uploads = dict()
+
+    def head_object(self, Bucket, Key):
+        data = self.objects[(Bucket, Key)]
+        return dict(ContentLength=len(data), ETag='"{}"'.format(hash(data)))
+
+    def get_object(self, Bucket, Key, Range=None):
+        data = self.objects[(Bucket, Key)]
+        if Range:
+            first_byte, last_byte = Range.split('=')[1].split('-')
+            data = data[int(first_byte): int(last_byte) + 1]
+        return dict(Body=StubBody(data), ContentLength=len(data))
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[(Bucket, Key)] = Body
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = str(len(self.uploads))
+        self.uploads[upload_id] = dict()
+        return dict(UploadId=upload_id)
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId][PartNumber] = Body
+        return dict(ETag='"{}"'.format(PartNumber))
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        numbers = [p['PartNumber'] for p in MultipartUpload['Parts']]
+        self.objects[(Bucket, Key)] = b''.join([parts[n] for n in numbers])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId)
+
+    def list_objects_v2(self, Bucket, Prefix='', Delimiter=None, MaxKeys=1000, ContinuationToken=None):
+        keys = sorted(k for b, k in self.objects if b == Bucket and k.startswith(Prefix))
+        first = int(ContinuationToken or 0)
+        response = dict(Contents=[dict(Key=k) for k in keys[first:first + MaxKeys]])
+        if first + MaxKeys < len(keys):
+            response['IsTruncated'] = True
+            response['NextContinuationToken'] = str(first + MaxKeys)
+        return response
+
+
+def get_stub_folder(name='', context=None):
+    bucket = os3.S3Storage(verbose=False, context=context).bucket('test-bucket')
+    bucket.client = StubS3Client()
+    return bucket.folder(name)
+
+
+def test_multipart_upload_and_download():
+    expected = '\n'.join(EXAMPLE_LINES).encode('utf8')
+    s3_object = get_stub_folder().object('example.txt')
+    parts_count = s3_object.write_flux(
+        fx.LinesFlux(EXAMPLE_LINES),
+        part_size=500,
+        workers=3,
+    )
+    assert parts_count > 1, 'test case 0: multipart upload'
+    assert s3_object.get_size() == len(expected), 'test case 1: size'
+    received_2 = b''.join(s3_object.yield_parts(part_size=300, workers=3))
+    assert received_2 == expected, 'test case 2: ranged download'
+    received_3 = s3_object.get_buffer(part_size=300, workers=3, max_size_in_memory=1000).read()
+    assert received_3 == expected, 'test case 3: spooled buffer'
+
+
+def test_single_part_upload():
+    s3_object = get_stub_folder().object('small.txt')
+    parts_count = s3_object.write_lines(['a', 'b'])
+    assert parts_count == 1
+    assert s3_object.get_buffer().read() == b'a\nb'
+
+
+def test_streaming_lines():
+    folder = get_stub_folder()
+    folder.object('example.txt').write_lines(EXAMPLE_LINES, part_size=500)
+    received_0 = folder.object('example.txt').to_lines_flux(chunk_size=7).get_list()
+    assert received_0 == EXAMPLE_LINES, 'test case 0: plain text'
+    received_1 = folder.object('example.txt').to_lines_flux(workers=3).get_list()
+    assert received_1 == EXAMPLE_LINES, 'test case 1: ranged parts'
+    compressed = gzip.compress('\n'.join(EXAMPLE_LINES[:50]).encode('utf8'))
+    compressed += gzip.compress(('\n' + '\n'.join(EXAMPLE_LINES[50:])).encode('utf8'))
+    folder.get_bucket().upload_parts('example.txt.gz', [compressed])
+    received_2 = folder.object('example.txt.gz').to_lines_flux(chunk_size=11).get_list()
+    assert received_2 == EXAMPLE_LINES, 'test case 2: multi-member gzip'
+
+
+def test_streaming_records():
+    folder = get_stub_folder('data')
+    folder.object('example.csv').write_lines(['x,y_count', 'a,1', 'b,"2"'])
+    expected_0 = [{'x': 'a', 'y_count': 1}, {'x': 'b', 'y_count': 2}]
+    received_0 = folder.object('example.csv').to_records_flux(chunk_size=3).get_list()
+    assert received_0 == expected_0, 'test case 0: csv'
+    expected_1 = [['a', 1], ['b', 2]]
+    received_1 = folder.object('example.csv').to_rows_flux().get_list()
+    assert received_1 == expected_1, 'test case 1: rows'
+    folder.object('example.json').write_lines(['{"x": "a"}', '{"x": "b"}'])
+    expected_2 = [{'x': 'a'}, {'x': 'b'}]
+    received_2 = folder.object('example.json').to_records_flux().get_list()
+    assert received_2 == expected_2, 'test case 2: json'
+    folder.object('empty.csv').write_lines([])
+    assert folder.object('empty.csv').to_records_flux().get_list() == [], 'test case 3: empty object'
+
+
+def test_prefix_flux():
+    folder = get_stub_folder('shards')
+    expected = list()
+    for n in range(5):
+        shard = ['{}-{}'.format(n, i) for i in range(20)]
+        folder.object('part-{}.txt'.format(n)).write_lines(shard)
+        expected += shard
+    received_0 = folder.to_lines_flux('part-', workers=1).get_list()
+    assert received_0 == expected, 'test case 0: sequential'
+    received_1 = folder.to_lines_flux('part-', workers=3).get_list()
+    assert received_1 == expected, 'test case 1: concatenated'
+    received_2 = folder.to_lines_flux('part-', interleave=True, workers=3).get_list()
+    assert sorted(received_2) == sorted(expected), 'test case 2: interleaved'
+    client = folder.get_bucket().client
+    get_object = client.get_object
+    opened_by = list()
+    client.get_object = lambda **kwargs: opened_by.append(threading.current_thread()) or get_object(**kwargs)
+    received_3 = folder.to_lines_flux('part-', interleave=True, workers=2).get_list()
+    assert sorted(received_3) == sorted(expected), 'test case 3'
+    assert threading.main_thread() not in opened_by, 'test case 4: objects are opened by workers'
+    client.get_object = get_object
+    release = threading.Event()
+    pulled = list()
+
+    def get_iterables():
+        for n in range(5):
+            pulled.append(n)
+            yield get_waiting_items(n)
+
+    def get_waiting_items(n):
+        yield n
+        release.wait()
+    items = algo.interleave_in_parallel(get_iterables(), workers=2)
+    received_5 = [next(items)]
+    assert len(pulled) == 2, 'test case 5: only workers iterables are started'
+    release.set()
+    received_5 += list(items)
+    assert sorted(received_5) == list(range(5)), 'test case 6'
+
+
+def test_cached_reading():
+    with tempfile.TemporaryDirectory() as cache_folder:
+        context = fc.FluxContext(conn_config=dict(cache_folder=cache_folder))
+        folder = get_stub_folder(context=context)
+        s3_object = folder.object('example.txt')
+        s3_object.write_lines(EXAMPLE_LINES, part_size=500)
+        received_0 = s3_object.to_lines_flux(use_cache=True).get_list()
+        assert received_0 == EXAMPLE_LINES, 'test case 0: first read'
+        client = folder.get_bucket().client
+        get_object = client.get_object
+        client.get_object = None
+        received_1 = s3_object.to_lines_flux(use_cache=True).get_list()
+        assert received_1 == EXAMPLE_LINES, 'test case 1: read from cache'
+        client.get_object = get_object
+        expected_2 = '\n'.join(EXAMPLE_LINES).encode('utf8')
+        received_2 = s3_object.get_buffer(use_cache=True).read()
+        assert received_2 == expected_2, 'test case 2: bytes'
+        client.get_object = None
+        with s3_object.get_buffer(use_cache=True) as buffer:
+            received_3 = buffer.read()
+        assert received_3 == expected_2, 'test case 3: bytes from cache'
+        client.get_object = get_object
+        client.put_object('test-bucket', 'example.txt', b'changed')
+        received_4 = s3_object.to_lines_flux(use_cache=True).get_list()
+        assert received_4 == ['changed'], 'test case 4: changed etag'
+        client.put_object('test-bucket', 'example.txt', b'a\r\nb\nc\r\n\r\nd\r')
+        expected_5 = list(s3_object.get_lines(end='\r\n'))
+        assert expected_5 == ['a', 'b\nc', '', 'd\r'], 'test case 5'
+        received_6 = list(s3_object.get_lines(end='\r\n', use_cache=True))
+        assert received_6 == expected_5, 'test case 6: custom end on first read'
+        client.get_object = None
+        received_7 = list(s3_object.get_lines(end='\r\n', use_cache=True))
+        assert received_7 == expected_5, 'test case 7: custom end from cache'
+        client.get_object = get_object
+    with tempfile.TemporaryDirectory() as spill_folder:
+        context = fc.FluxContext(conn_config=dict(spill_folder=spill_folder))
+        expected_8 = os.path.join(spill_folder, 'cache')
+        assert context.get_cache().get_folder() == expected_8, 'test case 8: default cache folder in spill root'
+
+
+def test_cache_eviction():
+    with tempfile.TemporaryDirectory() as cache_folder:
+        disk_cache = cache.DiskCache(cache_folder, max_size=160)
+        for n in range(3):
+            disk_cache.put_items(cache.get_key(n), [[n, 'x' * 40]])
+        received_0 = list(disk_cache.get_items(cache.get_key(0)))
+        assert received_0 == [[0, 'x' * 40]], 'test case 0'
+        disk_cache.put_items(cache.get_key(3), [[3, 'x' * 40]])
+        received_1 = [n for n in range(4) if disk_cache.has(cache.get_key(n))]
+        assert received_1 == [0, 2, 3], 'test case 1: least recently used evicted'
+        disk_cache.clear()
+        assert disk_cache.get_size() == 0, 'test case 2'
+        lines = ['a\r', 'b\rc', '\r', 'd']
+        assert list(disk_cache.cache_lines('cr', lines)) == lines, 'test case 3'
+        assert list(disk_cache.get_lines('cr')) == lines, 'test case 4: carriage returns kept'
+
+
+if __name__ == '__main__':
+    test_multipart_upload_and_download()
+    test_single_part_upload()
+    test_streaming_lines()
+    test_streaming_records()
+    test_prefix_flux()
+    test_cached_reading()
+    test_cache_eviction()
@@ -1,7 +1,33 @@
+from datetime import date
+import time
+import os
+
 try:  # Assume we're a sub-module in a package.
     import fluxes as fx
+    import context as fc
+    from utils import (
+        lazy_import,
+        log_progress,
+        profiling,
+        metrics,
+        sketches,
+        algo,
+        memory,
+        functions as fs,
+    )
 except ImportError:  # Apparently no higher-level package has been imported, fall back to a local import.
     from .. import fluxes as fx
+    from .. import context as fc
+    from ..utils import (
+        lazy_import,
+        log_progress,
+        profiling,
+        metrics,
+        sketches,
+        algo,
+        memory,
+        functions as fs,
+    )
 
 
 EXAMPLE_FILENAME = 'test_file.tmp'
@@ -358,6 +384,41 @@ def test_split_by_func():
     assert received == expected
 
 
+def test_split_single_pass():
+    calls = list()
+
+    def is_even(i):
+        calls.append(i)
+        return i % 2 == 0
+    expected_0 = [i for i in EXAMPLE_INT_SEQUENCE if i % 2], [i for i in EXAMPLE_INT_SEQUENCE if not i % 2]
+    a, b = fx.AnyFlux(
+        EXAMPLE_INT_SEQUENCE,
+    ).set_meta(
+        max_items_in_memory=2,
+        tmp_files_template='test_split_single_pass_{}.tmp',
+    ).split(
+        is_even,
+    )
+    received_0 = b.get_list(), a.get_list()
+    assert received_0 == expected_0[::-1], 'test case 0: sequential consumers with spill'
+    assert calls == EXAMPLE_INT_SEQUENCE, 'test case 1: predicate evaluated once per item'
+    received_2 = [f for f in os.listdir('test_split_single_pass_spill.tmp')]
+    assert received_2 == [], 'test case 2: spill files removed'
+    a, b, c = fx.AnyFlux(
+        iter(EXAMPLE_INT_SEQUENCE),
+    ).split(
+        lambda i: i % 3,
+        count=3,
+    )
+    received_3 = [c.get_list(), next(a.get_items()), b.get_list()]
+    expected_3 = [[5, 2, 8], 3, [1, 7, 4]]
+    assert received_3 == expected_3, 'test case 3: numeric split'
+    rows = [(i, date(2020, 1, 1 + i)) for i in range(6)]
+    odd, even = fx.AnyFlux(iter(rows)).set_meta(max_items_in_memory=1).split(lambda r: r[0] % 2 == 0)
+    received_4 = even.get_list(), odd.get_list()
+    assert received_4 == (rows[::2], rows[1::2]), 'test case 4: spilled items keep types'
+
+
 def test_split_by_step():
     expected = [
         [1, 3, 5, 7],
@@ -394,7 +455,7 @@ def test_memory_sort():
 
 
 def test_disk_sort_by_key():
-    expected = [[k, str(k) * k] for k in range(1, 10)]
+    expected = [(k, str(k) * k) for k in range(1, 10)]
     received = fx.AnyFlux(
         [(k, str(k) * k) for k in EXAMPLE_INT_SEQUENCE],
     ).set_meta(
@@ -403,7 +464,86 @@ def test_disk_sort_by_key():
     ).disk_sort_by_key(
         step=5,
     ).get_list()
-    assert received == expected
+    assert received == expected, 'test case 0'
+    rows = [(i % 5, date(2020, 1, 1 + i % 3)) for i in range(20)]
+    received_1 = fx.AnyFlux(iter(rows)).disk_sort(step=3, verbose=False).get_list()
+    assert received_1 == sorted(rows), 'test case 1: spilled parts keep types'
+
+
+def test_spill_manager():
+    template = 'test_spill_{}.tmp'
+    spill_root = 'test_spill_spill.tmp'
+    flux_a = fx.AnyFlux(list(range(20, 0, -1))).set_meta(tmp_files_template=template)
+    flux_b = fx.AnyFlux(list(range(40, 20, -1))).set_meta(tmp_files_template=template)
+    sorted_a = flux_a.disk_sort(step=3)
+    sorted_b = flux_b.disk_sort(step=3)
+    assert len(os.listdir(spill_root)) == 2, 'test case 0: folder for each operation'
+    received_1 = list(sorted_a.get_items()), list(sorted_b.get_items())
+    expected_1 = list(range(1, 21)), list(range(21, 41))
+    assert received_1 == expected_1, 'test case 1: concurrent sorts'
+    assert os.listdir(spill_root) == [], 'test case 2: parts removed after merge'
+    manager = flux_a.get_spill_manager()
+    manager.max_disk_usage = 10
+    try:
+        flux_a.disk_sort(step=3)
+        raised = False
+    except OSError:
+        raised = True
+    manager.max_disk_usage = None
+    assert raised, 'test case 3: disk budget'
+    assert manager.get_disk_usage() == 0, 'test case 4'
+    odd, even = fx.AnyFlux(iter(range(20))).set_meta(tmp_files_template=template, max_items_in_memory=2).split(
+        lambda i: i % 2 == 0,
+    )
+    assert even.get_list() == list(range(0, 20, 2)), 'test case 5'
+    assert manager.get_disk_usage() > 0, 'test case 6: route spill files in disk budget'
+    assert odd.get_list() == list(range(1, 20, 2)) and manager.get_disk_usage() == 0, 'test case 7'
+    manager.max_disk_usage = 10
+    try:
+        fx.AnyFlux(iter(range(100))).set_meta(tmp_files_template=template).distinct(step=10).get_list()
+        raised = False
+    except OSError:
+        raised = True
+    manager.max_disk_usage = None
+    assert raised, 'test case 8: distinct spill in disk budget'
+    assert manager.get_disk_usage() == 0 and os.listdir(spill_root) == [], 'test case 9: nothing left over budget'
+    manager.close()
+    assert not os.path.exists(spill_root), 'test case 10: cleanup on close'
+
+
+def test_memory_budget():
+    flux = fx.AnyFlux(iter(EXAMPLE_INT_SEQUENCE))
+    sample = flux.get_sample(3)
+    assert sample == [1, 3, 5], 'test case 0'
+    assert flux.get_list() == EXAMPLE_INT_SEQUENCE, 'test case 1: sampled items are kept'
+    small_step = fx.AnyFlux([{'a': 1}] * 10).get_memory_step()
+    big_step = fx.AnyFlux([{'a': 'x' * 10000}] * 10).get_memory_step()
+    assert small_step > big_step, 'test case 2: step depends on item size'
+    capped_step = fx.AnyFlux([1, 2, 3]).set_meta(max_items_in_memory=2).get_memory_step()
+    assert capped_step == 2, 'test case 3: max_items_in_memory is upper limit'
+    expected_4 = [(1, 2), (None, 33), ('a', 'c'), ('b', 'c')]
+    received_4 = fx.AnyFlux(
+        ['a', 'b', 1],
+    ).map_side_join(
+        fx.AnyFlux(iter(['c', 2, 33]), count=3).update_meta(max_items_in_memory=2),
+        key=(lambda i: str(type(i)), lambda i: len(str(i))),
+        how='right',
+    ).get_list()
+    assert received_4 == expected_4, 'test case 4: sorted join fallback'
+    flux_5 = fx.AnyFlux(range(5))
+    assert flux_5.can_be_in_memory(step=10) is not None and flux_5.data == range(5), 'test case 5: not sampled'
+    assert memory.get_step(10 ** 6, memory_budget=10 ** 8) == 100, 'test case 6: step fits into budget'
+    assert memory.get_step(10 ** 9, memory_budget=10 ** 8) == 1, 'test case 7: huge items'
+    flux_8 = fx.AnyFlux(iter(EXAMPLE_INT_SEQUENCE))
+    sampled_data = flux_8.get_sample(3) and flux_8.data
+    assert flux_8.get_memory_step() and flux_8.get_sample(3) == [1, 3, 5], 'test case 8: same sample'
+    assert flux_8.data is sampled_data and flux_8.get_list() == EXAMPLE_INT_SEQUENCE, 'test case 9: sampled once'
+    context = fc.FluxContext()
+    context.set_memory_budget(10 ** 6)
+    flux_10 = context.flux(fx.AnyFlux([1, 2]), name='test_memory_budget')
+    assert flux_10.get_memory_budget() == 10 ** 6, 'test case 10: budget from flux_config'
+    assert 'memory_budget' not in fc.DEFAULT_FLUX_CONFIG and 'memory_budget' not in context.conn_config, 'test case 11'
+    context.leave_flux('test_memory_budget')
 
 
 def test_sort():
@@ -443,6 +583,32 @@ def test_sort():
     assert received_2 == expected_2, 'test case 2'
 
 
+def test_sortedness_tracking():
+    sorted_flux = fx.AnyFlux(
+        EXAMPLE_INT_SEQUENCE,
+    ).sort()
+    assert sorted_flux.is_sorted_by(), 'test case 0'
+    assert sorted_flux.sort() is sorted_flux, 'test case 1: sort skipped'
+    assert sorted_flux.filter(lambda i: i > 3).take(3).is_sorted_by(), 'test case 2: order preserving'
+    assert not sorted_flux.map(lambda i: -i).is_sorted_by(), 'test case 3: map'
+    assert sorted_flux.map(str, preserves_order=True).is_sorted_by(), 'test case 4: declared map'
+    assert not sorted_flux.is_sorted_by(reverse=True), 'test case 5: reverse'
+    expected_6 = [2, 1, 3]
+    received_6 = fx.AnyFlux([1, 1, 2, 3, 3, 3]).assume_sorted(verify=True).map_to_records(
+        lambda i: dict(k=i),
+    ).assume_sorted('k').group_by('k').map_to_any(len).get_list()
+    assert received_6 == expected_6, 'test case 6: group_by without sort'
+    try:
+        fx.AnyFlux(EXAMPLE_INT_SEQUENCE).assume_sorted(verify=True)
+        raised = False
+    except ValueError:
+        raised = True
+    assert raised, 'test case 7: verification'
+    sorted_rows = fx.RowsFlux([(1, 'b'), (2, 'a')]).assume_sorted(0)
+    assert sorted_rows.is_sorted_by(0), 'test case 8'
+    assert not sorted_rows.to_records(function=lambda r: dict(k=r[1])).is_sorted_by(0), 'test case 9: to_records'
+
+
 def test_sorted_group_by_key():
     example = [
         (1, 11), (1, 12),
@@ -629,6 +795,71 @@ def test_to_rows():
     assert received == expected
 
 
+def test_lazy_plan():
+    def get_flux():
+        return fx.AnyFlux(
+            EXAMPLE_INT_SEQUENCE,
+        ).map(
+            lambda i: dict(x=i, y=i * 2),
+            to=fx.RecordsFlux,
+        ).filter(
+            x=lambda x: x > 2,
+        ).select(
+            'x', z='y',
+        ).map_to_any(
+            lambda r: r['x'] + r['z'],
+        )
+    expected_0 = get_flux().get_list()
+    lazy_flux = fx.AnyFlux(EXAMPLE_INT_SEQUENCE).lazy()
+    received_0 = lazy_flux.map(
+        lambda i: dict(x=i, y=i * 2),
+        to=fx.RecordsFlux,
+    ).filter(
+        x=lambda x: x > 2,
+    ).select(
+        'x', z='y',
+    ).map_to_any(
+        lambda r: r['x'] + r['z'],
+    )
+    assert received_0.is_lazy(), 'test case 0: lazy mode is kept'
+    explained = received_0.explain().split('\n')
+    assert len(explained) == 2, 'test case 1: one fused loop'
+    assert explained[1].count('check(') == 2, 'test case 2: validation after filter is skipped'
+    assert received_0.get_list() == expected_0, 'test case 3: same result'
+    try:
+        fx.AnyFlux([1, 'a']).lazy().map(lambda i: i, to=fx.LinesFlux).get_list()
+        raised = False
+    except TypeError:
+        raised = True
+    assert raised, 'test case 4: validation in fused loop'
+    received_5 = fx.AnyFlux(iter(EXAMPLE_INT_SEQUENCE)).lazy().map(lambda i: i * 2).take(4).skip(1).map(lambda i: i + 1)
+    assert received_5.is_lazy(), 'test case 5: lazy mode is kept after take and skip'
+    expected_6 = ['fused loop: map(<lambda>)', 'wrap(take(4))', 'wrap(skip(1))', 'fused loop: map(<lambda>)']
+    assert received_5.explain().split('\n')[1:] == expected_6, 'test case 6: segments split by wrapped steps'
+    assert received_5.get_list() == [7, 11, 15], 'test case 7'
+
+
+def test_batches():
+    expected_0 = [[1, 3, 5, 7], [9, 2, 4, 6], [8]]
+    received_0 = fx.AnyFlux(EXAMPLE_INT_SEQUENCE).to_batches(4)
+    assert received_0.count == 3, 'test case 0: count of batches'
+    assert received_0.get_list() == expected_0, 'test case 1'
+    expected_2 = [4, 12, 11, 10, 8]
+    for workers in (1, 2):
+        received_2 = fx.AnyFlux(
+            iter(EXAMPLE_INT_SEQUENCE),
+        ).map_batches(
+            lambda b: [sum(b)],
+            size=2,
+            workers=workers,
+        ).get_list()
+        assert received_2 == expected_2, 'test case 2: {} workers'.format(workers)
+    example = ['{"a": 1}', '1, 2', '{"b": 2}', 'abc']
+    expected_3 = [{'a': 1}, {'err': 'err'}, {'b': 2}, {'err': 'err'}]
+    received_3 = fx.LinesFlux(example).parse_json(default_value={'err': 'err'}, batch_size=3).get_list()
+    assert received_3 == expected_3, 'test case 3: batch parsing with bad lines'
+
+
 def test_parse_json():
     example = ['{"a": "b"}', 'abc', '{"d": "e"}']
     expected = [{'a': 'b'}, {'err': 'err'}, {'d': 'e'}]
@@ -641,6 +872,248 @@ def test_parse_json():
     assert received == expected
 
 
+def test_lazy_import():
+    lazy_module = lazy_import.LazyModule('colorsys')
+    assert not lazy_import.is_loaded(lazy_module), 'test case 0'
+    assert lazy_module.rgb_to_hsv(0, 0, 0) == (0, 0, 0), 'test case 1'
+    assert lazy_import.is_loaded(lazy_module), 'test case 2'
+    assert not lazy_import.is_installed('not_installed_module.submodule'), 'test case 3'
+    expected_4 = [{'a': 1}, {'a': 2}]
+    received_4 = list(fx.PandasFlux(expected_4).get_records())
+    assert received_4 == expected_4, 'test case 4: pandas is imported on first use'
+
+
+def test_flux_registry():
+    context = fc.FluxContext()
+    context.flux(fx.AnyFlux(list(range(1000))), name='temporary')
+    pinned = context.flux(fx.AnyFlux(list(range(10))), name='pinned', pin=True)
+    kept = context.flux(fx.AnyFlux(iter(range(10))), name='kept')
+    assert context.get_flux_names() == ['pinned', 'kept'], 'test case 0: unreferenced flux is not retained'
+    del pinned
+    assert context.get('pinned') is not None, 'test case 1: pinned flux is retained'
+    report = context.memory_report()
+    assert [i['name'] for i in report] == ['pinned', 'kept'], 'test case 2: sorted by size'
+    assert report[0]['size'] > 0 and report[1]['size'] == 0, 'test case 3'
+    assert context.evict(larger_than=0) == 1, 'test case 4'
+    assert context.get_flux_names() == ['kept'], 'test case 5'
+    assert kept.get_list() == list(range(10)), 'test case 6'
+
+
+def test_progress():
+    progress = log_progress.Progress('test', logger=None)
+    received_0 = list(progress.iterate(iter(range(2500)), step=1000))
+    assert received_0 == list(range(2500)), 'test case 0'
+    assert progress.position == 2499, 'test case 1: position after finish'
+    taken = list()
+
+    def get_items():
+        for i in range(10000):
+            taken.append(i)
+            yield i
+    received_2 = fx.AnyFlux(get_items()).progress(step=1000).take(3).get_list()
+    assert received_2 == [0, 1, 2], 'test case 2'
+    assert len(taken) == 3, 'test case 3: no read ahead'
+    received_4 = fx.AnyFlux(EXAMPLE_INT_SEQUENCE).lazy().progress(step=2).get_list()
+    assert received_4 == EXAMPLE_INT_SEQUENCE, 'test case 4: progress in fused loop'
+
+
+def test_profiling():
+    with profiling.Profiler() as profiler:
+        received_0 = fx.AnyFlux(iter(EXAMPLE_INT_SEQUENCE)).map(lambda i: i * 10).filter(lambda i: i > 40).get_list()
+    assert received_0 == [50, 70, 90, 60, 80], 'test case 0'
+    report = profiler.get_report()
+    assert [r['stage'] for r in report] == ['AnyFlux.test_profiling', 'AnyFlux.map', 'AnyFlux.filter'], 'test case 1'
+    assert [r['items_out'] for r in report] == [9, 9, 5], 'test case 2: items out'
+    assert [r['items_in'] for r in report] == [0, 9, 9], 'test case 3: items in'
+    assert min([r['own_time'] for r in report]) >= 0, 'test case 4: upstream time excluded'
+    assert profiling.get_active_profiler() is None, 'test case 5'
+    reports = list()
+    flux = fx.AnyFlux(iter(EXAMPLE_INT_SEQUENCE)).profile(verbose=False)
+    profiler = flux.profiler
+    profiler.on_finish = reports.append
+    other_flux = fx.AnyFlux(iter([1]))
+    received_6 = flux.map(lambda i: i + 1).get_list()
+    assert received_6 == [i + 1 for i in EXAMPLE_INT_SEQUENCE], 'test case 6'
+    assert reports == [profiler] and profiling.get_active_profiler() is None, 'test case 7: stopped when exhausted'
+    assert len(profiler.get_report()) == 2, 'test case 8'
+    profiled_9 = fx.AnyFlux(iter(range(100))).profile(verbose=False).map(lambda i: i * 2)
+    profiler_9 = profiled_9.profiler
+    received_9 = profiled_9.take(3).get_list()
+    del profiled_9
+    assert received_9 == [0, 2, 4], 'test case 9'
+    assert profiler_9.is_finished(), 'test case 10: stopped when partially read chain is released'
+    assert other_flux.profiler is None, 'test case 11: profile() is scoped to its chain'
+    assert not isinstance(other_flux.data, profiling.ProfiledIterator), 'test case 12: other flux is not profiled'
+    profiler = profiling.Profiler()
+    assert list(profiler.wrap(['é', 'ab', b'c'], 'lines', measure_size=True)) == ['é', 'ab', b'c'], 'test case 13'
+    assert profiler.get_report()[0]['size'] == 5, 'test case 14: size in bytes'
+
+
+def test_metrics():
+    registry = fc.FluxContext().set_metrics(metrics.MetricsRegistry())
+    registry.counter('rows_total', 'Rows', table='a').inc(3)
+    registry.counter('rows_total', 'Rows', table='a').inc(2)
+    registry.gauge('lag').set(1.5)
+    registry.histogram('latency', buckets=(0.1, 1)).observe(0.5)
+    received_0 = registry.to_prometheus().split('\n')
+    assert 'flux_rows_total{table="a"} 5' in received_0, 'test case 0: counter'
+    assert '# TYPE flux_lag gauge' in received_0 and 'flux_lag 1.5' in received_0, 'test case 1: gauge'
+    expected_2 = [
+        'flux_latency_bucket{le="0.1"} 0',
+        'flux_latency_bucket{le="1"} 1',
+        'flux_latency_bucket{le="+Inf"} 1',
+    ]
+    assert [i for i in received_0 if i.startswith('flux_latency_bucket')] == expected_2, 'test case 2: histogram'
+    snapshots = list()
+    registry.add_callback(snapshots.append, interval=None)
+    fx.AnyFlux(iter(range(2500))).progress(message='counted', step=1000).pass_items()
+    items = [m for m in snapshots[-1]['metrics'] if m['name'] == 'flux_progress_items_total']
+    assert [(i['labels'], i['value']) for i in items] == [(dict(operation='counted'), 2500)], 'test case 3: progress'
+    fx.AnyFlux(EXAMPLE_INT_SEQUENCE).to_lines().to_file(EXAMPLE_FILENAME, verbose=False)
+    assert registry.counter('file_lines_total', operation='write').get_value() == 9, 'test case 4: file writes'
+    fx.AnyFlux(iter([])).progress(message='empty /tmp/file_1.txt').pass_items()
+    fx.AnyFlux(iter([1])).progress(message='empty /tmp/file_2.txt').pass_items()
+    counter = registry.counter('progress_items_total', operation='empty')
+    assert counter.get_value() == 1, 'test case 5: real count, bounded label'
+    timed_snapshots = list()
+    registry.add_callback(timed_snapshots.append, interval=0.01)
+    for _ in range(100):
+        if len(timed_snapshots) >= 2:
+            break
+        time.sleep(0.01)
+    assert len(timed_snapshots) >= 2, 'test case 6: exported by timer without progress'
+    fc.FluxContext().set_metrics(metrics.MetricsRegistry())
+    registry.timer.join(1)
+    assert not registry.timer.is_alive(), 'test case 7: timer of replaced registry stopped'
+    flushed = list()
+    registry = metrics.MetricsRegistry().add_callback(flushed.append, interval=100)
+    registry.counter('rows_total').inc(5)
+    registry.flush()
+    assert flushed[-1]['metrics'][0]['value'] == 5, 'test case 8: flush'
+    registry.stop_timer()
+
+
+def test_disk_dict():
+    example_a = [{'x': 0, 'y': 0, 'z': 0}, {'y': 2, 'z': 7}, {'x': 8, 'y': 9}]
+    example_b = [{'x': 1, 'y': 2, 'z': 3}, {'x': 4, 'y': 2}, {'x': 6, 'y': 0}]
+    for right_is_uniq in (True, False):
+        for how in ('left', 'full'):
+            expected = fx.AnyFlux(example_a).map_side_join(
+                fx.AnyFlux(example_b), key='y', how=how, right_is_uniq=right_is_uniq,
+            ).get_list()
+            received = fx.AnyFlux(iter(example_a)).map_side_join(
+                fx.AnyFlux(example_b), key='y', how=how, right_is_uniq=right_is_uniq, on_disk=True,
+            ).get_list()
+            assert received == expected, 'test case 0: {} join, uniq={}'.format(how, right_is_uniq)
+    pairs = fx.PairsFlux([('b', 1), ('a', 2), ('b', 3), ('b', 1)])
+    lookup = pairs.get_dict(of_lists=True, on_disk=True)
+    lookup.cache_size = 1
+    assert lookup.get('b') == [1, 3] and lookup.get('c') is None, 'test case 1'
+    assert list(lookup.items()) == [('b', [1, 3]), ('a', [2])] and len(lookup) == 2, 'test case 2'
+    lookup.close()
+    assert not os.path.exists(lookup.get_path()), 'test case 3: file removed on close'
+    same_str = 'x' * 3
+    example_c = [{'k': 1, 'v': 'a'}, {'k': 2.0, 'v': 'b'}, {'k': (same_str, same_str), 'v': 'c'}]
+    example_d = [{'k': 1.0, 'w': 'd'}, {'k': 2, 'w': 'e'}, {'k': (''.join(['x'] * 3), 'xxx'), 'w': 'f'}]
+    for right_is_uniq in (True, False):
+        expected_4 = fx.AnyFlux(example_c).map_side_join(
+            fx.AnyFlux(example_d), key='k', right_is_uniq=right_is_uniq,
+        ).get_list()
+        received_4 = fx.AnyFlux(example_c).map_side_join(
+            fx.AnyFlux(example_d), key='k', right_is_uniq=right_is_uniq, on_disk=True,
+        ).get_list()
+        assert [r.get('w') for r in received_4] == ['d', 'e', 'f'], 'test case 4: mixed int/float and tuple keys'
+        assert received_4 == expected_4, 'test case 5: same as in memory, uniq={}'.format(right_is_uniq)
+    records = [('k', {'v': i % 3}) for i in range(9)]
+    lookup = fx.PairsFlux(records).get_dict(of_lists=True, on_disk=True)
+    manager = pairs.get_spill_manager()
+    folder = os.path.dirname(lookup.get_path())
+    assert lookup.get('k') == [{'v': 0}, {'v': 1}, {'v': 2}], 'test case 6: distinct record values'
+    assert manager.get_disk_usage() >= os.path.getsize(lookup.get_path()) > 0, 'test case 7: file in disk budget'
+    lookup.close()
+    assert manager.get_disk_usage() == 0 and not os.path.exists(folder), 'test case 8: spill operation closed'
+
+
+def test_distinct():
+    example = [3, 1, 3, 2, 1, 4, 2]
+    assert fx.AnyFlux(example).distinct().get_list() == [3, 1, 2, 4], 'test case 0: in memory'
+    assert fx.AnyFlux(example).distinct(keep='last').get_list() == [3, 1, 4, 2], 'test case 1'
+    assert fx.AnyFlux(sorted(example)).assume_sorted().distinct(keep='last').get_list() == [1, 2, 3, 4], 'test case 2'
+    records = [{'k': i % 7, 'n': i} for i in range(50)]
+    expected_3 = records[:7]
+    for bloom_filter in (False, True):
+        received_3 = fx.RecordsFlux(iter(records)).distinct('k', bloom_filter=bloom_filter, step=3).get_list()
+        message = 'test case 3: spilled, bloom_filter={}'.format(bloom_filter)
+        assert sorted(received_3, key=lambda r: r['k']) == expected_3, message
+    expected_4 = sorted(records[-7:], key=lambda r: r['k'])
+    received_4 = fx.RecordsFlux(iter(records)).distinct('k', keep='last', step=3, partitions_count=2).get_list()
+    assert sorted(received_4, key=lambda r: r['k']) == expected_4, 'test case 4: keep last'
+    received_5 = fx.RecordsFlux(iter(records + records)).distinct(step=10).final_count()
+    assert received_5 == 50, 'test case 5: records as keys'
+    assert fx.AnyFlux(iter(example)).count_distinct(approximate=True) == 4, 'test case 6'
+    rows = [(i % 5, 'x') for i in range(20)]
+    assert sorted(fx.RowsFlux(iter(rows)).distinct(step=3).get_list()) == rows[:5], 'test case 7: spilled keep types'
+    dates = [date(2020, 1, 1 + i % 3) for i in range(10)]
+    assert sorted(fx.AnyFlux(iter(dates)).distinct(step=2).get_list()) == dates[:3], 'test case 8'
+
+
+def test_sketches():
+    hll_a, hll_b = sketches.HyperLogLog(), sketches.HyperLogLog()
+    for i in range(20000):
+        hll_a.add(i)
+        hll_b.add(i + 10000)
+    assert abs(hll_a.merge(hll_b).get_result() - 30000) < 30000 * 0.05, 'test case 0: merged distinct count'
+    kll = sketches.KllSketch(quantiles=0.5, seed=1)
+    for i in range(10000):
+        kll.add((i * 7919) % 10000)
+    assert abs(kll.get_result() - 5000) < 200, 'test case 1: median'
+    top = sketches.SpaceSaving(2)
+    for i in range(1000):
+        top.add('a' if i % 2 else 'b' if i % 3 else i)
+    assert [v for v, _ in top.get_result()] == ['a', 'b'], 'test case 2: heavy hitters'
+    records = [{'k': i % 3, 'v': i % 10, 'c': i} for i in range(300)]
+    expected_3 = [{'k': k, 'distinct': 10, 'median': 4} for k in range(3)]
+    received_3 = fx.RecordsFlux(records).group_by(
+        'k', aggregations=dict(distinct=('v', 'count_distinct'), median=('v', 'median')),
+    ).get_list()
+    assert received_3 == expected_3, 'test case 3: group_by aggregations'
+    described = {r['field']: r for r in fx.RecordsFlux(iter(records)).describe('v', 'c', step=50).get_list()}
+    assert described['v']['distinct'] == 10 and described['v']['min'] == 0, 'test case 4'
+    assert described['c']['count'] == 300 and described['c']['max'] == 299, 'test case 5'
+    described_6 = fx.RecordsFlux(records).describe('v', workers=2, step=50).get_list()
+    assert described_6[0]['count'] == 300 and described_6[0]['distinct'] == 10, 'test case 6: merged in processes'
+    aggregated_7 = fx.RecordsFlux(records).sort('k').sorted_group_by(
+        'k', lambda r: r['k'] * 2, aggregations=dict(distinct=('v', 'count_distinct')),
+    )
+    expected_7 = [{'k': k, 'key_1': k * 2, 'distinct': 10} for k in range(3)]
+    assert aggregated_7.get_list() == expected_7, 'test case 7: function keys are kept'
+    assert aggregated_7.sorted_by is None, 'test case 7: not sorted by field names'
+    aggregated_8 = fx.RecordsFlux(records).sort('k').sorted_group_by('k', aggregations=dict(n=('c', 'count_distinct')))
+    assert aggregated_8.is_sorted_by('k'), 'test case 8'
+    aggregated_9 = fx.RecordsFlux(records).group_by('k', aggregations=dict(n=('c', 'count_distinct')))
+    assert not aggregated_9.is_sorted_by('k'), 'test case 9: sorted by hash'
+    try:
+        fx.RecordsFlux(records).group_by('k', values=['v'], aggregations=dict(n=('c', 'count_distinct')))
+        raised_10 = False
+    except AssertionError:
+        raised_10 = True
+    assert raised_10, 'test case 10: aggregations with values'
+
+
+def test_top():
+    records = [{'k': i % 3, 's': (i * 7) % 10, 'n': i} for i in range(30)]
+    expected_0 = sorted(records, key=lambda r: r['s'], reverse=True)[:4]
+    received_0 = fx.RecordsFlux(iter(records)).top(4, 's', reverse=True).get_list()
+    assert received_0 == expected_0, 'test case 0: same as sort and take'
+    assert fx.AnyFlux([5, 1, 4, 1, 3]).top(3).get_list() == [1, 1, 3], 'test case 1'
+    expected_2 = [r for k in range(3) for r in sorted([r for r in records if r['k'] == k], key=lambda r: r['s'])[:2]]
+    received_2 = fx.RecordsFlux(records).group_top('k', 2, by='s').get_list()
+    assert received_2 == expected_2, 'test case 2: group top'
+    assert fs.top(2)(['a', 'b', 'b', 'c', 'c', 'c']) == ['c', 'b'], 'test case 3: most frequent keys'
+    assert fx.RecordsFlux(records).group_top('k', 0, by='s').get_list() == [], 'test case 4: zero count'
+    assert algo.group_top(records, lambda r: r['k'], -1) == dict(), 'test case 5: negative count'
+
+
 if __name__ == '__main__':
     test_map()
     test_flat_map()
@@ -658,13 +1131,28 @@ if __name__ == '__main__':
     test_separate_first()
     test_split_by_pos()
     test_split_by_func()
+    test_split_single_pass()
     test_split_by_step()
     test_memory_sort()
     test_disk_sort_by_key()
+    test_spill_manager()
+    test_memory_budget()
     test_sort()
+    test_sortedness_tracking()
     test_sorted_group_by_key()
     test_group_by()
     test_any_join()
     test_records_join()
     test_to_rows()
+    test_lazy_plan()
+    test_batches()
     test_parse_json()
+    test_lazy_import()
+    test_flux_registry()
+    test_progress()
+    test_profiling()
+    test_metrics()
+    test_disk_dict()
+    test_distinct()
+    test_sketches()
+    test_top()
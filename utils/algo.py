@@ -1,3 +1,11 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from collections import deque
+from operator import itemgetter
+from itertools import islice
+import threading
+import queue
+import heapq
+
 try:  # Assume we're a sub-module in a package.
     from utils import (
         mappers as ms,
@@ -11,6 +19,10 @@ except ImportError:  # Apparently no higher-level package has been imported, fal
 
 
 JOIN_TYPES = ('left', 'right', 'inner', 'full')
+DEFAULT_TASKS_PER_WORKER = 2
+DEFAULT_BATCH_SIZE = 10000
+DEFAULT_QUEUE_SIZE = 10000
+QUEUE_TIMEOUT = 0.1
 
 
 def topologically_sorted(nodes, edges, ignore_cycles=False, logger=None):  # Kahn's algorithm
@@ -67,13 +79,95 @@ def merge_iter(iterables, key_function, reverse=False):
                     take_next[n] = True
 
 
-def map_side_join(iter_left, iter_right, key_function, how='left', uniq_right=False):
+def merge_keyed_iter(iterables, reverse=False):  # iterables of (key, item) pairs sorted by key, yields items only
+    for _, item in heapq.merge(*iterables, key=itemgetter(0), reverse=reverse):
+        yield item
+
+
+def check_sorted(items, key_function, reverse=False):
+    prev_key = None
+    for n, item in enumerate(items):
+        key = key_function(item)
+        if n and (key > prev_key if reverse else key < prev_key):
+            raise ValueError('check_sorted(): item {} breaks sorting order: {}'.format(n, item))
+        prev_key = key
+        yield item
+
+
+def distinct_sorted(items, key_function, keep='first'):  # adjacent deduplication, items must be sorted by key
+    prev_key, prev_item, is_empty = None, None, True
+    for item in items:
+        key = key_function(item)
+        if is_empty or key != prev_key:
+            if keep == 'first':
+                yield item
+            elif not is_empty:
+                yield prev_item
+        prev_key, prev_item, is_empty = key, item, False
+    if keep == 'last' and not is_empty:
+        yield prev_item
+
+
+def distinct_in_memory(items, key_function, keep='first'):  # key_function must return hashable values
+    if keep == 'first':
+        seen = set()
+        for item in items:
+            key = key_function(item)
+            if key not in seen:
+                seen.add(key)
+                yield item
+    else:  # items are yielded in order of last occurrence
+        last_items = dict()
+        for item in items:
+            key = key_function(item)
+            last_items.pop(key, None)
+            last_items[key] = item
+        yield from last_items.values()
+
+
+class ReversedKey:  # inverts comparison, so heapq min-heap keeps largest keys at top
+    __slots__ = ('value', )
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+def top(items, count, key_function=None, reverse=False):  # same as sorted(items)[:count], O(N log count)
+    if reverse:
+        return heapq.nlargest(count, items, key=key_function)
+    else:
+        return heapq.nsmallest(count, items, key=key_function)
+
+
+def group_top(items, group_function, count, key_function=None, reverse=False):  # dict group -> top items of group
+    heaps = dict()  # group -> bounded heap with worst kept entry at top, ties are resolved by order like in sorted()
+    if count <= 0:  # same as top(items, 0)
+        return heaps
+    for n, item in enumerate(items):
+        key = key_function(item) if key_function else item
+        entry = (key, -n, item) if reverse else (ReversedKey((key, n)), item)
+        group = group_function(item)
+        heap = heaps.get(group)
+        if heap is None:
+            heaps[group] = [entry]
+        elif len(heap) < count:
+            heapq.heappush(heap, entry)
+        elif heap[0] < entry:
+            heapq.heapreplace(heap, entry)
+    return {group: [e[-1] for e in sorted(heap, reverse=True)] for group, heap in heaps.items()}
+
+
+def map_side_join(iter_left, iter_right, key_function, how='left', uniq_right=False, dict_right=None):
     assert how in JOIN_TYPES
-    dict_right = ms.items_to_dict(
-        iter_right,
-        key_function=key_function,
-        of_lists=not uniq_right
-    )
+    if dict_right is None:  # prebuilt lookup (i.e. disk_dict.DiskDict) can be passed instead of iter_right
+        dict_right = ms.items_to_dict(
+            iter_right,
+            key_function=key_function,
+            of_lists=not uniq_right
+        )
     keys_used = set()
     for left_part in iter_left:
         cur_key = key_function(left_part)
@@ -162,3 +256,111 @@ def sorted_join(iter_left, iter_right, key_function, how='left', sorting_is_reve
             prev_right_key = right_key
             if take_next_right and not right_finished:
                 group_right.append(cur_right)
+
+
+def map_in_parallel(function, items, workers=2, use_processes=False, max_in_flight=None):
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    max_in_flight = max_in_flight or workers * DEFAULT_TASKS_PER_WORKER
+    with executor_class(max_workers=workers) as executor:
+        futures = deque()
+        for i in items:
+            futures.append(executor.submit(function, i))
+            if len(futures) >= max_in_flight:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+
+def get_batches(items, size=DEFAULT_BATCH_SIZE):
+    assert size > 0, 'batch size must be positive, got {}'.format(size)
+    iterator = iter(items)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+def map_batches(function, batches, workers=1, use_processes=False):  # function(list) returns iterable of items
+    if workers > 1:
+        results = map_in_parallel(function, batches, workers=workers, use_processes=use_processes)
+    else:
+        results = map(function, batches)
+    for result in results:
+        yield from result
+
+
+def put_to_queue(items_queue, item, stop_event, timeout=QUEUE_TIMEOUT):
+    while not stop_event.is_set():
+        try:
+            items_queue.put(item, timeout=timeout)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def read_to_queue(iterable, items_queue, stop_event):  # puts (True, item) for items, (False, error or None) at the end
+    try:
+        for item in iterable:
+            if not put_to_queue(items_queue, (True, item), stop_event):
+                return
+        put_to_queue(items_queue, (False, None), stop_event)
+    except BaseException as e:
+        put_to_queue(items_queue, (False, e), stop_event)
+
+
+def get_from_queue(items_queue):
+    while True:
+        has_item, item = items_queue.get()
+        if has_item:
+            yield item
+        elif item is None:
+            break
+        else:
+            raise item
+
+
+def chain_in_parallel(iterables, workers=2, queue_size=DEFAULT_QUEUE_SIZE):
+    stop_event = threading.Event()
+    queues = deque()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for iterable in iterables:
+            items_queue = queue.Queue(queue_size)
+            executor.submit(read_to_queue, iterable, items_queue, stop_event)
+            queues.append(items_queue)
+            if len(queues) >= workers:
+                yield from get_from_queue(queues.popleft())
+        while queues:
+            yield from get_from_queue(queues.popleft())
+    finally:
+        stop_event.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def interleave_in_parallel(iterables, workers=2, queue_size=DEFAULT_QUEUE_SIZE):  # at most workers iterables open
+    stop_event = threading.Event()
+    items_queue = queue.Queue(queue_size)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    iterables = iter(iterables)
+
+    def start(count):
+        started = 0
+        for iterable in islice(iterables, count):
+            executor.submit(read_to_queue, iterable, items_queue, stop_event)
+            started += 1
+        return started
+    try:
+        started_count, finished_count = start(workers), 0
+        while finished_count < started_count:
+            has_item, item = items_queue.get()
+            if has_item:
+                yield item
+            elif item is None:
+                finished_count += 1
+                started_count += start(1)
+            else:
+                raise item
+    finally:
+        stop_event.set()
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,129 @@
+import os
+import json
+import hashlib
+
+try:  # Assume we're a sub-module in a package.
+    from utils import (
+        arguments as arg,
+        json_codec,
+    )
+except ImportError:  # Apparently no higher-level package has been imported, fall back to a local import.
+    from ..utils import (
+        arguments as arg,
+        json_codec,
+    )
+
+
+DEFAULT_MAX_CACHE_SIZE = 1024 ** 3  # bytes
+DEFAULT_ENCODING = 'utf8'
+LINES_EXT = '.txt'
+BYTES_EXT = '.bin'
+TMP_EXT = '.part'
+CHUNK_SIZE = 1024 * 1024
+
+
+def get_key(*parts):
+    key_str = json.dumps(parts, default=str, sort_keys=True)
+    return hashlib.sha256(key_str.encode(DEFAULT_ENCODING)).hexdigest()
+
+
+class DiskCache:
+    def __init__(
+            self,
+            folder,
+            max_size=DEFAULT_MAX_CACHE_SIZE,
+            encoding=DEFAULT_ENCODING,
+    ):
+        self.folder = folder
+        self.max_size = max_size
+        self.encoding = encoding
+        os.makedirs(folder, exist_ok=True)
+
+    def get_folder(self):
+        return self.folder
+
+    def get_path(self, key, ext=LINES_EXT):
+        return os.path.join(self.folder, key + ext)
+
+    def has(self, key, ext=LINES_EXT):
+        return os.path.exists(self.get_path(key, ext))
+
+    def touch(self, key, ext=LINES_EXT):  # modification time is used as last access time for LRU eviction
+        os.utime(self.get_path(key, ext))
+
+    def get_entries(self):
+        for name in os.listdir(self.folder):
+            if name.endswith(TMP_EXT):
+                continue
+            path = os.path.join(self.folder, name)
+            stat = os.stat(path)
+            yield stat.st_mtime, stat.st_size, path
+
+    def get_size(self):
+        return sum([size for _, size, _ in self.get_entries()])
+
+    def evict(self, max_size=arg.DEFAULT):
+        max_size = arg.undefault(max_size, self.max_size)
+        entries = sorted(self.get_entries())
+        total_size = sum([size for _, size, _ in entries])
+        removed_count = 0
+        for _, size, path in entries:
+            if max_size is None or total_size <= max_size:
+                break
+            os.remove(path)
+            total_size -= size
+            removed_count += 1
+        return removed_count
+
+    def clear(self):
+        return self.evict(max_size=0)
+
+    def commit(self, tmp_path, path):
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def get_lines(self, key, end='\n'):  # end must be the same as in cache_lines()
+        self.touch(key)
+        with open(self.get_path(key), 'r', encoding=self.encoding, newline='') as fileholder:  # keep \r in lines
+            tail = ''
+            for chunk in iter(lambda: fileholder.read(CHUNK_SIZE), ''):
+                lines = (tail + chunk).split(end)
+                tail = lines.pop()
+                yield from lines
+        if tail:
+            yield tail
+
+    def cache_lines(self, key, lines, end='\n'):  # each line is terminated by end, so lines must not contain it
+        path = self.get_path(key)
+        tmp_path = path + TMP_EXT
+        fileholder = open(tmp_path, 'w', encoding=self.encoding, newline='')
+        try:
+            for line in lines:
+                fileholder.write(line + end)
+                yield line
+        except BaseException as e:
+            fileholder.close()
+            os.remove(tmp_path)
+            raise e
+        fileholder.close()
+        self.commit(tmp_path, path)
+
+    def get_items(self, key):
+        return map(json_codec.get_codec().loads, self.get_lines(key))
+
+    def put_items(self, key, items):
+        for _ in self.cache_lines(key, map(json_codec.get_codec().dumps, items)):
+            pass
+
+    def get_file(self, key):
+        self.touch(key, BYTES_EXT)
+        return open(self.get_path(key, BYTES_EXT), 'rb')
+
+    def put_file(self, key, fileholder):
+        path = self.get_path(key, BYTES_EXT)
+        tmp_path = path + TMP_EXT
+        with open(tmp_path, 'wb') as cache_fileholder:
+            for chunk in iter(lambda: fileholder.read(CHUNK_SIZE), b''):
+                cache_fileholder.write(chunk)
+        self.commit(tmp_path, path)
+        fileholder.seek(0)
@@ -0,0 +1,104 @@
+class OrderedSet:  # insertion-ordered set of hashable items based on dict
+    def __init__(self, items=tuple()):
+        self.items = dict.fromkeys(items)
+
+    def add(self, item):
+        self.items[item] = None
+
+    def update(self, items):
+        self.items.update(dict.fromkeys(items))
+
+    def discard(self, item):
+        self.items.pop(item, None)
+
+    def get_list(self):
+        return list(self.items)
+
+    def __contains__(self, item):
+        return item in self.items
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __repr__(self):
+        return 'OrderedSet({})'.format(self.get_list())
+
+
+class MultiMap:  # insertion-ordered dict of lists, optionally skipping values already added for the same key
+    def __init__(self, pairs=tuple(), distinct=False):
+        self.distinct = distinct
+        self.values = dict()
+        self.seen = dict()  # key -> set of hashable values added, used only if distinct
+        self.update(pairs)
+
+    def add(self, key, value):
+        values = self.values.get(key)
+        if values is None:
+            self.values[key] = [value]
+            if self.distinct:
+                self.seen[key] = set()
+                self.add_seen(key, value)
+        elif not self.distinct:
+            values.append(value)
+        elif not self.is_seen(key, value):
+            values.append(value)
+            self.add_seen(key, value)
+
+    def add_seen(self, key, value):
+        try:
+            self.seen[key].add(get_hashable(value))  # records and other containers are stored by hashable copy
+        except TypeError:  # values of other unhashable types are checked by comparison with list of values
+            pass
+
+    def is_seen(self, key, value):
+        try:
+            return get_hashable(value) in self.seen[key]
+        except TypeError:
+            return value in self.values[key]
+
+    def update(self, pairs):
+        for key, value in pairs:
+            self.add(key, value)
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def keys(self):
+        return self.values.keys()
+
+    def items(self):
+        return self.values.items()
+
+    def get_dict(self):  # lists are not copied
+        return self.values
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def __contains__(self, key):
+        return key in self.values
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+
+def get_hashable(value):  # equal unhashable values (lists, dicts, sets) are converted into equal hashable values
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        pass
+    if isinstance(value, dict):
+        return tuple(sorted([(k, get_hashable(v)) for k, v in value.items()], key=lambda i: str(i[0])))
+    elif isinstance(value, (set, frozenset)):
+        return frozenset([get_hashable(v) for v in value])
+    elif isinstance(value, (list, tuple)):
+        return tuple([get_hashable(v) for v in value])
+    else:
+        raise TypeError('can not convert {} into hashable value'.format(type(value)))
@@ -0,0 +1,162 @@
+from collections import OrderedDict
+from itertools import islice
+import sqlite3
+import pickle
+import os
+
+try:  # Assume we're a sub-module in a package.
+    from utils import containers
+except ImportError:  # Apparently no higher-level package has been imported, fall back to a local import.
+    from ..utils import containers
+
+
+DEFAULT_CACHE_SIZE = 100000  # items kept in LRU front cache
+DEFAULT_BATCH_SIZE = 10000  # items inserted by one executemany() call
+PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL
+
+_missing = object()
+
+
+def dumps(obj):
+    return pickle.dumps(obj, PICKLE_PROTOCOL)
+
+
+def get_key_repr(key):  # equal keys give equal strings (i.e. 1 and 1.0), unlike pickled bytes
+    if isinstance(key, bool) or (isinstance(key, float) and key.is_integer()):
+        return repr(int(key))
+    elif isinstance(key, tuple):  # namedtuples are equal to tuples
+        return '({})'.format(','.join([get_key_repr(k) for k in key]))
+    elif isinstance(key, frozenset):
+        return '{{{}}}'.format(','.join(sorted([get_key_repr(k) for k in key])))
+    else:
+        return repr(key)
+
+
+def get_key_str(key):
+    return get_key_repr(containers.get_hashable(key))
+
+
+class DiskDict:  # sqlite-backed lookup dict, keys and values are pickled, recently used items are cached in memory
+    def __init__(
+            self,
+            path,
+            of_lists=False,
+            distinct=True,
+            cache_size=DEFAULT_CACHE_SIZE,
+            batch_size=DEFAULT_BATCH_SIZE,
+            spill_operation=None,
+    ):
+        self.path = path
+        self.spill_operation = spill_operation  # spill.SpillOperation owned by dict, closed with it
+        self.of_lists = of_lists  # values are lists of all values added for key, like ms.items_to_dict(of_lists=True)
+        self.distinct = distinct
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self.cache = OrderedDict()
+        self.is_indexed = False
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=OFF')
+        self.connection.execute('PRAGMA synchronous=OFF')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS items (key_str TEXT, key BLOB, value BLOB)')
+
+    def get_path(self):
+        return self.path
+
+    def load(self, pairs):  # bulk load by batches without index, index is built once on first lookup
+        pairs = iter(pairs)
+        while True:
+            batch = [(get_key_str(k), dumps(k), dumps(v)) for k, v in islice(pairs, self.batch_size)]
+            if not batch:
+                break
+            self.connection.executemany('INSERT INTO items VALUES (?, ?, ?)', batch)
+            self.connection.commit()
+            self.add_usage()
+        self.cache.clear()
+        return self
+
+    def add_usage(self):  # file grows by batches and index, so disk budget is checked after each of them
+        if self.spill_operation is not None:
+            self.spill_operation.add_file(self.path)
+
+    def load_items(self, items, key_function, value_function=None):
+        if value_function is None:
+            return self.load((key_function(i), i) for i in items)
+        else:
+            return self.load((key_function(i), value_function(i)) for i in items)
+
+    def build_index(self):
+        if not self.is_indexed:
+            self.connection.execute('CREATE INDEX IF NOT EXISTS items_key ON items (key_str)')
+            self.connection.commit()
+            self.is_indexed = True
+            self.add_usage()
+
+    def fetch(self, key):
+        self.build_index()
+        if self.of_lists:
+            query = 'SELECT value FROM items WHERE key_str = ? ORDER BY rowid'
+        else:  # last added value wins like in dict
+            query = 'SELECT value FROM items WHERE key_str = ? ORDER BY rowid DESC LIMIT 1'
+        values = [pickle.loads(v) for v, in self.connection.execute(query, (get_key_str(key), ))]
+        if not values:
+            return _missing
+        elif not self.of_lists:
+            return values[0]
+        elif self.distinct:
+            return containers.MultiMap([(None, v) for v in values], distinct=True).get(None)
+        else:
+            return values
+
+    def get(self, key, default=None):
+        value = self.cache.get(key, _missing)
+        if value is _missing:
+            value = self.fetch(key)
+            self.cache[key] = value  # missing keys are cached too
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(key)
+        return default if value is _missing else value
+
+    def keys(self):  # in order of first insertion, first added form of equal keys is returned
+        for k, _ in self.connection.execute('SELECT key, MIN(rowid) FROM items GROUP BY key_str ORDER BY MIN(rowid)'):
+            yield pickle.loads(k)
+
+    def items(self):
+        for k in self.keys():
+            yield k, self[k]
+
+    def __setitem__(self, key, value):
+        self.load([(key, value)])
+
+    def __getitem__(self, key):
+        value = self.get(key, _missing)
+        if value is _missing:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _missing) is not _missing
+
+    def __iter__(self):
+        return self.keys()
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(DISTINCT key_str) FROM items').fetchone()[0]
+
+    def get_size(self):  # bytes on disk
+        return os.path.getsize(self.path)
+
+    def close(self, remove=True):
+        self.connection.close()
+        self.cache.clear()
+        if remove and self.spill_operation is not None:
+            self.spill_operation.close()
+        elif remove and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def closing(self, items):  # yields items and closes dict when they are exhausted or closed
+        try:
+            yield from items
+        finally:
+            self.close()
@@ -1,5 +1,5 @@
+import heapq
 import math
-import numpy as np
 
 try:  # Assume we're a sub-module in a package.
     import fluxes as fx
@@ -7,6 +7,7 @@ try:  # Assume we're a sub-module in a package.
         arguments as arg,
         mappers as ms,
         selection,
+        lazy_import,
     )
 except ImportError:  # Apparently no higher-level package has been imported, fall back to a local import.
     from .. import fluxes as fx
@@ -14,8 +15,10 @@ except ImportError:  # Apparently no higher-level package has been imported, fal
         arguments as arg,
         mappers as ms,
         selection,
+        lazy_import,
     )
 
+np = lazy_import.LazyModule('numpy')
 
 DICT_CAST_TYPES = dict(bool=bool, int=int, float=float, str=str, text=str, date=str)
 ZERO_VALUES = (None, 'None', '', '-', 0)
@@ -161,17 +164,16 @@ def safe_more_than(other, including=False):
 def top(count=10, output_values=False):
     def func(keys, values=None):
         if values:
-            pairs = sorted(zip(keys, values), key=lambda i: i[1], reverse=True)
-        else:
+            pairs = heapq.nlargest(count, zip(keys, values), key=lambda i: i[1])
+        else:  # most frequent keys
             dict_counts = dict()
             for k in keys:
-                dict_counts[k] = dict_counts.get(k, 0)
-            pairs = sorted(dict_counts.items())
-        top_n = pairs[:count]
+                dict_counts[k] = dict_counts.get(k, 0) + 1
+            pairs = heapq.nlargest(count, dict_counts.items(), key=lambda i: i[1])
         if output_values:
-            return top_n
+            return pairs
         else:
-            return [i[0] for i in top_n]
+            return [i[0] for i in pairs]
     return func
 
 
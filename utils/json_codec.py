@@ -0,0 +1,153 @@
+import json
+import math
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+try:
+    import rapidjson
+except ImportError:
+    rapidjson = None
+
+
+BACKENDS = ('orjson', 'ujson', 'rapidjson', 'json')
+DEFAULT_ENCODING = 'utf8'
+
+_codecs = dict()
+_scan_once = json.JSONDecoder().scan_once
+
+
+def is_installed(backend):
+    if backend == 'orjson':
+        return orjson is not None
+    elif backend == 'ujson':
+        return ujson is not None
+    elif backend == 'rapidjson':
+        return rapidjson is not None
+    else:
+        return backend == 'json'
+
+
+def get_available_backends():
+    return [b for b in BACKENDS if is_installed(b)]
+
+
+def get_codec(backend=None):  # fastest installed backend by default
+    backend = backend or get_available_backends()[0]
+    assert backend in BACKENDS, 'backend must be one of {}, got {}'.format(BACKENDS, backend)
+    if not is_installed(backend):
+        raise ImportError('JSON backend {} is not installed'.format(backend))
+    codec = _codecs.get(backend)
+    if codec is None:
+        codec = JsonCodec(backend)
+        _codecs[backend] = codec
+    return codec
+
+
+def get_context_codec(context=None):
+    if context is not None:
+        return context.get_json_codec()
+    else:
+        return get_codec()
+
+
+def scan_lines(lines):  # one scanner pass over joined lines, None if any line is not exactly one json value
+    try:
+        lines = [i.decode(DEFAULT_ENCODING) if isinstance(i, bytes) else i for i in lines]
+    except UnicodeDecodeError:
+        return None
+    text = '\n'.join(lines)
+    items, pos = list(), 0
+    for line in lines:
+        end = pos + len(line)
+        try:
+            item, pos = _scan_once(text, pos)
+        except (StopIteration, ValueError):
+            return None
+        if pos != end:  # value is incomplete or continues in next line
+            return None
+        items.append(item)
+        pos += 1
+    return items
+
+
+def has_non_finite(obj):  # NaN and infinity are written by orjson as null silently
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    elif isinstance(obj, dict):
+        return any([has_non_finite(v) for v in obj.values()])
+    elif isinstance(obj, (list, tuple)):
+        return any([has_non_finite(v) for v in obj])
+    else:
+        return False
+
+
+class JsonCodec:  # same interface over stdlib json and faster optional backends, all of them accept str or bytes
+    def __init__(self, backend='json'):
+        self.backend = backend
+        if backend == 'orjson':
+            self.fast_loads = orjson.loads
+            self.fast_dumps = lambda obj: orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode(DEFAULT_ENCODING)
+        elif backend == 'ujson':
+            self.fast_loads = ujson.loads
+            self.fast_dumps = ujson.dumps
+        elif backend == 'rapidjson':
+            self.fast_loads = rapidjson.loads
+            self.fast_dumps = rapidjson.dumps
+        else:
+            self.fast_loads = json.loads
+            self.fast_dumps = json.dumps
+
+    def get_backend(self):
+        return self.backend
+
+    def loads(self, line):
+        try:
+            return self.fast_loads(line)
+        except ValueError:  # e.g. NaN and Infinity written by stdlib json are not accepted by orjson
+            if self.backend == 'json':
+                raise
+            return json.loads(line)
+
+    def dumps(self, obj):
+        try:
+            line = self.fast_dumps(obj)
+        except (TypeError, ValueError, OverflowError):  # e.g. big integers, custom objects or non-finite floats
+            return json.dumps(obj)
+        if self.backend == 'orjson' and 'null' in line and has_non_finite(obj):
+            return json.dumps(obj)
+        return line
+
+    def loads_or_default(self, line, default_value=None):
+        try:
+            return self.loads(line)
+        except ValueError as e:  # JSONDecodeError of each backend is subclass of ValueError
+            if default_value is not None:
+                return default_value
+            else:
+                raise e
+
+    def loads_batch(self, lines, default_value=None):  # fast backends decode line by line faster than in batch
+        if lines and self.backend == 'json':
+            items = scan_lines(lines)
+            if items is not None:
+                return items
+        return [self.loads_or_default(i, default_value) for i in lines]
+
+    def loads_lines(self, lines, default_value=None, batch_size=None):
+        if batch_size:
+            batch = list()
+            for line in lines:
+                batch.append(line)
+                if len(batch) >= batch_size:
+                    yield from self.loads_batch(batch, default_value)
+                    batch = list()
+            yield from self.loads_batch(batch, default_value)
+        else:
+            for line in lines:
+                yield self.loads_or_default(line, default_value)
@@ -0,0 +1,37 @@
+import importlib
+import importlib.util
+
+
+class LazyModule:  # proxy importing real module on first attribute access
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def __getattr__(self, attribute):
+        return getattr(get_module(self), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(get_module(self), attribute, value)
+
+    def __repr__(self):
+        status = 'loaded' if is_loaded(self) else 'not loaded'
+        return '<lazy module {} ({})>'.format(self.__dict__['_name'], status)
+
+
+def get_module(lazy_module):
+    module = lazy_module.__dict__['_module']
+    if module is None:
+        module = importlib.import_module(lazy_module.__dict__['_name'])
+        lazy_module.__dict__['_module'] = module
+    return module
+
+
+def is_loaded(lazy_module):
+    return lazy_module.__dict__['_module'] is not None
+
+
+def is_installed(name):
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ImportError:  # parent package is not installed
+        return False
@@ -1,21 +1,28 @@
 from enum import Enum
 from datetime import datetime, timedelta
 from functools import wraps
+from itertools import chain, compress, islice
+import operator
 import logging
+import time
 
 try:  # Assume we're a sub-module in a package.
     from utils import (
         arguments as arg,
         functions as fs,
+        metrics,
     )
 except ImportError:  # Apparently no higher-level package has been imported, fall back to a local import.
     from ..utils import (
         arguments as arg,
         functions as fs,
+        metrics,
     )
 
 
 DEFAULT_STEP = 10000
+DEFAULT_INTERVAL = 1.0  # seconds between progress updates
+CLOCK_CHECK_STEP = 1000  # items between checks of monotonic clock
 DEFAULT_LOGGER_NAME = 'flux'
 DEFAULT_LOGGING_LEVEL = logging.WARNING
 DEFAULT_FORMATTER = '%(asctime)s - %(levelname)s - %(message)s'
@@ -101,7 +108,7 @@ class Logger:
         self.level = level
         self.max_line_len = max_line_len
 
-    def progress(self, items, name='Progress', count=None, step=DEFAULT_STEP):
+    def progress(self, items, name='Progress', count=None, step=arg.DEFAULT):
         return Progress(
             name,
             count=count,
@@ -173,6 +180,7 @@ class Progress:
             verbose=True,
             logger=arg.DEFAULT,
             context=None,
+            interval=DEFAULT_INTERVAL,
     ):
         self.name = name
         self.expected_count = count
@@ -183,6 +191,10 @@ class Progress:
         self.start_time = None
         self.past_time = timedelta(0)
         self.context = context
+        self.interval = interval  # None means update on every check step
+        self.next_update_time = 0
+        self.reported_count = 0  # items already added to metrics counter
+        self.processed_count = None  # real number of items passed by iterate(), position can not show 0 items
         if logger is None:
             self.logger = None
         elif logger == arg.DEFAULT:
@@ -264,6 +276,30 @@ class Progress:
         if self.timing:
             line = '{} {} ({} it/sec)'.format(self.get_timing_str(), line, self.evaluate_speed())
         self.log(line, level=LoggingLevel.Debug, end='\r')
+        self.report_metrics()
+
+    def get_operation_label(self):  # first word of name, so file paths in names do not create new metrics series
+        words = self.name.split()
+        return words[0] if words else 'unknown'
+
+    def report_metrics(self, finished=False):
+        registry = metrics.get_registry()
+        operation = self.get_operation_label()
+        processed_count = self.position + 1 if self.processed_count is None else self.processed_count
+        if processed_count > self.reported_count:
+            registry.counter('progress_items_total', 'Items passed through progress', operation=operation).inc(
+                processed_count - self.reported_count,
+            )
+            self.reported_count = processed_count
+        if self.start_time is not None:
+            past_seconds = (datetime.now() - self.start_time).total_seconds()
+            if past_seconds:
+                speed = registry.gauge('progress_items_per_second', 'Current throughput', operation=operation)
+                speed.set(round(processed_count / past_seconds, 3))
+            if finished:
+                duration = registry.gauge('progress_duration_seconds', 'Duration of finished run', operation=operation)
+                duration.set(round(past_seconds, 3))
+        registry.check_exporters()
 
     def update_with_step(self, position, step=arg.DEFAULT):
         step = arg.undefault(step, DEFAULT_STEP)
@@ -283,9 +319,26 @@ class Progress:
         else:
             self.update_with_step(position, step)
 
+    def get_check_step(self, step=arg.DEFAULT):
+        if self.interval is None:
+            return arg.undefault(step, DEFAULT_STEP)
+        else:
+            return arg.undefault(step, CLOCK_CHECK_STEP)
+
+    def tick(self, position, step=CLOCK_CHECK_STEP):  # returns position of next check
+        if self.interval is None:
+            self.update_now(position)
+        else:
+            now = time.monotonic()
+            if now >= self.next_update_time:
+                self.next_update_time = now + self.interval
+                self.update_now(position)
+        return position + step
+
     def start(self, position=0):
         self.state = OperationStatus.InProgress
         self.start_time = datetime.now()
+        self.next_update_time = time.monotonic() + (self.interval or 0)
         self.position = position or self.position or 0
         if self.position != position:
             self.update(position)
@@ -299,6 +352,7 @@ class Progress:
         if self.timing:
             message = '{} {} ({} it/sec)'.format(self.get_timing_str(), message, self.evaluate_speed())
         self.log(message)
+        self.report_metrics(finished=True)
 
     def iterate(self, items, name=None, expected_count=None, step=arg.DEFAULT):
         self.name = name or self.name
@@ -306,9 +360,20 @@ class Progress:
             self.expected_count = len(items)
         else:
             self.expected_count = expected_count or self.expected_count
-        n = 0
+        return chain.from_iterable(self.get_chunks(items, self.get_check_step(step)))
+
+    def get_chunks(self, items, step):  # clock is checked between chunks, items inside chunk are passed by C iterators
+        items = iter(items)
+        selectors_template = [True] * step
+        position = 0
         self.start()
-        for n, item in enumerate(items):
-            self.update(n, step)
-            yield item
-        self.finish(n)
+        while True:
+            selectors = iter(selectors_template)  # remaining length of selectors shows how many items were taken
+            yield compress(islice(items, step), selectors)
+            chunk_size = step - operator.length_hint(selectors)
+            position += chunk_size
+            self.processed_count = position
+            if chunk_size < step:
+                break
+            self.tick(position - 1, step)
+        self.finish(max(position - 1, 0))
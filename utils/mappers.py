@@ -3,8 +3,10 @@ import re
 
 try:  # Assume we're a sub-module in a package.
     import fluxes as fx
+    from utils import containers, sketches
 except ImportError:  # Apparently no higher-level package has been imported, fall back to a local import.
     from .. import fluxes as fx
+    from ..utils import containers, sketches
 
 
 RE_LETTERS = re.compile('[^a-zа-я ]')
@@ -64,7 +66,10 @@ def transpose_records_list(records_list):
     return record_out
 
 
-def get_histograms(records, fields=tuple(), max_values=25, ignore_none=False):
+def get_histograms(records, fields=tuple(), max_values=25, ignore_none=False, approximate=False):
+    if approximate:  # most frequent values instead of first ones, counts may be overestimated
+        yield from get_approximate_histograms(records, fields, max_values=max_values, ignore_none=ignore_none)
+        return
     histograms = dict()
     for r in records:
         for f in fields or r.keys():
@@ -80,6 +85,19 @@ def get_histograms(records, fields=tuple(), max_values=25, ignore_none=False):
         yield k, v
 
 
+def get_approximate_histograms(records, fields=tuple(), max_values=25, ignore_none=False):
+    top_values = dict()
+    for r in records:
+        for f in fields or r.keys():
+            if f not in top_values:
+                top_values[f] = sketches.SpaceSaving(max_values)
+            cur_value = r.get(f)
+            if cur_value is not None or not ignore_none:
+                top_values[f].add(cur_value)
+    for k, v in top_values.items():
+        yield k, dict(v.get_top())
+
+
 def remove_extra_spaces(text):
     if '\n' in text:
         text = text.replace('\n', ' ')
@@ -148,18 +166,15 @@ def merge_two_items(first, second, default_right_name='_right'):
     return result
 
 
-def items_to_dict(items, key_function, value_function=None, of_lists=False):
-    result = dict()
-    for i in items:
-        k = key_function(i)
-        v = i if value_function is None else value_function(i)
-        if of_lists:
-            distinct = result.get(k, [])
-            if v not in distinct:
-                result[k] = distinct + [v]
-        else:
-            result[k] = v
-    return result
+def items_to_dict(items, key_function, value_function=None, of_lists=False, distinct=True):
+    if value_function is None:
+        pairs = ((key_function(i), i) for i in items)
+    else:
+        pairs = ((key_function(i), value_function(i)) for i in items)
+    if of_lists:
+        return containers.MultiMap(pairs, distinct=distinct).get_dict()
+    else:
+        return dict(pairs)
 
 
 def fold_lists(list_records, key_fields, list_fields):
@@ -0,0 +1,34 @@
+import sys
+
+
+DEFAULT_MEMORY_BUDGET = 1024 ** 3  # bytes
+DEFAULT_SAMPLE_SIZE = 100
+
+
+def get_deep_size(obj, seen=None):  # recursive sys.getsizeof() for builtin containers, shared objects counted once
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum([get_deep_size(k, seen) + get_deep_size(v, seen) for k, v in obj.items()])
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum([get_deep_size(i, seen) for i in obj])
+    elif hasattr(obj, '__dict__'):
+        size += get_deep_size(obj.__dict__, seen)
+    return size
+
+
+def estimate_item_size(sample):
+    if sample:
+        return sum([get_deep_size(i) for i in sample]) / len(sample)
+
+
+def get_step(item_size, memory_budget=DEFAULT_MEMORY_BUDGET, max_items=None):
+    if item_size:
+        step = max(int(memory_budget / item_size), 1)  # large items can fit only a few per budget
+        return min(step, max_items) if max_items else step
+    else:
+        return max_items
@@ -0,0 +1,266 @@
+from bisect import bisect_left
+import threading
+import atexit
+import json
+import time
+import os
+
+
+METRIC_PREFIX = 'flux_'
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+DEFAULT_EXPORT_INTERVAL = 10.0  # seconds between exports by exporters
+
+
+class Metric:
+    metric_type = 'untyped'
+
+    def __init__(self, name, description='', labels=tuple()):
+        self.name = name
+        self.description = description
+        self.labels = labels  # tuple of sorted (key, value) pairs
+        self.lock = threading.Lock()
+
+    def get_samples(self):  # list of (suffix, extra_labels, value)
+        return list()
+
+    def get_snapshot(self):
+        return dict(name=self.name, type=self.metric_type, labels=dict(self.labels))
+
+
+class Counter(Metric):
+    metric_type = 'counter'
+
+    def __init__(self, name, description='', labels=tuple()):
+        super().__init__(name, description, labels)
+        self.value = 0
+
+    def inc(self, value=1):
+        assert value >= 0, 'counter can only increase, got {}'.format(value)
+        with self.lock:
+            self.value += value
+
+    def get_value(self):
+        return self.value
+
+    def get_samples(self):
+        return [('', tuple(), self.value)]
+
+    def get_snapshot(self):
+        return dict(super().get_snapshot(), value=self.value)
+
+
+class Gauge(Counter):
+    metric_type = 'gauge'
+
+    def inc(self, value=1):
+        with self.lock:
+            self.value += value
+
+    def dec(self, value=1):
+        self.inc(-value)
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram(Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, description='', labels=tuple(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        with self.lock:
+            self.bucket_counts[bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def get_cumulative_counts(self):
+        counts, total = list(), 0
+        for c in self.bucket_counts:
+            total += c
+            counts.append(total)
+        return counts
+
+    def get_samples(self):
+        bounds = [str(b) for b in self.buckets] + ['+Inf']
+        samples = [('_bucket', (('le', b), ), c) for b, c in zip(bounds, self.get_cumulative_counts())]
+        return samples + [('_sum', tuple(), self.sum), ('_count', tuple(), self.count)]
+
+    def get_snapshot(self):
+        return dict(
+            super().get_snapshot(),
+            buckets=dict(zip([str(b) for b in self.buckets] + ['+Inf'], self.get_cumulative_counts())),
+            sum=self.sum, count=self.count,
+        )
+
+
+def get_labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def escape_label_value(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def get_labels_str(labels):
+    if labels:
+        return '{' + ','.join(['{}="{}"'.format(k, escape_label_value(v)) for k, v in labels]) + '}'
+    else:
+        return ''
+
+
+def write_atomically(path, content):  # scrapers never see partially written file
+    tmp_path = '{}.tmp'.format(path)
+    with open(tmp_path, 'w') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+class MetricsRegistry:
+    def __init__(self, prefix=METRIC_PREFIX):
+        self.prefix = prefix
+        self.metrics = dict()
+        self.exporters = list()
+        self.lock = threading.Lock()
+        self.export_lock = threading.Lock()
+        self.timer = None
+        self.timer_stopped = False
+        self.timer_wakeup = threading.Event()  # set when exporters are changed or timer is stopped
+
+    def get_metric(self, metric_class, name, description='', labels=None, **kwargs):
+        key = (self.prefix + name, get_labels(labels or dict()))
+        metric = self.metrics.get(key)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.get(key)
+                if metric is None:
+                    metric = metric_class(key[0], description, key[1], **kwargs)
+                    self.metrics[key] = metric
+        assert isinstance(metric, metric_class), 'metric {} already registered as {}'.format(name, metric.metric_type)
+        return metric
+
+    def counter(self, name, description='', **labels):
+        return self.get_metric(Counter, name, description, labels)
+
+    def gauge(self, name, description='', **labels):
+        return self.get_metric(Gauge, name, description, labels)
+
+    def histogram(self, name, description='', buckets=DEFAULT_BUCKETS, **labels):
+        return self.get_metric(Histogram, name, description, labels, buckets=buckets)
+
+    def get_metrics(self):
+        return sorted(self.metrics.values(), key=lambda m: (m.name, m.labels))
+
+    def get_snapshot(self):
+        return dict(timestamp=time.time(), metrics=[m.get_snapshot() for m in self.get_metrics()])
+
+    def to_json(self):
+        return json.dumps(self.get_snapshot())
+
+    def to_prometheus(self):
+        lines = list()
+        described = set()
+        for metric in self.get_metrics():
+            if metric.name not in described:
+                described.add(metric.name)
+                if metric.description:
+                    lines.append('# HELP {} {}'.format(metric.name, metric.description))
+                lines.append('# TYPE {} {}'.format(metric.name, metric.metric_type))
+            for suffix, extra_labels, value in metric.get_samples():
+                labels_str = get_labels_str(metric.labels + extra_labels)
+                lines.append('{}{}{} {}'.format(metric.name, suffix, labels_str, value))
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):  # text file for node exporter textfile collector
+        write_atomically(path, self.to_prometheus())
+
+    def write_json(self, path):
+        write_atomically(path, self.to_json())
+
+    def add_exporter(self, function, interval=DEFAULT_EXPORT_INTERVAL):  # function receives this registry
+        self.exporters.append([function, interval, 0])
+        if len(self.exporters) == 1:
+            atexit.register(self.flush)
+        self.start_timer()
+        return self
+
+    def add_prometheus_exporter(self, path, interval=DEFAULT_EXPORT_INTERVAL):
+        return self.add_exporter(lambda r: r.write_prometheus(path), interval=interval)
+
+    def add_json_exporter(self, path, interval=DEFAULT_EXPORT_INTERVAL):
+        return self.add_exporter(lambda r: r.write_json(path), interval=interval)
+
+    def add_callback(self, callback, interval=DEFAULT_EXPORT_INTERVAL):  # callback receives snapshot as dict
+        return self.add_exporter(lambda r: callback(r.get_snapshot()), interval=interval)
+
+    def check_exporters(self):  # called by progress updates and timer, calls exporters which interval has passed
+        if self.exporters:
+            with self.export_lock:
+                now = time.monotonic()
+                for exporter in self.exporters:
+                    function, interval, next_time = exporter
+                    if now >= next_time:
+                        exporter[2] = now + (interval or 0)
+                        function(self)
+
+    def export(self):
+        with self.export_lock:
+            for exporter in self.exporters:
+                exporter[0](self)
+
+    def flush(self):  # exports current values now, i.e. at the end of pipeline without progress()
+        if self.exporters:
+            self.export()
+
+    def get_timer_interval(self):
+        return min([i for _, i, _ in self.exporters if i] or [DEFAULT_EXPORT_INTERVAL])
+
+    def start_timer(self):  # daemon thread calls exporters in pipelines which do not report progress
+        self.timer_stopped = False
+        if self.timer is None or not self.timer.is_alive():
+            self.timer = threading.Thread(target=self.run_timer, name='metrics-exporter', daemon=True)
+            self.timer.start()
+        else:  # interval is recalculated for new exporter
+            self.timer_wakeup.set()
+
+    def run_timer(self):
+        while not self.timer_stopped:
+            self.timer_wakeup.wait(self.get_timer_interval())
+            self.timer_wakeup.clear()
+            if not self.timer_stopped:
+                self.check_exporters()
+
+    def stop_timer(self):
+        self.timer_stopped = True
+        self.timer_wakeup.set()
+
+    def reset(self):
+        with self.lock:
+            self.metrics = dict()
+
+
+_registry = MetricsRegistry()
+
+
+def get_registry():
+    return _registry
+
+
+def set_registry(registry):
+    global _registry
+    if _registry is not registry:
+        _registry.stop_timer()
+    _registry = registry
+    return registry
+
+
+def report_file_operation(operation, lines_count, path=None):  # operation is 'read' or 'write'
+    registry = get_registry()
+    registry.counter('file_lines_total', 'Lines read or written', operation=operation).inc(lines_count)
+    if path is not None and os.path.exists(path):
+        registry.counter('file_bytes_total', 'Bytes read or written', operation=operation).inc(os.path.getsize(path))
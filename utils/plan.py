@@ -0,0 +1,232 @@
+from enum import Enum
+
+
+class StepType(Enum):
+    Map = 'map'
+    Filter = 'filter'
+    Check = 'check'
+    Progress = 'progress'
+    Wrap = 'wrap'
+
+
+ELEMENT_WISE_STEPS = (StepType.Map, StepType.Filter, StepType.Check, StepType.Progress)
+ORDER_PRESERVING_STEPS = (StepType.Filter, StepType.Check, StepType.Progress)
+
+
+class Step:
+    def __init__(self, step_type, function, name=None, **params):
+        self.step_type = StepType(step_type)
+        self.function = function
+        self.name = name or getattr(function, '__name__', self.step_type.value)
+        self.params = params
+
+    def is_element_wise(self):
+        return self.step_type in ELEMENT_WISE_STEPS
+
+    def get_code(self, n):  # returns (prelude, body, epilogue) lines for fused loop, f{n} refers to step function
+        f = 'f{}'.format(n)
+        if self.step_type == StepType.Map:
+            return [], ['item = {}(item)'.format(f)], []
+        elif self.step_type == StepType.Filter:
+            return [], ['if not {}(item):'.format(f), '    continue'], []
+        elif self.step_type == StepType.Check:
+            return [], ['if not {}(item):'.format(f), '    raise TypeError(m{}.format(item))'.format(n)], []
+        elif self.step_type == StepType.Progress:
+            prelude = ['{}.start()'.format(f), 'c{} = 0'.format(n), 'k{n} = s{n} - 1'.format(n=n)]
+            body = [
+                'if c{n} >= k{n}:'.format(n=n),
+                '    k{n} = {f}.tick(c{n}, s{n})'.format(f=f, n=n),
+                'c{} += 1'.format(n),
+            ]
+            epilogue = ['{f}.finish(c{n} - 1 if c{n} else 0)'.format(f=f, n=n)]
+            return prelude, body, epilogue
+        else:
+            raise ValueError('step {} can not be fused'.format(self.step_type))
+
+    def get_namespace(self, n):
+        namespace = {'f{}'.format(n): self.function}
+        if self.step_type == StepType.Check:
+            namespace['m{}'.format(n)] = self.params['message']
+        elif self.step_type == StepType.Progress:
+            namespace['s{}'.format(n)] = self.params['step']
+        return namespace
+
+    def get_description(self):
+        return '{}({})'.format(self.step_type.value, self.name)
+
+
+def compile_steps(steps):
+    prelude, body, epilogue = list(), list(), list()
+    namespace = dict()
+    for n, step in enumerate(steps):
+        step_prelude, step_body, step_epilogue = step.get_code(n)
+        prelude += step_prelude
+        body += step_body
+        epilogue = step_epilogue + epilogue
+        namespace.update(step.get_namespace(n))
+    lines = ['def fused(items):']
+    lines += ['    ' + line for line in prelude]
+    lines += ['    for item in items:']
+    lines += ['        ' + line for line in body]
+    lines += ['        yield item']
+    lines += ['    ' + line for line in epilogue]
+    exec('\n'.join(lines), namespace)
+    return namespace['fused']
+
+
+class Plan:  # lazy chain of steps over source iterable, consecutive element-wise steps are fused into one loop
+    def __init__(self, source, steps=tuple()):
+        self.source = source
+        self.steps = tuple(steps)
+
+    def add_step(self, step):
+        return Plan(self.source, self.steps + (step, ))
+
+    def map(self, function, name=None):
+        return self.add_step(Step(StepType.Map, function, name))
+
+    def filter(self, function, name=None):
+        return self.add_step(Step(StepType.Filter, function, name))
+
+    def check(self, is_valid, message, skip_errors=False):
+        if self.is_checked(is_valid):
+            return self
+        elif skip_errors:
+            return self.filter(is_valid)
+        else:
+            return self.add_step(Step(StepType.Check, is_valid, message=message))
+
+    def is_checked(self, is_valid):  # items already checked by same function and not changed after that
+        for step in reversed(self.steps):
+            if step.step_type not in ORDER_PRESERVING_STEPS:
+                return False
+            elif step.step_type == StepType.Check and step.function == is_valid:
+                return True
+        return False
+
+    def progress(self, progress, step, name=None):
+        step = progress.get_check_step(step)
+        return self.add_step(Step(StepType.Progress, progress, name or progress.name, step=step))
+
+    def wrap(self, function, name=None):
+        return self.add_step(Step(StepType.Wrap, function, name))
+
+    def get_segments(self):  # list of (wrapper or None, list of element-wise steps)
+        segments = [(None, list())]
+        for step in self.steps:
+            if step.is_element_wise():
+                segments[-1][1].append(step)
+            else:
+                segments.append((step, list()))
+        return segments
+
+    def get_source(self):
+        return self.source
+
+    def __iter__(self):
+        items = self.get_source()
+        for wrapper, steps in self.get_segments():
+            if wrapper:
+                items = wrapper.function(items)
+            if steps:
+                items = compile_steps(steps)(items)
+        return iter(items)
+
+    def explain(self):
+        source_name = self.source.__class__.__name__
+        lines = ['source({})'.format(source_name)]
+        for wrapper, steps in self.get_segments():
+            if wrapper:
+                lines.append(wrapper.get_description())
+            if steps:
+                lines.append('fused loop: {}'.format(' -> '.join([s.get_description() for s in steps])))
+        return '\n'.join(lines)
+
+
+def check(items, is_valid, message, skip_errors=False):
+    if isinstance(items, Plan):
+        return items.check(is_valid, message, skip_errors=skip_errors)
+    else:
+        return check_items(items, is_valid, message, skip_errors=skip_errors)
+
+
+def check_items(items, is_valid, message, skip_errors=False):
+    for i in items:
+        if is_valid(i):
+            pass
+        elif skip_errors:
+            continue
+        else:
+            raise TypeError(message.format(i))
+        yield i
+
+
+def is_simple_value(value):
+    return isinstance(value, (str, int, float, bool))
+
+
+class Scan(Plan):  # reading from source supporting pushed down projection, equality filters and limit
+    def __init__(
+            self,
+            reader,
+            known_columns,
+            name='scan',
+            columns=None,
+            filters=tuple(),
+            limit=None,
+            steps=tuple(),
+    ):
+        super().__init__(source=None, steps=steps)
+        self.reader = reader  # reader(columns, filters, limit) returns iterable
+        self.known_columns = list(known_columns)
+        self.name = name
+        self.columns = columns
+        self.filters = tuple(filters)
+        self.limit = limit
+
+    def get_props(self):
+        return dict(
+            reader=self.reader, known_columns=self.known_columns, name=self.name,
+            columns=self.columns, filters=self.filters, limit=self.limit,
+            steps=self.steps,
+        )
+
+    def pushed(self, **props):
+        scan_props = self.get_props()
+        scan_props.update(props)
+        return Scan(**scan_props)
+
+    def add_step(self, step):
+        return self.pushed(steps=self.steps + (step, ))
+
+    def can_push_down(self):  # validation steps do not change items, so they can stay after pushed down operations
+        return all([s.step_type == StepType.Check for s in self.steps])
+
+    def is_known(self, field):
+        return field in self.known_columns and (self.columns is None or field in self.columns)
+
+    def push_columns(self, columns):
+        if self.can_push_down() and all([isinstance(c, str) and self.is_known(c) for c in columns]):
+            return self.pushed(columns=list(columns))
+
+    def push_filters(self, **filters):
+        if self.can_push_down() and self.limit is None:
+            if all([self.is_known(k) and is_simple_value(v) for k, v in filters.items()]):
+                return self.pushed(filters=self.filters + tuple(filters.items()))
+
+    def push_limit(self, limit):
+        if self.can_push_down():
+            return self.pushed(limit=limit if self.limit is None else min(self.limit, limit))
+
+    def get_source(self):
+        return self.reader(self.columns, self.filters, self.limit)
+
+    def explain(self):
+        lines = super().explain().split('\n')
+        pushed = [
+            'columns={}'.format(self.columns),
+            'filters={}'.format(list(self.filters)),
+            'limit={}'.format(self.limit),
+        ]
+        lines[0] = 'scan({}: {})'.format(self.name, ', '.join(pushed))
+        return '\n'.join(lines)
@@ -0,0 +1,179 @@
+from collections.abc import Iterator
+from time import perf_counter
+import tracemalloc
+import sys
+
+
+REPORT_COLUMNS = ('stage', 'items_in', 'items_out', 'own_time', 'total_time', 'size', 'memory_peak')
+INTERNAL_METHODS = ('__init__', 'set_meta', 'update_meta', 'fill_meta')
+DEFAULT_ENCODING = 'utf8'
+
+_active_profiler = None
+
+
+def get_active_profiler():
+    return _active_profiler
+
+
+def get_caller_name(depth=2):  # name of flux method which created new flux, constructors are skipped
+    frame = sys._getframe(depth)
+    while frame is not None and frame.f_code.co_name in INTERNAL_METHODS:
+        frame = frame.f_back
+    return frame.f_code.co_name if frame is not None else 'unknown'
+
+
+class Stage:
+    def __init__(self, name, measure_size=False, encoding=DEFAULT_ENCODING):
+        self.name = name
+        self.measure_size = measure_size
+        self.encoding = encoding  # size of str items is measured in bytes of this encoding
+        self.items_in = 0
+        self.items_out = 0
+        self.total_time = 0.0  # including time spent in upstream stages
+        self.child_time = 0.0
+        self.size = 0
+        self.memory_peak = 0
+        self.window_peak = 0
+        self.finished = False
+
+    def get_own_time(self):
+        return self.total_time - self.child_time
+
+    def get_row(self):
+        return dict(
+            stage=self.name,
+            items_in=self.items_in,
+            items_out=self.items_out,
+            own_time=round(self.get_own_time(), 6),
+            total_time=round(self.total_time, 6),
+            size=self.size if self.measure_size else None,
+            memory_peak=self.memory_peak or None,
+        )
+
+
+class ProfiledIterator(Iterator):  # measures time spent in next() of wrapped iterator excluding nested stages
+    def __init__(self, items, stage, profiler):
+        self.items = iter(items)
+        self.stage = stage
+        self.profiler = profiler
+
+    def __next__(self):
+        stage, stack = self.stage, self.profiler.stack
+        trace_memory = self.profiler.trace_memory
+        parent = stack[-1] if stack else None
+        if trace_memory:
+            memory_before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            stage.window_peak = 0
+        stack.append(stage)
+        start_time = perf_counter()
+        try:
+            item = next(self.items)
+        except StopIteration:
+            item = None
+            stage.finished = True
+        finally:
+            elapsed = perf_counter() - start_time
+            stack.pop()
+            stage.total_time += elapsed
+            if parent is not None:
+                parent.child_time += elapsed
+            if trace_memory:
+                absolute_peak = max(tracemalloc.get_traced_memory()[1], stage.window_peak)
+                stage.memory_peak = max(stage.memory_peak, absolute_peak - memory_before)
+                if parent is not None:
+                    parent.window_peak = max(parent.window_peak, absolute_peak)
+        if stage.finished:
+            self.profiler.check_finished()
+            raise StopIteration
+        stage.items_out += 1
+        if stage.measure_size:
+            if isinstance(item, str):
+                stage.size += len(item.encode(stage.encoding))
+            elif isinstance(item, bytes):
+                stage.size += len(item)
+        if parent is not None:
+            parent.items_in += 1
+        return item
+
+
+class Profiler:
+    def __init__(self, trace_memory=False, on_finish=None):
+        self.trace_memory = trace_memory
+        self.on_finish = on_finish  # called once when all wrapped stages are exhausted
+        self.stages = list()
+        self.stack = list()
+        self.previous_profiler = None
+        self.finished = False
+
+    def start(self):  # every flux created over iterator while profiler is active is profiled
+        global _active_profiler
+        self.previous_profiler = _active_profiler
+        _active_profiler = self
+        return self.start_tracing()
+
+    def start_tracing(self):  # profiler of one chain is not activated globally, it is passed by flux meta
+        self.finished = False
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        return self
+
+    def stop(self):
+        global _active_profiler
+        if _active_profiler is self:
+            _active_profiler = self.previous_profiler
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def is_active(self):
+        return _active_profiler is self
+
+    def is_finished(self):
+        return self.finished
+
+    def check_finished(self):
+        if self.on_finish is not None and self.stages and all([s.finished for s in self.stages]):
+            self.finish()
+
+    def finish(self):  # stops profiler and calls on_finish once
+        self.stop()
+        self.finished = True
+        if self.on_finish is not None:
+            on_finish, self.on_finish = self.on_finish, None
+            on_finish(self)
+
+    def closing(self, items):  # finishes profiler when items are exhausted or closed after partial read
+        try:
+            yield from items
+        finally:
+            self.finish()
+
+    def wrap(self, items, name, measure_size=False, encoding=DEFAULT_ENCODING):
+        if isinstance(items, ProfiledIterator):
+            return items
+        stage = Stage(name, measure_size=measure_size, encoding=encoding)
+        self.stages.append(stage)
+        return ProfiledIterator(items, stage, self)
+
+    def get_report(self):
+        return [s.get_row() for s in self.stages]
+
+    def get_report_str(self):
+        rows = [REPORT_COLUMNS] + [[str(r[c]) for c in REPORT_COLUMNS] for r in self.get_report()]
+        widths = [max([len(r[n]) for r in rows]) for n in range(len(REPORT_COLUMNS))]
+        return '\n'.join([' '.join([v.ljust(w) for v, w in zip(r, widths)]) for r in rows])
+
+
+def wrap(items, name, measure_size=False, encoding=DEFAULT_ENCODING):  # wraps items only if profiling is active
+    profiler = get_active_profiler()
+    if profiler is None:
+        return items
+    else:
+        return profiler.wrap(items, name, measure_size=measure_size, encoding=encoding)
@@ -97,11 +97,9 @@ def from_file(
 @deprecated
 def from_parquet(parquet):
     def get_records():
-        for n in range(parquet.num_rows):
-            yield parquet.slice(n, 1).to_pydict()
+        for batch in parquet.to_batches():
+            yield from batch.to_pylist()
     return fx.RecordsFlux(
         get_records(),
         count=parquet.num_rows,
-    ).map(
-        lambda r: {k: v[0] for k, v in r.items()}
     )
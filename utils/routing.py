@@ -0,0 +1,145 @@
+from collections import deque
+import pickle
+import os
+
+
+DEFAULT_MAX_ITEMS_IN_MEMORY = 100000
+DEFAULT_FILE_TEMPLATE = 'flux_{}.tmp'
+PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL
+
+
+class SpillQueue:  # FIFO queue keeping at most max_items_in_memory items in memory, older items are pickled to file
+    def __init__(
+            self,
+            filename,
+            max_items_in_memory=DEFAULT_MAX_ITEMS_IN_MEMORY,
+            spill_operation=None,
+    ):
+        self.filename = filename
+        self.max_items_in_memory = max_items_in_memory
+        self.spill_operation = spill_operation  # spill.SpillOperation accounting written bytes in disk budget
+        self.memory = deque()
+        self.writer = None
+        self.reader = None
+        self.unread_on_disk = 0
+
+    def __len__(self):
+        return len(self.memory) + self.unread_on_disk
+
+    def put(self, item):
+        self.memory.append(item)
+        if self.max_items_in_memory is not None and len(self.memory) > self.max_items_in_memory:
+            self.spill()
+
+    def spill(self):
+        if self.writer is None:
+            self.writer = open(self.filename, 'wb')
+        data = b''.join([pickle.dumps(i, PICKLE_PROTOCOL) for i in self.memory])  # keeps types, i.e. tuples, dates
+        if self.spill_operation is not None:
+            self.spill_operation.add_usage(self.filename, len(data))
+        self.writer.write(data)
+        self.writer.flush()
+        self.unread_on_disk += len(self.memory)
+        self.memory.clear()
+
+    def get(self):
+        if self.unread_on_disk:
+            if self.reader is None:
+                self.reader = open(self.filename, 'rb')
+            self.unread_on_disk -= 1
+            return pickle.load(self.reader)
+        else:
+            return self.memory.popleft()
+
+    def close(self):
+        self.memory.clear()
+        self.unread_on_disk = 0
+        for fileholder in (self.writer, self.reader):
+            if fileholder is not None:
+                fileholder.close()
+        self.writer, self.reader = None, None
+        if self.spill_operation is not None:
+            self.spill_operation.remove_file(self.filename)
+        elif os.path.exists(self.filename):
+            os.remove(self.filename)
+
+
+class Router:  # single pass over items, function(item) evaluated once per item returns number of output
+    def __init__(
+            self,
+            items,
+            function,
+            count,
+            monotonic=False,
+            max_items_in_memory=DEFAULT_MAX_ITEMS_IN_MEMORY,
+            file_template=DEFAULT_FILE_TEMPLATE,
+            on_close=None,
+            spill_operation=None,
+    ):
+        self.items = iter(items)
+        self.function = function
+        self.monotonic = monotonic  # output numbers are non-decreasing, i.e. split by position
+        self.queues = [
+            SpillQueue(
+                file_template.format('route_{}_{}'.format(id(self), n)),
+                max_items_in_memory=max_items_in_memory,
+                spill_operation=spill_operation,
+            ) for n in range(count)
+        ]
+        self.closed = [False] * count
+        self.finished = False
+        self.last_output = 0
+        self.on_close = on_close
+
+    def get_count(self):
+        return len(self.queues)
+
+    def pull(self):
+        try:
+            item = next(self.items)
+        except StopIteration:
+            self.finished = True
+            return
+        output = self.function(item)
+        count = self.get_count()
+        assert 0 <= output < count, 'route number must be in [0, {}), got {}'.format(count, output)
+        self.last_output = output
+        if not self.closed[output]:
+            self.queues[output].put(item)
+
+    def is_exhausted(self, output):
+        return self.finished or (self.monotonic and self.last_output > output)
+
+    def get_output(self, output):
+        queue = self.queues[output]
+        try:
+            while True:
+                if queue:
+                    yield queue.get()
+                elif self.is_exhausted(output):
+                    break
+                else:
+                    self.pull()
+        finally:
+            self.closed[output] = True
+            queue.close()
+            if all(self.closed):
+                self.close()
+
+    def get_outputs(self):
+        return [self.get_output(n) for n in range(self.get_count())]
+
+    def close(self):
+        for n, queue in enumerate(self.queues):
+            self.closed[n] = True
+            queue.close()
+        if self.on_close is not None:
+            self.on_close()
+            self.on_close = None
+
+    def __del__(self):
+        self.close()
+
+
+def route(items, function, count, monotonic=False, **kwargs):
+    return Router(items, function, count, monotonic=monotonic, **kwargs).get_outputs()
@@ -0,0 +1,346 @@
+from hashlib import blake2b
+from numbers import Number
+import random
+import heapq
+import math
+
+DEFAULT_ERROR_RATE = 0.01
+DEFAULT_CAPACITY = 10 ** 7
+HASH_SIZE = 16  # bytes of digest, split into two 64-bit hashes
+HASH_BITS = 64
+DEFAULT_HLL_PRECISION = 14  # 2 ** 14 registers, standard error about 0.8%
+DEFAULT_KLL_SIZE = 200  # capacity of top compactor, rank error about 1.3%
+DEFAULT_QUANTILES = (0.25, 0.5, 0.75)
+DEFAULT_CMS_WIDTH = 2000
+DEFAULT_CMS_DEPTH = 5
+DEFAULT_TOP_COUNT = 10
+TOP_CAPACITY_FACTOR = 10  # space-saving tracks more counters than reported to make top more accurate
+
+
+def get_hash_pair(value):  # stable across processes unlike built-in hash(), so sketches can be merged
+    digest = blake2b(repr(value).encode('utf8'), digest_size=HASH_SIZE).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+
+
+def get_hash(value):
+    return get_hash_pair(value)[0]
+
+
+class BloomFilter:  # set membership with false positives only, memory is fixed by capacity and error rate
+    def __init__(self, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+        assert 0 < error_rate < 1, 'error_rate must be in (0, 1), got {}'.format(error_rate)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits_count = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes_count = max(1, round(self.bits_count / capacity * math.log(2)))
+        self.bits = bytearray((self.bits_count + 7) // 8)
+
+    def get_positions(self, value):  # double hashing: i-th position is h1 + i * h2
+        h1, h2 = get_hash_pair(value)
+        return [(h1 + i * h2) % self.bits_count for i in range(self.hashes_count)]
+
+    def add(self, value):  # returns True if value was definitely not added before
+        is_new = False
+        bits = self.bits
+        for p in self.get_positions(value):
+            mask = 1 << (p & 7)
+            if not bits[p >> 3] & mask:
+                bits[p >> 3] |= mask
+                is_new = True
+        return is_new
+
+    def __contains__(self, value):
+        bits = self.bits
+        return all([bits[p >> 3] & (1 << (p & 7)) for p in self.get_positions(value)])
+
+    def is_compatible(self, other):
+        return self.bits_count == other.bits_count and self.hashes_count == other.hashes_count
+
+    def merge(self, other):  # union of sets
+        assert self.is_compatible(other), 'can merge only Bloom filters with same capacity and error rate'
+        self.bits = bytearray(a | b for a, b in zip(self.bits, other.bits))
+        return self
+
+    def get_size(self):  # bytes
+        return len(self.bits)
+
+
+class HyperLogLog:  # distinct count estimation in fixed memory of 2 ** precision bytes
+    def __init__(self, precision=DEFAULT_HLL_PRECISION):
+        assert 4 <= precision <= 18, 'precision must be in [4, 18], got {}'.format(precision)
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value):
+        h = get_hash(value)
+        index = h >> (HASH_BITS - self.precision)
+        rest_bits = HASH_BITS - self.precision
+        rank = rest_bits - (h & ((1 << rest_bits) - 1)).bit_length() + 1  # position of leftmost 1-bit
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        assert self.precision == other.precision, 'can merge only HyperLogLog with same precision'
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+    def get_estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum([2.0 ** -r for r in self.registers])
+        zeros_count = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros_count:  # linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros_count)
+        return estimate
+
+    def get_result(self):
+        return round(self.get_estimate())
+
+
+class KllSketch:  # quantiles of comparable values, memory is O(size) regardless of stream length
+    def __init__(self, size=DEFAULT_KLL_SIZE, quantiles=DEFAULT_QUANTILES, seed=None):
+        self.size = size
+        self.quantiles = quantiles  # used by get_result(), single number gives single value
+        self.random = random.Random(seed)
+        self.compactors = list()
+        self.items_count = 0  # items held in compactors
+        self.max_items_count = 0
+        self.total_count = 0  # items added
+        self.grow()
+
+    def get_capacity(self, level):  # lower levels have smaller capacity
+        depth = len(self.compactors) - level - 1
+        return int(math.ceil(self.size * (2 / 3) ** depth)) + 1
+
+    def grow(self):
+        self.compactors.append(list())
+        self.max_items_count = sum([self.get_capacity(h) for h in range(len(self.compactors))])
+
+    def add(self, value):
+        self.compactors[0].append(value)
+        self.items_count += 1
+        self.total_count += 1
+        if self.items_count >= self.max_items_count:
+            self.compress()
+
+    def compress(self):  # every second item of sorted full compactor goes to upper level with doubled weight
+        for level in range(len(self.compactors)):
+            compactor = self.compactors[level]
+            if len(compactor) >= self.get_capacity(level):
+                if level + 1 >= len(self.compactors):
+                    self.grow()
+                compactor.sort()
+                kept = compactor.pop() if len(compactor) % 2 else None
+                self.compactors[level + 1].extend(compactor[self.random.randint(0, 1)::2])
+                compactor.clear()
+                if kept is not None:
+                    compactor.append(kept)
+                self.items_count = sum([len(c) for c in self.compactors])
+                if self.items_count < self.max_items_count:
+                    break
+
+    def merge(self, other):
+        while len(self.compactors) < len(other.compactors):
+            self.grow()
+        for level, compactor in enumerate(other.compactors):
+            self.compactors[level].extend(compactor)
+        self.total_count += other.total_count
+        self.items_count = sum([len(c) for c in self.compactors])
+        while self.items_count >= self.max_items_count:
+            self.compress()
+        return self
+
+    def get_weighted_items(self):
+        weighted = [(v, 2 ** level) for level, c in enumerate(self.compactors) for v in c]
+        return sorted(weighted, key=lambda i: i[0])
+
+    def get_quantiles(self, quantiles):
+        weighted = self.get_weighted_items()
+        total_weight = sum([w for _, w in weighted])
+        result = list()
+        for q in quantiles:
+            assert 0 <= q <= 1, 'quantile must be in [0, 1], got {}'.format(q)
+            value, cumulative_weight = None, 0
+            for value, weight in weighted:
+                cumulative_weight += weight
+                if cumulative_weight >= q * total_weight:
+                    break
+            result.append(value)
+        return result
+
+    def get_quantile(self, quantile):
+        return self.get_quantiles([quantile])[0]
+
+    def get_result(self):
+        if isinstance(self.quantiles, Number):
+            return self.get_quantile(self.quantiles)
+        else:
+            return dict(zip(self.quantiles, self.get_quantiles(self.quantiles)))
+
+
+class CountMinSketch:  # frequency estimation, never underestimates, overestimates by at most total / width * e
+    def __init__(self, width=DEFAULT_CMS_WIDTH, depth=DEFAULT_CMS_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.rows = [[0] * width for _ in range(depth)]
+        self.total_count = 0
+
+    def get_positions(self, value):
+        h1, h2 = get_hash_pair(value)
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, value, count=1):
+        for row, p in zip(self.rows, self.get_positions(value)):
+            row[p] += count
+        self.total_count += count
+
+    def get_estimate(self, value):
+        return min([row[p] for row, p in zip(self.rows, self.get_positions(value))])
+
+    def merge(self, other):
+        assert (self.width, self.depth) == (other.width, other.depth), 'can merge only sketches of same shape'
+        self.rows = [[a + b for a, b in zip(r1, r2)] for r1, r2 in zip(self.rows, other.rows)]
+        self.total_count += other.total_count
+        return self
+
+    def get_result(self):
+        return self.total_count
+
+
+class SpaceSaving:  # heavy hitters: most frequent values with counts overestimated by at most min tracked count
+    def __init__(self, count=DEFAULT_TOP_COUNT, capacity=None):
+        self.count = count
+        self.capacity = capacity or count * TOP_CAPACITY_FACTOR
+        self.counters = dict()
+        self.heap = list()  # (count, n, value), entries with outdated counts are skipped lazily
+        self.pushed_count = 0
+
+    def push(self, value, count):
+        self.pushed_count += 1
+        heapq.heappush(self.heap, (count, self.pushed_count, value))
+        if len(self.heap) > 4 * self.capacity:  # drop outdated entries
+            self.heap = [(c, n, v) for n, (v, c) in enumerate(self.counters.items())]
+            heapq.heapify(self.heap)
+
+    def pop_min(self):
+        while True:
+            count, _, value = heapq.heappop(self.heap)
+            if self.counters.get(value) == count:
+                return value, count
+
+    def add(self, value, count=1):
+        if value in self.counters:
+            self.counters[value] += count
+        elif len(self.counters) < self.capacity:
+            self.counters[value] = count
+        else:  # least frequent value is replaced, new value inherits its count as possible error
+            min_value, min_count = self.pop_min()
+            del self.counters[min_value]
+            self.counters[value] = min_count + count
+        self.push(value, self.counters[value])
+
+    def merge(self, other):
+        for value, count in other.counters.items():
+            self.counters[value] = self.counters.get(value, 0) + count
+        if len(self.counters) > self.capacity:
+            self.counters = dict(heapq.nlargest(self.capacity, self.counters.items(), key=lambda i: i[1]))
+        self.heap = [(c, n, v) for n, (v, c) in enumerate(self.counters.items())]
+        heapq.heapify(self.heap)
+        return self
+
+    def get_top(self, count=None):
+        return heapq.nlargest(count or self.count, self.counters.items(), key=lambda i: i[1])
+
+    def get_result(self):
+        return self.get_top()
+
+
+AGGREGATORS = dict(  # names for group_by aggregations
+    count_distinct=HyperLogLog,
+    quantiles=KllSketch,
+    median=lambda: KllSketch(quantiles=0.5),
+    top=SpaceSaving,
+)
+
+
+def get_aggregator(aggregator):  # name from AGGREGATORS, sketch class or factory function
+    if isinstance(aggregator, str):
+        assert aggregator in AGGREGATORS, 'unknown aggregator {}, expected one of {}'.format(aggregator, AGGREGATORS)
+        aggregator = AGGREGATORS[aggregator]
+    return aggregator()
+
+
+class FieldSummary:  # bounded-memory profile of values of one field
+    def __init__(self, top_count=5, quantiles=DEFAULT_QUANTILES):
+        self.count = 0
+        self.nulls_count = 0
+        self.numbers_count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+        self.distinct = HyperLogLog()
+        self.top = SpaceSaving(top_count)
+        self.quantiles = KllSketch(quantiles=quantiles)
+
+    def add(self, value):
+        self.count += 1
+        if value is None:
+            self.nulls_count += 1
+            return
+        hashable_value = value if isinstance(value, (str, Number)) else repr(value)
+        self.distinct.add(hashable_value)
+        self.top.add(hashable_value)
+        if isinstance(value, Number) and not isinstance(value, bool):
+            self.numbers_count += 1
+            self.sum += value
+            self.min = value if self.min is None else min(self.min, value)
+            self.max = value if self.max is None else max(self.max, value)
+            self.quantiles.add(value)
+
+    def merge(self, other):
+        self.count += other.count
+        self.nulls_count += other.nulls_count
+        self.numbers_count += other.numbers_count
+        self.sum += other.sum
+        self.min = min([v for v in (self.min, other.min) if v is not None], default=None)
+        self.max = max([v for v in (self.max, other.max) if v is not None], default=None)
+        self.distinct.merge(other.distinct)
+        self.top.merge(other.top)
+        self.quantiles.merge(other.quantiles)
+        return self
+
+    def get_result(self):
+        result = dict(
+            count=self.count,
+            nulls=self.nulls_count,
+            distinct=self.distinct.get_result(),
+            top=self.top.get_result(),
+        )
+        if self.numbers_count:
+            result.update(min=self.min, max=self.max, mean=self.sum / self.numbers_count)
+            result.update({'p{}'.format(round(q * 100)): v for q, v in self.quantiles.get_result().items()})
+        return result
+
+
+def summarize_records(records, fields=None):  # returns dict field -> FieldSummary, summaries of parts can be merged
+    summaries = dict()
+    for r in records:
+        for f in fields or r.keys():
+            summary = summaries.get(f)
+            if summary is None:
+                summary = summaries[f] = FieldSummary()
+            summary.add(r.get(f))
+    return summaries
+
+
+def summarize_batch(records, fields=None):  # for algo.map_batches(), must be picklable to run in processes
+    return [summarize_records(records, fields)]
+
+
+def merge_summaries(summaries, other):
+    for f, summary in other.items():
+        if f in summaries:
+            summaries[f].merge(summary)
+        else:
+            summaries[f] = summary
+    return summaries
@@ -0,0 +1,169 @@
+import os
+import shutil
+import tempfile
+import threading
+import atexit
+import pickle
+
+try:  # Assume we're a sub-module in a package.
+    from utils import metrics
+except ImportError:  # Apparently no higher-level package has been imported, fall back to a local import.
+    from ..utils import metrics
+
+
+SPILL_FOLDER_NAME = 'spill'
+PART_FILE_TEMPLATE = 'part_{}.tmp'
+PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL
+WRITE_BUFFER_SIZE = 64 * 1024  # bytes, disk budget is checked before each buffer is written
+
+_managers = dict()
+
+
+def write_items(path, items, operation=None):  # pickle stream keeps types (tuples, dates, non-finite floats)
+    count = 0
+    buffer, buffer_size = list(), 0
+    with open(path, 'wb') as f:
+        for count, item in enumerate(items, 1):
+            data = pickle.dumps(item, PICKLE_PROTOCOL)
+            buffer.append(data)
+            buffer_size += len(data)
+            if buffer_size >= WRITE_BUFFER_SIZE:
+                write_bytes(f, path, buffer, operation)
+                buffer, buffer_size = list(), 0
+        write_bytes(f, path, buffer, operation)
+    return count
+
+
+def write_bytes(fileholder, path, chunks, operation=None):  # size is added to operation usage before writing
+    data = b''.join(chunks)
+    if operation is not None:
+        operation.add_usage(path, len(data))
+    fileholder.write(data)
+
+
+def read_items(path):
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def get_root(tmp_files_template):
+    if '{}' in tmp_files_template:
+        return tmp_files_template.format(SPILL_FOLDER_NAME)
+    else:
+        return '{}_{}'.format(tmp_files_template, SPILL_FOLDER_NAME)
+
+
+def get_manager(root, max_disk_usage=None):
+    manager = _managers.get(root)
+    if manager is None or manager.is_closed():
+        manager = SpillManager(root, max_disk_usage=max_disk_usage)
+        _managers[root] = manager
+    return manager
+
+
+class SpillManager:  # allocates unique folder for each operation, tracks disk usage, removes everything on close
+    def __init__(self, root, max_disk_usage=None):
+        self.root = root
+        self.max_disk_usage = max_disk_usage  # bytes, None means unlimited
+        self.disk_usage = 0
+        self.operations = dict()
+        self.lock = threading.Lock()
+        self.closed = False
+        atexit.register(self.close)
+
+    def is_closed(self):
+        return self.closed
+
+    def get_disk_usage(self):
+        return self.disk_usage
+
+    def new_operation(self, name='operation'):
+        os.makedirs(self.root, exist_ok=True)
+        folder = tempfile.mkdtemp(prefix='{}_'.format(name), dir=self.root)
+        operation = SpillOperation(self, folder)
+        with self.lock:
+            self.closed = False
+            self.operations[folder] = operation
+        return operation
+
+    def add_usage(self, size, new_file=False):  # called before size bytes are written, fails if they do not fit
+        registry = metrics.get_registry()
+        with self.lock:
+            if self.max_disk_usage is not None and self.disk_usage + size > self.max_disk_usage:
+                registry.counter('spill_errors_total', 'Spill disk budget overflows').inc()
+                message = 'Spill disk budget exceeded: {} + {} of {} bytes requested in {}'
+                raise OSError(message.format(self.disk_usage, size, self.max_disk_usage, self.root))
+            self.disk_usage += size
+            registry.gauge('spill_disk_usage_bytes', 'Current disk usage by spill files').set(self.disk_usage)
+        if new_file:
+            registry.counter('spill_files_total', 'Files spilled to disk').inc()
+        registry.counter('spill_bytes_total', 'Bytes spilled to disk').inc(size)
+
+    def remove_usage(self, size):
+        with self.lock:
+            self.disk_usage -= size
+            metrics.get_registry().gauge('spill_disk_usage_bytes').set(self.disk_usage)
+
+    def forget(self, operation):
+        with self.lock:
+            self.operations.pop(operation.get_folder(), None)
+
+    def close(self):
+        for operation in list(self.operations.values()):
+            operation.close()
+        if os.path.isdir(self.root) and not os.listdir(self.root):
+            os.rmdir(self.root)
+        self.closed = True
+        return self
+
+
+class SpillOperation:
+    def __init__(self, manager, folder):
+        self.manager = manager
+        self.folder = folder
+        self.files = dict()
+
+    def get_folder(self):
+        return self.folder
+
+    def get_file_template(self):
+        return os.path.join(self.folder, PART_FILE_TEMPLATE)
+
+    def get_path(self, name):
+        return os.path.join(self.folder, name)
+
+    def add_usage(self, path, size):  # bytes which are going to be written into path
+        try:
+            self.manager.add_usage(size, new_file=path not in self.files)
+        except OSError:
+            self.close()
+            raise
+        self.files[path] = self.files.get(path, 0) + size
+
+    def add_file(self, path):  # file written without add_usage(), i.e. by sqlite
+        self.add_usage(path, os.path.getsize(path) - self.files.get(path, 0))
+
+    def remove_file(self, path):
+        if os.path.exists(path):
+            os.remove(path)
+        self.manager.remove_usage(self.files.pop(path, 0))
+
+    def consume(self, path, items):  # yields items read from file and removes file when they are exhausted
+        yield from items
+        self.remove_file(path)
+
+    def closing(self, items):  # yields items and removes operation folder when they are exhausted or closed
+        try:
+            yield from items
+        finally:
+            self.close()
+
+    def close(self):
+        for path in list(self.files):
+            self.remove_file(path)
+        shutil.rmtree(self.folder, ignore_errors=True)
+        self.manager.forget(self)